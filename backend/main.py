@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
@@ -8,7 +9,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from src.api.files import router_files
 from src.api.health import router_health
 from src.api.metrics import PrometheusMiddleware, router_metrics
+from src.api.resumable import router_resumable
+from src.api.uploads import router_uploads
+from src.api.videos import router_videos
+from src.config import get_upload_settings
 from src.i18n import LanguageMiddleware
+from src.services.cleanup import run_cleanup
 from src.services.rabbit_client import rabbit_broker
 from src.services.s3_client import get_s3_client
 
@@ -18,11 +24,22 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     await rabbit_broker.connect()
 
     s3_client = get_s3_client()
+    await s3_client.start()
     await s3_client.check_bucket_exists()
+    upload_settings = get_upload_settings()
+    cleanup = asyncio.create_task(
+        run_cleanup(
+            s3_client,
+            upload_settings.UPLOAD_CLEANUP_INTERVAL,
+            upload_settings.UPLOAD_SESSION_TTL,
+        )
+    )
     logging.info("Startup complete. Metrics exposed.")
     yield
-    logging.info("Shutdown complete.")
+    cleanup.cancel()
     await rabbit_broker.close()
+    await s3_client.close()
+    logging.info("Shutdown complete.")
 
 
 def create_app(use_lifespan: bool = True) -> FastAPI:
@@ -33,6 +50,9 @@ def create_app(use_lifespan: bool = True) -> FastAPI:
 
     app.include_router(router_health)
     app.include_router(router_files)
+    app.include_router(router_uploads)
+    app.include_router(router_resumable)
+    app.include_router(router_videos)
     app.include_router(router_metrics)
     app.add_middleware(LanguageMiddleware)
     app.add_middleware(PrometheusMiddleware)
@@ -1,15 +1,181 @@
 import asyncio
+import hashlib
 import logging
-from typing import List
+import secrets
+from datetime import timezone
+from email.utils import format_datetime
+from pathlib import PurePosixPath
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
-from fastapi import APIRouter, HTTPException, UploadFile
+from fastapi import APIRouter, HTTPException, Request, Response, UploadFile
 from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
 
-from ..schemas.endpoint import ErrorResponse, FileMeta, UploadResponse
-from ..services import get_s3_client
-from ..services.rabbit_client import rabbit_broker
+from ..schemas.endpoint import EncodeJob, ErrorResponse, FileMeta, UploadResponse
+from ..schemas.enum import OutputFormat
+from ..services import S3Client, get_s3_client
+from ..services.dedup import (
+    find_encoded,
+    link_renditions,
+    record_source,
+    register_hash,
+)
+from ..services.rabbit_client import publish_encode
+from ..services.ranges import (
+    ByteRange,
+    RangeNotSatisfiable,
+    content_range,
+    parse_range,
+)
 
 router_files = APIRouter(prefix="/api/files", tags=["files"])
+STREAM_CHUNK_SIZE = 1024 * 1024 * 3
+
+
+# ----- Helpers -----
+async def encode_or_link(
+    s3_client: S3Client,
+    meta: FileMeta,
+    digest: str,
+    output_format: Optional[OutputFormat],
+) -> None:
+    """Reuse the renditions of an identical upload, or start the encode."""
+    meta.hash = digest
+    # the name now holds these bytes, whatever it was encoded from before
+    await record_source(s3_client, meta.filename, digest)
+    original = await find_encoded(s3_client, digest)
+    if original is not None:
+        logging.info(f"File {meta.filename} duplicates {original}, skipping encoding")
+        if original != meta.filename:
+            await link_renditions(s3_client, original, meta.filename)
+        await s3_client.delete_file(meta.filename)
+        meta.duplicate_of = original
+        return
+
+    await register_hash(s3_client, digest, meta.filename)
+    # no duration here, the convertor estimates from the size and probes
+    await publish_encode(
+        EncodeJob(video_id=meta.filename, output_format=output_format, size=meta.size)
+    )
+
+
+async def byteranges_body(
+    s3_client: S3Client,
+    filename: str,
+    parts: Sequence[Tuple[ByteRange, bytes]],
+    size: int,
+    closing: bytes,
+) -> AsyncIterator[bytes]:
+    for (start, end), header in parts:
+        yield header
+        async for piece in s3_client.download_file(
+            filename, STREAM_CHUNK_SIZE, start=start, end=end, size=size
+        ):
+            yield piece
+        yield b"\r\n"
+    yield closing
+
+
+async def object_response(
+    request: Request,
+    filename: str,
+    media_type: str,
+    disposition: Optional[str] = None,
+    cache_control: Optional[str] = None,
+) -> Response:
+    """
+    Serve an S3 object honouring Range, If-Range and HEAD.
+
+    A single range is answered with a 206 streamed from one ranged read of
+    S3, several ranges with a multipart/byteranges body.
+
+    Args:
+        filename: Key of the object.
+        disposition: inline or attachment, no Content-Disposition if None.
+        cache_control: Cache-Control of successful answers.
+    """
+    s3_client = get_s3_client()
+    try:
+        info = await s3_client.stat(filename)
+    except FileNotFoundError:
+        logging.error(f"File '{filename}' not found")
+        raise HTTPException(status_code=404, detail=f"File '{filename}' not found")
+    except Exception as e:
+        logging.error(f"Error streaming file: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    headers: Dict[str, str] = {"Accept-Ranges": "bytes"}
+    if disposition is not None:
+        name = PurePosixPath(filename).name
+        headers["Content-Disposition"] = f'{disposition}; filename="{name}"'
+    if cache_control is not None:
+        headers["Cache-Control"] = cache_control
+    if info.etag:
+        headers["ETag"] = info.etag
+    if info.last_modified:
+        headers["Last-Modified"] = format_datetime(
+            info.last_modified.astimezone(timezone.utc), usegmt=True
+        )
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range not in (
+        info.etag,
+        headers.get("Last-Modified"),
+    ):
+        # the client holds another version, it gets the whole object
+        range_header = None
+    try:
+        ranges = parse_range(range_header, info.size)
+    except RangeNotSatisfiable:
+        raise HTTPException(
+            status_code=416,
+            detail=f"Range not satisfiable for '{filename}'",
+            headers={"Content-Range": f"bytes */{info.size}"},
+        )
+
+    status_code = 200
+    body: Optional[AsyncIterator[bytes]] = None
+    if ranges is None:
+        headers["Content-Length"] = str(info.size)
+        if request.method != "HEAD":
+            body = s3_client.download_file(filename, STREAM_CHUNK_SIZE, size=info.size)
+    elif len(ranges) == 1:
+        status_code = 206
+        ((start, end),) = ranges
+        headers["Content-Range"] = content_range(ranges[0], info.size)
+        headers["Content-Length"] = str(end - start + 1)
+        if request.method != "HEAD":
+            body = s3_client.download_file(
+                filename, STREAM_CHUNK_SIZE, start=start, end=end, size=info.size
+            )
+    else:
+        status_code = 206
+        boundary = secrets.token_hex(16)
+        parts = [
+            (
+                byte_range,
+                (
+                    f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+                    f"Content-Range: {content_range(byte_range, info.size)}\r\n\r\n"
+                ).encode(),
+            )
+            for byte_range in ranges
+        ]
+        closing = f"--{boundary}--\r\n".encode()
+        headers["Content-Length"] = str(
+            sum(len(header) + end - start + 1 + 2 for (start, end), header in parts)
+            + len(closing)
+        )
+        media_type = f"multipart/byteranges; boundary={boundary}"
+        if request.method != "HEAD":
+            body = byteranges_body(s3_client, filename, parts, info.size, closing)
+
+    if body is None:
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(
+        body, status_code=status_code, headers=headers, media_type=media_type
+    )
 
 
 # ----- Endpoints -----
@@ -20,10 +186,14 @@ router_files = APIRouter(prefix="/api/files", tags=["files"])
 )
 async def upload_files(
     uploaded_files: List[UploadFile],
+    output_format: Optional[OutputFormat] = None,
 ) -> UploadResponse:
     """
     Upload multiple files to S3 asynchronously and trigger encoding tasks in RabbitMQ.
     Returns metadata about uploaded files.
+
+    output_format picks the HLS segment container of the renditions, the
+    convertor default is used when it is not given.
     """
     if not uploaded_files:
         logging.error("No files provided")
@@ -39,11 +209,15 @@ async def upload_files(
             size = uploaded_file.file.tell()
             uploaded_file.file.seek(0)
             logging.info(f"Uploaded file: {uploaded_file.filename} with size: {size}")
-            files_meta.append(FileMeta(filename=uploaded_file.filename, size=size))
+            meta = FileMeta(filename=uploaded_file.filename, size=size)
+            files_meta.append(meta)
 
-            logging.info(f"Starting encoding task for file: {uploaded_file.filename}")
-            await s3_client.upload_file(uploaded_file.filename, uploaded_file.file)
-            await rabbit_broker.publish(uploaded_file.filename, queue="video.encode")
+            # hashed on the fly by the upload, no second pass over the file
+            digest = hashlib.sha256()
+            await s3_client.upload_file(
+                uploaded_file.filename, uploaded_file.file, digest
+            )
+            await encode_or_link(s3_client, meta, digest.hexdigest(), output_format)
 
     try:
         tasks = [upload_single_file(f) for f in uploaded_files]
@@ -57,37 +231,61 @@ async def upload_files(
     )
 
 
-@router_files.get("/streaming/{filename}")
-async def stream_video(filename: str) -> StreamingResponse:
-    s3_client = get_s3_client()
-    try:
-        logging.info(f"Streaming file: {filename}")
-        chunk_generator = s3_client.download_file(filename, 1024 * 1024 * 3)
-        headers = {"Content-Disposition": f'inline; filename="{filename}"'}
-        logging.info(f"Streaming file: {filename} in streaming mode")
-        return StreamingResponse(
-            chunk_generator, media_type="video/mp4", headers=headers
-        )
-    except FileNotFoundError:
-        logging.error(f"File '{filename}' not found")
-        raise HTTPException(status_code=404, detail=f"File '{filename}' not found")
-    except Exception as e:
-        logging.error(f"Error streaming file: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+@router_files.put(
+    "/upload/{filename}",
+    response_model=UploadResponse,
+    responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}},
+)
+async def upload_stream(
+    filename: str,
+    request: Request,
+    output_format: Optional[OutputFormat] = None,
+) -> UploadResponse:
+    """
+    Upload one file sent as the raw request body.
 
+    The body is cut into parts as it arrives and the parts go to S3
+    concurrently, hashed and counted on the way: no temp file, no second
+    read. Memory is bounded by the parts in flight times the part size.
+    """
+    length = request.headers.get("content-length")
+    size_hint = int(length) if length and length.isdigit() else None
+    if size_hint == 0:
+        raise HTTPException(status_code=400, detail="No file provided")
 
-@router_files.get("/download/{filename}")
-async def get_file(filename: str) -> StreamingResponse:
     s3_client = get_s3_client()
+    digest = hashlib.sha256()
     try:
-        logging.info(f"Streaming file: {filename}")
-        chunk_generator = s3_client.download_file(filename, 1024 * 1024 * 3)
-        headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
-        logging.info(f"Streaming file: {filename} in download mode")
-        return StreamingResponse(
-            chunk_generator, media_type="application/octet-stream", headers=headers
+        size = await s3_client.upload_stream(
+            filename, request.stream(), size_hint, digest
         )
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail=f"File '{filename}' not found")
+        if size == 0:
+            await s3_client.delete_file(filename)
+            raise HTTPException(status_code=400, detail="No file provided")
+        logging.info(f"Uploaded file: {filename} with size: {size}")
+        meta = FileMeta(filename=filename, size=size)
+        await encode_or_link(s3_client, meta, digest.hexdigest(), output_format)
+    except HTTPException:
+        raise
+    except ClientDisconnect:
+        # the multipart upload is aborted, nothing was enqueued
+        logging.warning(f"Client disconnected while uploading {filename}")
+        raise HTTPException(status_code=400, detail="Upload interrupted")
     except Exception as e:
+        logging.error(f"Error uploading file {filename}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    return UploadResponse(status="accepted", files_count=1, files=[meta])
+
+
+@router_files.api_route("/streaming/{filename}", methods=["GET", "HEAD"])
+async def stream_video(filename: str, request: Request) -> Response:
+    logging.info(f"Streaming file: {filename}")
+    return await object_response(request, filename, "video/mp4", "inline")
+
+
+@router_files.api_route("/download/{filename}", methods=["GET", "HEAD"])
+async def get_file(filename: str, request: Request) -> Response:
+    logging.info(f"Downloading file: {filename}")
+    return await object_response(
+        request, filename, "application/octet-stream", "attachment"
+    )
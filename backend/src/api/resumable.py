@@ -0,0 +1,250 @@
+import base64
+import binascii
+import logging
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Any, Dict, Optional, Union
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+
+from ..config import get_upload_settings
+from ..models.upload_session import UploadSession
+from ..schemas.endpoint import ErrorResponse
+from ..schemas.enum import OutputFormat
+from ..services import get_s3_client
+from ..services.resumable import (
+    UploadConflict,
+    UploadExpired,
+    UploadNotFound,
+    append,
+    create_upload,
+    finish,
+    get_upload,
+    terminate,
+)
+
+TUS_VERSION = "1.0.0"
+TUS_EXTENSIONS = "creation,expiration,termination"
+OFFSET_CONTENT_TYPE = "application/offset+octet-stream"
+
+
+def check_tus_version(request: Request) -> None:
+    # OPTIONS is how a client discovers the version, it need not send one
+    if request.method == "OPTIONS":
+        return
+    if request.headers.get("Tus-Resumable") != TUS_VERSION:
+        raise HTTPException(
+            status_code=412,
+            detail=f"Tus-Resumable {TUS_VERSION} is required",
+            headers={"Tus-Version": TUS_VERSION},
+        )
+
+
+router_resumable = APIRouter(
+    prefix="/api/resumable",
+    tags=["uploads"],
+    dependencies=[Depends(check_tus_version)],
+)
+ERRORS: Dict[Union[int, str], Dict[str, Any]] = {
+    404: {"model": ErrorResponse},
+    409: {"model": ErrorResponse},
+    410: {"model": ErrorResponse},
+    412: {"model": ErrorResponse},
+    500: {"model": ErrorResponse},
+}
+
+
+# ----- Helpers -----
+def parse_metadata(header: Optional[str]) -> Dict[str, str]:
+    """
+    Upload-Metadata: comma separated keys, each followed by its base64 value.
+
+    Raises:
+        ValueError: A pair is malformed or a value is not base64 of UTF-8.
+    """
+    metadata: Dict[str, str] = {}
+    for pair in filter(None, (p.strip() for p in (header or "").split(","))):
+        key, _, value = pair.partition(" ")
+        if not key or " " in value.strip():
+            raise ValueError(pair)
+        try:
+            metadata[key] = base64.b64decode(value.strip(), validate=True).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            raise ValueError(pair)
+    return metadata
+
+
+def tus_headers(**headers: object) -> Dict[str, str]:
+    return {
+        "Tus-Resumable": TUS_VERSION,
+        **{name.replace("_", "-"): str(value) for name, value in headers.items()},
+    }
+
+
+def http_date(moment: datetime) -> str:
+    return format_datetime(moment.astimezone(timezone.utc), usegmt=True)
+
+
+async def load_upload(upload_id: uuid.UUID) -> UploadSession:
+    try:
+        return await get_upload(upload_id)
+    except UploadExpired:
+        raise HTTPException(status_code=410, detail=f"Upload '{upload_id}' expired")
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail=f"Upload '{upload_id}' not found")
+
+
+# ----- Endpoints -----
+@router_resumable.options("", status_code=204)
+async def describe_server() -> Response:
+    return Response(
+        status_code=204,
+        headers=tus_headers(
+            Tus_Version=TUS_VERSION,
+            Tus_Extension=TUS_EXTENSIONS,
+            Tus_Max_Size=get_upload_settings().UPLOAD_RESUMABLE_MAX_SIZE,
+        ),
+    )
+
+
+@router_resumable.post(
+    "",
+    status_code=201,
+    responses={400: {"model": ErrorResponse}, 413: {"model": ErrorResponse}, **ERRORS},
+)
+async def start_resumable_upload(
+    upload_length: Optional[int] = Header(None, ge=0),
+    upload_metadata: Optional[str] = Header(None),
+) -> Response:
+    """
+    Create a resumable upload, tus creation extension.
+
+    Upload-Metadata carries filename and, optionally, output_format. The
+    client then PATCHes the bytes to Location and, after a dropped
+    connection, asks HEAD for the offset to resume from.
+    """
+    settings = get_upload_settings()
+    if upload_length is None:
+        raise HTTPException(status_code=400, detail="Upload-Length is required")
+    if upload_length == 0:
+        raise HTTPException(status_code=400, detail="No file provided")
+    if upload_length > settings.UPLOAD_RESUMABLE_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Upload-Length exceeds {settings.UPLOAD_RESUMABLE_MAX_SIZE}",
+        )
+    try:
+        metadata = parse_metadata(upload_metadata)
+        filename = metadata["filename"]
+        output_format = (
+            OutputFormat(metadata["output_format"])
+            if "output_format" in metadata
+            else None
+        )
+    except (KeyError, ValueError):
+        raise HTTPException(
+            status_code=400,
+            detail="Upload-Metadata needs a filename and a valid output_format",
+        )
+    if not filename or "/" in filename:
+        raise HTTPException(status_code=400, detail="Filename must not contain '/'")
+
+    try:
+        upload = await create_upload(
+            get_s3_client(),
+            filename,
+            upload_length,
+            output_format,
+            settings.UPLOAD_RESUMABLE_TTL,
+        )
+    except Exception as e:
+        logging.error(f"Error creating resumable upload of {filename}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(
+        status_code=201,
+        headers=tus_headers(
+            Location=f"{router_resumable.prefix}/{upload.id}",
+            Upload_Expires=http_date(upload.expires_at),
+        ),
+    )
+
+
+@router_resumable.head("/{upload_id}", responses=ERRORS)
+async def upload_offset(upload_id: uuid.UUID) -> Response:
+    upload = await load_upload(upload_id)
+    if not upload.completed and upload.offset == upload.length:
+        # the client sees every byte stored and stops, the encode must follow
+        try:
+            upload = await finish(get_s3_client(), upload_id)
+        except UploadConflict:
+            pass
+        except Exception as e:
+            logging.error(f"Error finishing resumable upload {upload_id}: {e}")
+    return Response(
+        status_code=200,
+        headers=tus_headers(
+            Upload_Offset=upload.offset,
+            Upload_Length=upload.length,
+            Cache_Control="no-store",
+        ),
+    )
+
+
+@router_resumable.patch(
+    "/{upload_id}", status_code=204, responses={415: {"model": ErrorResponse}, **ERRORS}
+)
+async def append_chunk(
+    upload_id: uuid.UUID,
+    request: Request,
+    upload_offset: int = Header(..., ge=0),
+    content_type: Optional[str] = Header(None),
+) -> Response:
+    """
+    Write the body at Upload-Offset, streamed to S3 as it arrives.
+
+    Whatever reached the BFF before a dropped connection is kept; the upload
+    moves to the encoder on its last byte.
+    """
+    if content_type != OFFSET_CONTENT_TYPE:
+        raise HTTPException(
+            status_code=415, detail=f"Content-Type must be {OFFSET_CONTENT_TYPE}"
+        )
+    settings = get_upload_settings()
+    await load_upload(upload_id)
+    try:
+        upload = await append(
+            get_s3_client(),
+            upload_id,
+            upload_offset,
+            request.stream(),
+            settings.UPLOAD_RESUMABLE_LEASE,
+            settings.UPLOAD_RESUMABLE_TTL,
+        )
+    except UploadConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail=f"Upload '{upload_id}' not found")
+    except Exception as e:
+        logging.error(f"Error writing resumable upload {upload_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(
+        status_code=204,
+        headers=tus_headers(
+            Upload_Offset=upload.offset,
+            Upload_Expires=http_date(upload.expires_at),
+        ),
+    )
+
+
+@router_resumable.delete("/{upload_id}", status_code=204, responses=ERRORS)
+async def terminate_upload(upload_id: uuid.UUID) -> Response:
+    await load_upload(upload_id)
+    try:
+        await terminate(get_s3_client(), upload_id)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail=f"Upload '{upload_id}' not found")
+    except Exception as e:
+        logging.error(f"Error terminating resumable upload {upload_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(status_code=204, headers=tus_headers())
@@ -0,0 +1,176 @@
+import logging
+from typing import Any, Dict, Optional, Union
+
+from fastapi import APIRouter, HTTPException, Response
+
+from ..config import get_upload_settings
+from ..schemas.endpoint import EncodeJob, ErrorResponse, FileMeta, UploadResponse
+from ..schemas.upload import (
+    UploadSessionComplete,
+    UploadSessionCreate,
+    UploadSessionRead,
+    UploadSessionState,
+)
+from ..services import get_s3_client
+from ..services.dedup import forget_source
+from ..services.rabbit_client import publish_encode
+from ..services.upload_sessions import (
+    UploadSessionError,
+    abort_session,
+    close_session,
+    complete_session,
+    create_session,
+    is_expired,
+    load_session,
+    part_urls,
+    parts_count,
+    uploaded_parts,
+)
+
+router_uploads = APIRouter(prefix="/api/uploads", tags=["uploads"])
+ERRORS: Dict[Union[int, str], Dict[str, Any]] = {
+    404: {"model": ErrorResponse},
+    409: {"model": ErrorResponse},
+    410: {"model": ErrorResponse},
+    500: {"model": ErrorResponse},
+}
+
+
+async def get_session(session_id: str) -> UploadSessionState:
+    try:
+        state = await load_session(get_s3_client(), session_id)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=404, detail=f"Upload session '{session_id}' not found"
+        )
+    # the sweep aborts it soon, no point handing out more URLs
+    if is_expired(state, get_upload_settings().UPLOAD_SESSION_TTL):
+        raise HTTPException(
+            status_code=410, detail=f"Upload session '{session_id}' expired"
+        )
+    return state
+
+
+@router_uploads.post(
+    "", response_model=UploadSessionRead, status_code=201, responses=ERRORS
+)
+async def start_upload(body: UploadSessionCreate) -> UploadSessionRead:
+    """
+    Start an upload that goes straight to S3.
+
+    The client PUTs each part to its presigned URL, asks for more URLs with
+    GET /api/uploads/{session_id}, then calls complete. No video byte goes
+    through the BFF.
+    """
+    if "/" in body.filename:
+        raise HTTPException(status_code=400, detail="Filename must not contain '/'")
+    settings = get_upload_settings()
+    s3_client = get_s3_client()
+    try:
+        state = await create_session(s3_client, body)
+        urls = await part_urls(
+            s3_client,
+            state,
+            1,
+            settings.UPLOAD_URL_BATCH,
+            settings.UPLOAD_PART_URL_EXPIRES,
+        )
+    except Exception as e:
+        logging.error(f"Error starting upload of {body.filename}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return UploadSessionRead(
+        session_id=state.session_id,
+        key=state.key,
+        size=state.size,
+        part_size=state.part_size,
+        parts_count=parts_count(state.size, state.part_size),
+        urls=urls,
+        expires_in=settings.UPLOAD_PART_URL_EXPIRES,
+    )
+
+
+@router_uploads.get("/{session_id}", response_model=UploadSessionRead, responses=ERRORS)
+async def get_upload(session_id: str, first: Optional[int] = None) -> UploadSessionRead:
+    """
+    Parts already in S3, and fresh URLs from part ``first`` on; by default
+    from the first part S3 does not hold yet, which is where a client resumes.
+    """
+    settings = get_upload_settings()
+    s3_client = get_s3_client()
+    state = await get_session(session_id)
+    try:
+        uploaded = await uploaded_parts(s3_client, state)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=404, detail=f"Upload session '{session_id}' is closed"
+        )
+    if first is None:
+        held = {part.part_number for part in uploaded}
+        first = next(n for n in range(1, len(held) + 2) if n not in held)
+    urls = await part_urls(
+        s3_client,
+        state,
+        first,
+        settings.UPLOAD_URL_BATCH,
+        settings.UPLOAD_PART_URL_EXPIRES,
+    )
+    return UploadSessionRead(
+        session_id=state.session_id,
+        key=state.key,
+        size=state.size,
+        part_size=state.part_size,
+        parts_count=parts_count(state.size, state.part_size),
+        urls=urls,
+        expires_in=settings.UPLOAD_PART_URL_EXPIRES,
+        uploaded=uploaded,
+    )
+
+
+@router_uploads.post(
+    "/{session_id}/complete", response_model=UploadResponse, responses=ERRORS
+)
+async def complete_upload(
+    session_id: str, body: Optional[UploadSessionComplete] = None
+) -> UploadResponse:
+    """
+    Assemble the object from the parts S3 holds and start its encode.
+
+    Parts the client reports are checked against S3, so a part overwritten
+    by a stray retry fails the call instead of corrupting the video.
+    """
+    s3_client = get_s3_client()
+    state = await get_session(session_id)
+    try:
+        await complete_session(
+            s3_client, state, body.parts if body is not None else None
+        )
+        # no hash here: the BFF never sees the bytes, nothing to deduplicate
+        # on, and a hash recorded for an earlier upload of the name is void
+        await forget_source(s3_client, state.key)
+        await publish_encode(
+            EncodeJob(
+                video_id=state.key, output_format=state.output_format, size=state.size
+            )
+        )
+        await close_session(s3_client, state)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error completing upload of {state.key}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return UploadResponse(
+        status="accepted",
+        files_count=1,
+        files=[FileMeta(filename=state.key, size=state.size)],
+    )
+
+
+@router_uploads.delete("/{session_id}", status_code=204, responses=ERRORS)
+async def abort_upload(session_id: str) -> Response:
+    state = await get_session(session_id)
+    try:
+        await abort_session(get_s3_client(), state)
+    except Exception as e:
+        logging.error(f"Error aborting upload of {state.key}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(status_code=204)
@@ -0,0 +1,105 @@
+import hashlib
+import logging
+from pathlib import PurePosixPath
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import RedirectResponse
+
+from ..config import get_hls_settings
+from ..services import get_s3_client
+from ..services.dedup import relink_playlist, relink_webvtt
+from ..services.s3_client import guess_content_type
+from .files import object_response
+
+router_videos = APIRouter(prefix="/api/videos", tags=["videos"])
+
+# read and rewritten by the BFF, they are small
+PLAYLIST_SUFFIXES = (".m3u8", ".vtt")
+# segments, fMP4 init sections, sprite sheets and posters
+MEDIA_SUFFIXES = (".ts", ".m4s", ".mp4", ".jpg", ".webp")
+# work files of chunked encodes are never served
+PRIVATE_DIRS = ("chunks",)
+
+
+def hls_key(video_id: str, path: str) -> str:
+    """
+    S3 key of a file of the HLS output of a video.
+
+    Raises:
+        HTTPException: 404 for anything but a published playlist or media file.
+    """
+    parts = PurePosixPath(path).parts
+    if (
+        not parts
+        or any(part in ("..", ".") for part in parts)
+        or parts[0] in PRIVATE_DIRS
+        or PurePosixPath(path).suffix not in PLAYLIST_SUFFIXES + MEDIA_SUFFIXES
+    ):
+        raise HTTPException(status_code=404, detail=f"No HLS file '{path}'")
+    return f"{video_id}/{path}"
+
+
+def route_aliases(uri: str, depth: int = 0) -> str:
+    """
+    A deduplicated upload's master points at ../<original>/..., the S3 layout,
+    its thumbnail index, one directory down, at ../../<original>/.... Under
+    /api/videos/<id>/hls/ the original lives one more level up.
+    """
+    up = "../" * (depth + 1)
+    original, sep, rest = uri[len(up) :].partition("/")
+    if not uri.startswith(up) or not sep or original in ("", "..", "."):
+        return uri
+    return f"{'../' * (depth + 2)}{original}/hls/{rest}"
+
+
+@router_videos.api_route("/{video_id}/hls/{path:path}", methods=["GET", "HEAD"])
+async def hls_file(video_id: str, path: str, request: Request) -> Response:
+    """
+    Serve the master and media playlists of a video, and its segments.
+
+    Playlists go through the BFF. Segments are streamed with Range support,
+    or 302-redirected to a short-lived presigned S3 URL when
+    HLS_PRESIGNED_REDIRECT is set, so their bytes never pass through Python.
+    """
+    settings = get_hls_settings()
+    key = hls_key(video_id, path)
+    s3_client = get_s3_client()
+    media_type = guess_content_type(key)
+
+    if key.endswith(PLAYLIST_SUFFIXES):
+        try:
+            text = (await s3_client.read_object(key)).decode()
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"No HLS file '{path}'")
+        except Exception as e:
+            logging.error(f"Error reading playlist {key}: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        if "../" in text:
+            depth = path.count("/")
+            relink = relink_playlist if key.endswith(".m3u8") else relink_webvtt
+            text = relink(text, lambda uri: route_aliases(uri, depth))
+        body = text.encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        headers = {
+            "Cache-Control": f"public, max-age={settings.HLS_PLAYLIST_MAX_AGE}",
+            "ETag": etag,
+        }
+        if etag in request.headers.get("if-none-match", "").split(", "):
+            return Response(status_code=304, headers=headers)
+        return Response(body, headers=headers, media_type=media_type)
+
+    if settings.HLS_PRESIGNED_REDIRECT:
+        url = await s3_client.presigned_url(key, settings.HLS_PRESIGN_EXPIRES)
+        # the redirect must not outlive the signature it points at
+        max_age = settings.HLS_PRESIGN_EXPIRES // 2
+        return RedirectResponse(
+            url,
+            status_code=302,
+            headers={"Cache-Control": f"private, max-age={max_age}"},
+        )
+    return await object_response(
+        request,
+        key,
+        media_type,
+        cache_control=f"public, max-age={settings.HLS_SEGMENT_MAX_AGE}",
+    )
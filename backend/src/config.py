@@ -1,5 +1,6 @@
 from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -26,10 +27,54 @@ class S3Settings(BaseAppSettings):
     MINIO_ENDPOINT_URL: str
     MINIO_BUCKET_NAME: str
     MINIO_REGION_NAME: str
+    # endpoint browsers reach MinIO at, when it differs from the internal one
+    MINIO_PUBLIC_ENDPOINT_URL: Optional[str] = None
+    S3_PART_SIZE: int = 1024 * 1024 * 10
+    # parts in flight x part size bounds the memory of one upload
+    S3_MAX_PARTS_IN_FLIGHT: int = 4
+    # ranged GETs requested ahead of the consumer
+    S3_DOWNLOAD_PREFETCH: int = 4
+    S3_MAX_POOL_CONNECTIONS: int = 20
+    # seconds an idle pooled connection is kept open
+    S3_KEEPALIVE_TIMEOUT: float = 60
+    # attempts per S3 call, with full-jitter exponential backoff in between
+    S3_RETRY_ATTEMPTS: int = 5
+    S3_RETRY_BASE_DELAY: float = 0.2
+    S3_RETRY_MAX_DELAY: float = 10
 
     model_config = SettingsConfigDict(env_file=str(BASE_DIR / "s3.env"))
 
 
+class HLSSettings(BaseAppSettings):
+    # 302 segment requests to presigned S3 URLs instead of proxying them
+    HLS_PRESIGNED_REDIRECT: bool = False
+    # lifetime of a presigned segment URL, seconds
+    HLS_PRESIGN_EXPIRES: int = 300
+    # seconds players and CDNs may cache playlists and segments
+    HLS_PLAYLIST_MAX_AGE: int = 60
+    HLS_SEGMENT_MAX_AGE: int = 86400
+
+    model_config = SettingsConfigDict(env_file=str(BASE_DIR / "hls.env"))
+
+
+class UploadSettings(BaseAppSettings):
+    # lifetime of a presigned part URL, seconds
+    UPLOAD_PART_URL_EXPIRES: int = 3600
+    # part URLs handed out per request, the client asks for more as it goes
+    UPLOAD_URL_BATCH: int = 100
+    # seconds a presigned upload session may take before it is aborted
+    UPLOAD_SESSION_TTL: int = 24 * 3600
+    # resumable uploads: largest accepted, and seconds an idle one is kept
+    UPLOAD_RESUMABLE_MAX_SIZE: int = 50 * 1024**3
+    UPLOAD_RESUMABLE_TTL: int = 24 * 3600
+    # seconds a PATCH holds its upload without storing a part
+    UPLOAD_RESUMABLE_LEASE: int = 300
+    # seconds between two sweeps of expired uploads
+    UPLOAD_CLEANUP_INTERVAL: int = 600
+
+    model_config = SettingsConfigDict(env_file=str(BASE_DIR / "upload.env"))
+
+
 @lru_cache()
 def get_database_settings() -> DatabaseSettings:
     return DatabaseSettings()
@@ -38,3 +83,13 @@ def get_database_settings() -> DatabaseSettings:
 @lru_cache()
 def get_s3_settings() -> S3Settings:
     return S3Settings()
+
+
+@lru_cache()
+def get_hls_settings() -> HLSSettings:
+    return HLSSettings()
+
+
+@lru_cache()
+def get_upload_settings() -> UploadSettings:
+    return UploadSettings()
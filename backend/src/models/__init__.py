@@ -1,9 +1,19 @@
 from .comments import Comment
 from .hls_files import HLSFile
 from .playlist import Playlist
+from .upload_session import UploadSession
 from .user import User
 from .video import Video
 from .video_likes import VideoLike
 from .video_views import VideoView
 
-__all__ = ["User", "Video", "VideoLike", "VideoView", "Comment", "Playlist", "HLSFile"]
+__all__ = [
+    "User",
+    "Video",
+    "VideoLike",
+    "VideoView",
+    "Comment",
+    "Playlist",
+    "HLSFile",
+    "UploadSession",
+]
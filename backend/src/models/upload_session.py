@@ -0,0 +1,50 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import BigInteger, Boolean, DateTime, Enum, String, func
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..schemas.enum import OutputFormat
+from ..services.database import Base
+
+
+class UploadSession(Base):
+    """A resumable upload, filled chunk by chunk into an S3 multipart upload."""
+
+    __tablename__ = "upload_sessions"
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    # object key, the video id
+    key: Mapped[str] = mapped_column(String, nullable=False)
+    s3_upload_id: Mapped[str] = mapped_column(String, nullable=False)
+    length: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    part_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # bytes stored: the committed parts plus the tail object
+    offset: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    # [{"PartNumber": n, "ETag": "..."}], every part part_size bytes
+    parts: Mapped[List[Dict[str, Any]]] = mapped_column(
+        JSONB, nullable=False, default=list
+    )
+    # bytes past the last part, kept in S3 until a part fills up
+    tail_size: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    output_format: Mapped[Optional[OutputFormat]] = mapped_column(
+        Enum(OutputFormat), nullable=True
+    )
+    completed: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    # a PATCH in progress holds the session until lease_until
+    lease_token: Mapped[Optional[uuid.UUID]] = mapped_column(
+        UUID(as_uuid=True), nullable=True
+    )
+    lease_until: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
@@ -1,11 +1,17 @@
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 
+from .enum import OutputFormat, OwnerTier
+
 
 class FileMeta(BaseModel):
     filename: str
     size: int
+    # sha256 of the uploaded bytes
+    hash: Optional[str] = None
+    # set when the same bytes were already encoded, the upload reuses them
+    duplicate_of: Optional[str] = None
 
 
 class UploadResponse(BaseModel):
@@ -19,6 +25,29 @@ class ErrorResponse(BaseModel):
     message: str
 
 
+class EncodeJob(BaseModel):
+    video_id: str
+    # None lets the convertor use its configured default
+    output_format: Optional[OutputFormat] = None
+    # the convertor schedules on these, long sources go to a lane of their own
+    size: Optional[int] = None
+    duration: Optional[float] = None
+    tier: OwnerTier = OwnerTier.STANDARD
+
+
+class EncodeProgress(BaseModel):
+    frame: int
+    fps: float
+    speed: float
+    out_time: float
+    percent: Optional[float] = None
+    done: bool = False
+
+
 class StatusMessage(BaseModel):
     video_id: str
     status: str
+    ladder: Optional[List[str]] = None
+    # set on "encoding" events, chunk names the part of a chunked encode
+    progress: Optional[EncodeProgress] = None
+    chunk: Optional[str] = None
@@ -11,3 +11,16 @@ class Privacy(str, enum.Enum):
     PUBLIC = "public"
     PRIVATE = "private"
     UNLISTED = "unlisted"
+
+
+class OutputFormat(str, enum.Enum):
+    TS = "ts"
+    FMP4 = "fmp4"
+    # one fMP4 file per rendition, segments addressed by byte range
+    FMP4_SINGLE = "fmp4_single"
+
+
+class OwnerTier(str, enum.Enum):
+    FREE = "free"
+    STANDARD = "standard"
+    PREMIUM = "premium"
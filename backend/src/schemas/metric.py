@@ -22,3 +22,9 @@ RESPONSES_TOTAL = Counter(
     "Total number of responses",
     ["status_code", "method", "path"],
 )
+
+S3_DOWNLOAD_STALL_HIST = Histogram(
+    "s3_download_stall_seconds",
+    "Time a streaming S3 download spent waiting on S3 instead of sending data",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
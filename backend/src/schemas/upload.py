@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from .enum import OutputFormat
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(min_length=1)
+    size: int = Field(gt=0)
+    output_format: Optional[OutputFormat] = None
+
+
+class PartUrl(BaseModel):
+    part_number: int
+    url: str
+
+
+class UploadedPart(BaseModel):
+    part_number: int
+    etag: str
+    size: Optional[int] = None
+
+
+class UploadSessionRead(BaseModel):
+    session_id: str
+    key: str
+    size: int
+    # every part but the last has exactly this size
+    part_size: int
+    parts_count: int
+    # presigned PUT URLs, valid for expires_in seconds
+    urls: List[PartUrl] = []
+    expires_in: int
+    # parts S3 already holds, a client resumes after them
+    uploaded: List[UploadedPart] = []
+
+
+class UploadSessionComplete(BaseModel):
+    # ETags the client got back from S3, checked against what S3 holds
+    parts: Optional[List[UploadedPart]] = None
+
+
+class UploadSessionState(BaseModel):
+    """What the BFF keeps about a session between requests, in S3."""
+
+    session_id: str
+    key: str
+    upload_id: str
+    size: int
+    part_size: int
+    output_format: Optional[OutputFormat] = None
+    created_at: datetime
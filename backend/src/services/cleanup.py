@@ -0,0 +1,20 @@
+import asyncio
+import logging
+
+from .resumable import cleanup_expired
+from .s3_client import S3Client
+from .upload_sessions import cleanup_expired_sessions
+
+
+async def run_cleanup(s3: S3Client, interval: float, session_ttl: int) -> None:
+    """Sweep abandoned uploads of both kinds every interval seconds."""
+    while True:
+        try:
+            await cleanup_expired(s3)
+        except Exception as e:
+            logging.error(f"Sweep of expired uploads failed: {e}")
+        try:
+            await cleanup_expired_sessions(s3, session_ttl)
+        except Exception as e:
+            logging.error(f"Sweep of expired upload sessions failed: {e}")
+        await asyncio.sleep(interval)
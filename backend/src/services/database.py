@@ -1,5 +1,5 @@
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 
 from sqlalchemy import MetaData
 from sqlalchemy.ext.asyncio import (
@@ -16,13 +16,21 @@ metadata = MetaData()
 Base = declarative_base(metadata=metadata)
 
 
+_engine: Optional[AsyncEngine] = None
+
+
 async def get_engine() -> AsyncEngine:
-    settings = get_database_settings()
-    database_url = (
-        f"postgresql+asyncpg://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}"
-        f"@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
-    )
-    return create_async_engine(database_url, echo=True)
+    """One engine and connection pool per process, created on first use."""
+    global _engine
+    if _engine is None:
+        settings = get_database_settings()
+        database_url = (
+            f"postgresql+asyncpg://{settings.POSTGRES_USER}:"
+            f"{settings.POSTGRES_PASSWORD}"
+            f"@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
+        )
+        _engine = create_async_engine(database_url, echo=True)
+    return _engine
 
 
 async def get_async_session_maker() -> async_sessionmaker:
@@ -0,0 +1,134 @@
+import json
+import logging
+import re
+from typing import Callable, Optional
+from urllib.parse import quote
+
+from .s3_client import S3Client
+
+HASH_PREFIX = "hashes"
+# digest of the source a video was last uploaded with, next to its master
+SOURCE_DIGEST = "source.sha256"
+THUMBNAILS_DIR = "thumbnails"
+INDEX_NAME = "thumbnails.vtt"
+URI_ATTR_RE = re.compile(r'URI="([^"]+)"')
+
+
+def hash_key(digest: str) -> str:
+    return f"{HASH_PREFIX}/{digest}"
+
+
+def digest_key(video_id: str) -> str:
+    return f"{video_id}/{SOURCE_DIGEST}"
+
+
+def relink_playlist(text: str, relink: Callable[[str], str]) -> str:
+    """Rewrite every URI of a playlist, URI lines and URI attributes alike."""
+    lines = []
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            line = relink(line.strip())
+        elif "URI=" in line:
+            line = URI_ATTR_RE.sub(lambda m: f'URI="{relink(m.group(1))}"', line)
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def relink_webvtt(text: str, relink: Callable[[str], str]) -> str:
+    """Rewrite the URI of every cue of a WebVTT index, the line after its timing."""
+    lines = []
+    after_timing = False
+    for line in text.splitlines():
+        timing = "-->" in line
+        if after_timing and line.strip():
+            line = relink(line.strip())
+        after_timing = timing
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def _relative_to(base: str) -> Callable[[str], str]:
+    def relink(uri: str) -> str:
+        return uri if "://" in uri or uri.startswith("/") else base + uri
+
+    return relink
+
+
+def link_master_playlist(text: str, original: str) -> str:
+    """
+    Point every URI of a master playlist at the renditions of another video.
+
+    The linked master lives next to the original one, so each URI is made
+    relative to the original prefix.
+    """
+    return relink_playlist(text, _relative_to(f"../{quote(original)}/"))
+
+
+def link_thumbnail_index(text: str, original: str) -> str:
+    """Point the cues of a WebVTT index at the sprite sheets of another video."""
+    return relink_webvtt(
+        text, _relative_to(f"../../{quote(original)}/{THUMBNAILS_DIR}/")
+    )
+
+
+async def find_encoded(s3: S3Client, digest: str) -> Optional[str]:
+    """
+    Video id already encoded from the same bytes, if its renditions are
+    published. Videos still encoding or failed do not count, nor a video
+    re-uploaded since with other bytes under the same name.
+    """
+    key = hash_key(digest)
+    if not await s3.exists(key):
+        return None
+    video_id = json.loads(await s3.read_object(key))["video_id"]
+    try:
+        current = (await s3.read_object(digest_key(video_id))).decode()
+    except FileNotFoundError:
+        current = None
+    if current != digest:
+        logging.info(f"Hash {digest[:12]} is stale, {video_id} was replaced")
+        await s3.delete_file(key)
+        return None
+    if not await s3.exists(f"{video_id}/master.m3u8"):
+        return None
+    return video_id
+
+
+async def record_source(s3: S3Client, video_id: str, digest: str) -> None:
+    """Remember which bytes video_id now holds, any older hash entry goes stale."""
+    await s3.put_bytes(digest_key(video_id), digest.encode())
+
+
+async def forget_source(s3: S3Client, video_id: str) -> None:
+    """video_id now holds bytes the BFF never hashed, its hash entries go stale."""
+    await s3.delete_file(digest_key(video_id))
+
+
+async def register_hash(s3: S3Client, digest: str, video_id: str) -> None:
+    await s3.put_bytes(hash_key(digest), json.dumps({"video_id": video_id}).encode())
+
+
+async def link_renditions(s3: S3Client, original: str, video_id: str) -> None:
+    """
+    Publish video_id as an alias of the renditions of original, with its
+    seek-preview index and poster.
+    """
+    master = (await s3.read_object(f"{original}/master.m3u8")).decode()
+    thumbnails = f"{original}/{THUMBNAILS_DIR}/"
+    try:
+        index: Optional[str] = (await s3.read_object(thumbnails + INDEX_NAME)).decode()
+    except FileNotFoundError:
+        index = None
+    if index is not None:
+        await s3.put_bytes(
+            f"{video_id}/{THUMBNAILS_DIR}/{INDEX_NAME}",
+            link_thumbnail_index(index, original).encode(),
+        )
+    # a player takes the poster from its own video, it cannot follow a link
+    for key in await s3.list_keys(thumbnails + "poster."):
+        await s3.copy_object(key, f"{video_id}/{key[len(original) + 1 :]}")
+    # the master goes last, it is what makes the alias published
+    await s3.put_bytes(
+        f"{video_id}/master.m3u8", link_master_playlist(master, original).encode()
+    )
+    logging.info(f"Video {video_id} linked to renditions of {original}")
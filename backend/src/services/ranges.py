@@ -0,0 +1,77 @@
+from typing import List, Optional, Tuple
+
+# more ranges than this in one request are served as the whole object
+MAX_RANGES = 16
+
+ByteRange = Tuple[int, int]
+
+
+class RangeNotSatisfiable(ValueError):
+    """No range of the header overlaps the object, answered with a 416."""
+
+
+def _parse_spec(spec: str, size: int) -> Optional[ByteRange]:
+    """
+    One range spec of a Range header, as inclusive offsets clamped to the
+    object, or None when it lies past its end.
+
+    Raises:
+        ValueError: The spec is malformed.
+    """
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        raise ValueError(spec)
+    if not first:
+        # suffix range: the last N bytes
+        length = int(last)
+        if length <= 0 or size == 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else None
+    if start < 0 or (end is not None and end < start):
+        raise ValueError(spec)
+    if start >= size:
+        return None
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[List[ByteRange]]:
+    """
+    Byte ranges a Range header asks for, sorted with overlapping and adjacent
+    ones merged.
+
+    Returns None when the whole object should be served: no header, a unit
+    other than bytes, a malformed header (RFC 9110 lets a server ignore it)
+    or too many ranges.
+
+    Raises:
+        RangeNotSatisfiable: No range overlaps the object.
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    try:
+        parsed = [_parse_spec(spec, size) for spec in specs.split(",")]
+    except ValueError:
+        return None
+    ranges = sorted(r for r in parsed if r is not None)
+    if not ranges:
+        raise RangeNotSatisfiable(header)
+
+    merged: List[ByteRange] = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def content_range(byte_range: ByteRange, size: int) -> str:
+    return f"bytes {byte_range[0]}-{byte_range[1]}/{size}"
@@ -0,0 +1,351 @@
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, cast
+
+from sqlalchemy import ColumnElement, CursorResult, delete, or_, select, update
+from starlette.requests import ClientDisconnect
+
+from ..models.upload_session import UploadSession
+from ..schemas.endpoint import EncodeJob
+from ..schemas.enum import OutputFormat
+from .database import get_async_session
+from .dedup import forget_source
+from .rabbit_client import publish_encode
+from .s3_client import S3Client, choose_part_size
+
+TAIL_PREFIX = "resumable"
+# seconds an enqueue of an assembled upload holds it
+PUBLISH_LEASE = 60
+
+
+class UploadNotFound(LookupError):
+    """No such resumable upload."""
+
+
+class UploadExpired(UploadNotFound):
+    """The upload expired and is being cleaned up."""
+
+
+class UploadConflict(ValueError):
+    """The request does not continue the upload where it stands."""
+
+
+def tail_key(upload_id: uuid.UUID) -> str:
+    return f"{TAIL_PREFIX}/{upload_id}/tail"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _unleased(now: datetime) -> ColumnElement[bool]:
+    """No PATCH holds the upload, or its lease ran out."""
+    return or_(
+        UploadSession.lease_until.is_(None),
+        UploadSession.lease_until < now,
+    )
+
+
+async def create_upload(
+    s3: S3Client,
+    key: str,
+    length: int,
+    output_format: Optional[OutputFormat],
+    ttl: int,
+) -> UploadSession:
+    upload = UploadSession(
+        id=uuid.uuid4(),
+        key=key,
+        s3_upload_id=await s3.create_multipart_upload(key),
+        length=length,
+        part_size=choose_part_size(length, s3.part_size),
+        offset=0,
+        parts=[],
+        tail_size=0,
+        output_format=output_format,
+        completed=False,
+        expires_at=_now() + timedelta(seconds=ttl),
+    )
+    async with get_async_session() as db:
+        db.add(upload)
+        await db.commit()
+    logging.info(f"Resumable upload {upload.id} of {key} created, {length} bytes")
+    return upload
+
+
+async def get_upload(upload_id: uuid.UUID) -> UploadSession:
+    """
+    Raises:
+        UploadNotFound: There is no such upload.
+        UploadExpired: It expired before it was completed.
+    """
+    async with get_async_session() as db:
+        upload = await db.get(UploadSession, upload_id)
+    if upload is None:
+        raise UploadNotFound(str(upload_id))
+    if not upload.completed and upload.expires_at < _now():
+        raise UploadExpired(str(upload_id))
+    return upload
+
+
+async def _acquire(upload: UploadSession, token: uuid.UUID, lease: int) -> None:
+    """Take the upload for one PATCH, unless another one holds it."""
+    now = _now()
+    statement = (
+        update(UploadSession)
+        .where(
+            UploadSession.id == upload.id,
+            UploadSession.offset == upload.offset,
+            UploadSession.completed.is_(False),
+            _unleased(now),
+        )
+        .values(lease_token=token, lease_until=now + timedelta(seconds=lease))
+    )
+    async with get_async_session() as db:
+        # DML results are cursor results, rowcount says if the row matched
+        result = cast(CursorResult[Any], await db.execute(statement))
+        await db.commit()
+    if result.rowcount != 1:
+        raise UploadConflict(f"Upload {upload.id} is being written by another request")
+
+
+async def _store(
+    upload_id: uuid.UUID, token: uuid.UUID, values: Dict[str, Any]
+) -> None:
+    """
+    Record progress of the PATCH holding the lease.
+
+    Raises:
+        UploadConflict: The lease expired and another request took over.
+    """
+    statement = (
+        update(UploadSession)
+        .where(UploadSession.id == upload_id, UploadSession.lease_token == token)
+        .values(**values)
+    )
+    async with get_async_session() as db:
+        result = cast(CursorResult[Any], await db.execute(statement))
+        await db.commit()
+    if result.rowcount != 1:
+        raise UploadConflict(f"Upload {upload_id} was taken over by another request")
+
+
+async def _release(upload_id: uuid.UUID, token: uuid.UUID) -> None:
+    try:
+        await _store(upload_id, token, {"lease_token": None, "lease_until": None})
+    except UploadConflict:
+        pass
+
+
+async def _publish(s3: S3Client, upload: UploadSession, token: uuid.UUID) -> None:
+    """Enqueue the encode of an assembled upload, then mark it completed."""
+    # resumable uploads are not hashed, each chunk may hit another worker
+    await forget_source(s3, upload.key)
+    await publish_encode(
+        EncodeJob(
+            video_id=upload.key,
+            output_format=upload.output_format,
+            size=upload.length,
+        )
+    )
+    await _store(
+        upload.id, token, {"completed": True, "lease_token": None, "lease_until": None}
+    )
+    logging.info(f"Resumable upload {upload.id} of {upload.key} completed")
+
+
+async def _finish(s3: S3Client, upload: UploadSession) -> UploadSession:
+    token = uuid.uuid4()
+    await _acquire(upload, token, PUBLISH_LEASE)
+    try:
+        await _publish(s3, upload, token)
+    except Exception:
+        await _release(upload.id, token)
+        raise
+    return await get_upload(upload.id)
+
+
+async def finish(s3: S3Client, upload_id: uuid.UUID) -> UploadSession:
+    """
+    Enqueue an upload whose bytes are all in S3 but whose encode was not
+    enqueued, the request that assembled it failed on the way. A no-op for
+    any other upload.
+
+    Raises:
+        UploadConflict: Another request is finishing it.
+    """
+    upload = await get_upload(upload_id)
+    if upload.completed or upload.offset != upload.length:
+        return upload
+    return await _finish(s3, upload)
+
+
+async def append(
+    s3: S3Client,
+    upload_id: uuid.UUID,
+    offset: int,
+    stream: AsyncIterator[bytes],
+    lease: int,
+    ttl: int,
+) -> UploadSession:
+    """
+    Append a chunk at offset, the tus PATCH.
+
+    Bytes are cut into parts of the session's part size. Every full part is
+    uploaded and recorded at once, the bytes left over go to a tail object in
+    S3, so a dropped connection loses nothing that reached the BFF. Once the
+    last byte arrives the multipart upload is completed and the encode
+    enqueued.
+
+    Returns:
+        UploadSession: The upload as this request left it.
+
+    Raises:
+        UploadConflict: offset is not where the upload stands, the body runs
+            past its length or another request is writing it.
+    """
+    upload = await get_upload(upload_id)
+    if upload.completed:
+        raise UploadConflict(f"Upload {upload_id} is already complete")
+    if offset != upload.offset:
+        raise UploadConflict(
+            f"Upload-Offset {offset}, the upload is at {upload.offset}"
+        )
+    if upload.offset == upload.length:
+        # a PATCH at the end carries no bytes, it retries the enqueue
+        return await _finish(s3, upload)
+    token = uuid.uuid4()
+    await _acquire(upload, token, lease)
+
+    parts: List[Dict[str, Any]] = list(upload.parts)
+    buffer = bytearray()
+    if upload.tail_size:
+        buffer += await s3.read_object(tail_key(upload.id))
+        if len(buffer) != upload.tail_size:
+            await _release(upload.id, token)
+            raise UploadConflict(f"Tail of upload {upload_id} does not match")
+    received = upload.offset
+
+    def progress(**values: Any) -> Dict[str, Any]:
+        return {
+            "lease_until": _now() + timedelta(seconds=lease),
+            "expires_at": _now() + timedelta(seconds=ttl),
+            **values,
+        }
+
+    try:
+        try:
+            async for piece in stream:
+                received += len(piece)
+                if received > upload.length:
+                    raise UploadConflict(
+                        f"Body runs past Upload-Length {upload.length}"
+                    )
+                buffer += piece
+                while len(buffer) >= upload.part_size:
+                    number = len(parts) + 1
+                    etag = await s3.upload_part(
+                        upload.key,
+                        upload.s3_upload_id,
+                        number,
+                        bytes(buffer[: upload.part_size]),
+                    )
+                    del buffer[: upload.part_size]
+                    parts.append({"PartNumber": number, "ETag": etag})
+                    # the old tail is part of this part now
+                    await _store(
+                        upload.id,
+                        token,
+                        progress(
+                            parts=parts,
+                            offset=len(parts) * upload.part_size,
+                            tail_size=0,
+                        ),
+                    )
+        except ClientDisconnect:
+            logging.info(f"Upload {upload_id} interrupted at byte {received}")
+
+        stored = len(parts) * upload.part_size + len(buffer)
+        if stored == upload.length:
+            if buffer or not parts:
+                parts.append(
+                    {
+                        "PartNumber": len(parts) + 1,
+                        "ETag": await s3.upload_part(
+                            upload.key,
+                            upload.s3_upload_id,
+                            len(parts) + 1,
+                            bytes(buffer),
+                        ),
+                    }
+                )
+            await s3.complete_multipart_upload(upload.key, upload.s3_upload_id, parts)
+            # assembled: should the enqueue fail, HEAD or a PATCH at the end
+            # retries it, the multipart upload takes no more parts
+            await _store(
+                upload.id,
+                token,
+                progress(parts=parts, offset=upload.length, tail_size=0),
+            )
+            if upload.tail_size:
+                await s3.delete_file(tail_key(upload.id))
+            await _publish(s3, upload, token)
+        else:
+            if buffer:
+                await s3.put_bytes(tail_key(upload.id), bytes(buffer))
+            await _store(
+                upload.id,
+                token,
+                progress(
+                    offset=stored,
+                    tail_size=len(buffer),
+                    lease_token=None,
+                    lease_until=None,
+                ),
+            )
+    except Exception:
+        # what was recorded stays valid, the client resumes from HEAD
+        await _release(upload.id, token)
+        raise
+    return await get_upload(upload_id)
+
+
+async def terminate(s3: S3Client, upload_id: uuid.UUID) -> None:
+    upload = await get_upload(upload_id)
+    await _discard(s3, upload)
+
+
+async def _discard(s3: S3Client, upload: UploadSession) -> None:
+    if not upload.completed and upload.offset < upload.length:
+        await s3.abort_multipart_upload(upload.key, upload.s3_upload_id)
+        await s3.delete_file(tail_key(upload.id))
+    async with get_async_session() as db:
+        await db.execute(delete(UploadSession).where(UploadSession.id == upload.id))
+        await db.commit()
+
+
+async def cleanup_expired(s3: S3Client) -> int:
+    """Abort expired uploads and forget finished ones, returns how many."""
+    now = _now()
+    async with get_async_session() as db:
+        expired = (
+            await db.scalars(
+                select(UploadSession).where(
+                    UploadSession.expires_at < now,
+                    _unleased(now),
+                )
+            )
+        ).all()
+    for upload in expired:
+        try:
+            if not upload.completed and upload.offset == upload.length:
+                # every byte is in S3, only the enqueue is missing
+                await _finish(s3, upload)
+                continue
+            await _discard(s3, upload)
+        except Exception as e:
+            logging.error(f"Failed to clean up upload {upload.id}: {e}")
+    if expired:
+        logging.info(f"Cleaned up {len(expired)} expired resumable uploads")
+    return len(expired)
@@ -1,13 +1,166 @@
+import asyncio
+import hashlib
 import logging
-from contextlib import asynccontextmanager
-from typing import AsyncGenerator, BinaryIO, Dict, Optional
+import mimetypes
+import random
+import time
+from collections import deque
+from contextlib import AsyncExitStack, aclosing, asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import PurePosixPath
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
+from aiobotocore.config import AioConfig
 from aiobotocore.session import AioBaseClient, get_session
-from botocore.exceptions import ClientError
+from botocore.exceptions import ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as BotoConnectionError
 
 from ..config import get_s3_settings
+from ..schemas.metric import S3_DOWNLOAD_STALL_HIST
 
 PART_SIZE = 1024 * 1024 * 10
+MAX_PARTS = 10000
+MIB = 1024 * 1024
+READ_SIZE = 256 * 1024
+# S3 and MinIO error codes worth another attempt, any other error is final
+RETRYABLE_CODES = frozenset(
+    {
+        "InternalError",
+        "ServiceUnavailable",
+        "SlowDown",
+        "RequestTimeout",
+        "RequestTimeTooSkewed",
+        "Throttling",
+        "ThrottlingException",
+        "RequestLimitExceeded",
+        "XMinioServerNotInitialized",
+    }
+)
+
+T = TypeVar("T")
+
+
+CONTENT_TYPES: Dict[str, str] = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+    ".vtt": "text/vtt",
+}
+
+
+def guess_content_type(filename: str) -> str:
+    suffix = PurePosixPath(filename).suffix.lower()
+    if suffix in CONTENT_TYPES:
+        return CONTENT_TYPES[suffix]
+    content_type, _ = mimetypes.guess_type(filename)
+    return content_type or "application/octet-stream"
+
+
+def choose_part_size(size: Optional[int], part_size: int = PART_SIZE) -> int:
+    """
+    Grow the part size for very large objects so they still fit in the
+    10000 parts S3 allows for a multipart upload.
+    """
+    if size is None or size <= part_size * MAX_PARTS:
+        return part_size
+    needed = -(-size // MAX_PARTS)
+    return -(-needed // MIB) * MIB
+
+
+def remaining_size(file_obj: BinaryIO) -> Optional[int]:
+    try:
+        if not file_obj.seekable():
+            return None
+        position = file_obj.tell()
+        size = file_obj.seek(0, 2)
+        file_obj.seek(position)
+        return size - position
+    except (AttributeError, OSError):
+        return None
+
+
+async def read_chunks(
+    file_obj: BinaryIO, chunk_size: int, digest: Optional["hashlib._Hash"] = None
+) -> AsyncIterator[bytes]:
+    """
+    Read a blocking file object in a worker thread, one chunk at a time.
+
+    When a digest is given every chunk is fed to it in the same thread, so
+    hashing costs no extra read and does not block the event loop.
+    """
+
+    def read() -> bytes:
+        chunk = file_obj.read(chunk_size)
+        if digest is not None:
+            digest.update(chunk)
+        return chunk
+
+    while True:
+        chunk = await asyncio.to_thread(read)
+        if not chunk:
+            break
+        yield chunk
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Throttling, 5xx answers and broken connections, not missing keys or auth."""
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code", "")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return code in RETRYABLE_CODES or status == 429 or status >= 500
+    return isinstance(
+        error, (BotoConnectionError, HTTPClientError, asyncio.TimeoutError)
+    )
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    # attempts of one operation, the first one included
+    attempts: int = 5
+    base_delay: float = 0.2
+    max_delay: float = 10.0
+
+    def delay(self, retry: int) -> float:
+        # full jitter, workers hit by the same outage do not retry in step
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[datetime] = None
+    content_type: Optional[str] = None
+
+
+@dataclass
+class DownloadStats:
+    bytes: int = 0
+    requests: int = 0
+    seconds: float = 0.0
+    # time the consumer spent waiting on S3 instead of receiving data
+    stall_seconds: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.bytes / 1024 / 1024:.1f} MiB in {self.requests} requests, "
+            f"{self.seconds:.2f}s total, {self.stall_seconds:.2f}s stalled"
+        )
 
 
 class S3Client:
@@ -18,6 +171,13 @@ class S3Client:
         endpoint_url: str,
         bucket_name: str,
         region_name: str,
+        part_size: int = PART_SIZE,
+        max_parts_in_flight: int = 4,
+        download_prefetch: int = 4,
+        max_pool_connections: int = 10,
+        keepalive_timeout: float = 60,
+        retry: Optional[RetryPolicy] = None,
+        public_endpoint_url: Optional[str] = None,
     ):
         self.config: Dict[str, str] = {
             "aws_access_key_id": access_key,
@@ -25,100 +185,646 @@ class S3Client:
             "endpoint_url": endpoint_url,
             "region_name": region_name,
         }
+        # presigned URLs are signed for the host browsers reach S3 at
+        self.public_config: Dict[str, str] = {
+            **self.config,
+            "endpoint_url": public_endpoint_url or endpoint_url,
+        }
         self.bucket_name = bucket_name
+        self.part_size = part_size
+        self.upload_memory_budget = part_size * max_parts_in_flight
+        self.download_prefetch = download_prefetch
+        self.retry = retry or RetryPolicy()
         self.session = get_session()
+        self.client_config = AioConfig(
+            max_pool_connections=max_pool_connections,
+            tcp_keepalive=True,
+            connector_args={"keepalive_timeout": keepalive_timeout},
+            # retries are ours, botocore's own would multiply them
+            retries={"total_max_attempts": 1},
+        )
+        self._client: Optional[AioBaseClient] = None
+        self._public_client: Optional[AioBaseClient] = None
+        self._exit_stack: Optional[AsyncExitStack] = None
 
     async def check_bucket_exists(self) -> None:
         async with self._get_client() as client:
             try:
-                await client.head_bucket(Bucket=self.bucket_name)
+                await self._retry(
+                    lambda: client.head_bucket(Bucket=self.bucket_name),
+                    f"HEAD of bucket {self.bucket_name}",
+                )
                 logging.info(f"Bucket '{self.bucket_name}' already exists")
-            except ClientError:
-                await client.create_bucket(Bucket=self.bucket_name)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in (
+                    "404",
+                    "NoSuchBucket",
+                ):
+                    raise
+                await self._retry(
+                    lambda: client.create_bucket(Bucket=self.bucket_name),
+                    f"Creation of bucket {self.bucket_name}",
+                )
                 logging.info(f"Bucket '{self.bucket_name}' created")
 
+    async def start(self) -> None:
+        """
+        Open the long-lived client and its connection pool.
+
+        Until it is called (and after close) every operation falls back to a
+        short-lived client of its own.
+        """
+        if self._client is not None:
+            return
+        self._exit_stack = AsyncExitStack()
+        self._client = await self._exit_stack.enter_async_context(
+            self.session.create_client("s3", config=self.client_config, **self.config)
+        )
+        self._public_client = self._client
+        if self.public_config != self.config:
+            # only signs URLs, it never opens a connection
+            self._public_client = await self._exit_stack.enter_async_context(
+                self.session.create_client(
+                    "s3", config=self.client_config, **self.public_config
+                )
+            )
+        logging.info(f"S3 client for {self.bucket_name} started")
+
+    async def close(self) -> None:
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+        self._client = None
+        self._public_client = None
+        self._exit_stack = None
+        logging.info(f"S3 client for {self.bucket_name} closed")
+
     @asynccontextmanager
-    async def _get_client(self) -> AsyncGenerator[AioBaseClient, None]:
+    async def _get_client(
+        self, public: bool = False
+    ) -> AsyncGenerator[AioBaseClient, None]:
         """
-        Async context manager to create and yield an S3 client.
+        Async context manager to yield an S3 client.
+
+        Yields the shared pooled client opened by ``start``; if it has not been
+        started, a client is created for this call only and closed afterwards.
 
-        This method initializes an S3 client using the session and configuration
-        provided in the class instance and ensures proper cleanup after usage.
+        Args:
+            public: A client for the public endpoint, to sign URLs with.
 
         Yields:
             aiobotocore.client.AioBaseClient: An asynchronous S3 client instance.
         """
-        async with self.session.create_client("s3", **self.config) as client:
+        shared = self._public_client if public else self._client
+        if shared is not None:
+            yield shared
+            return
+        async with self.session.create_client(
+            "s3",
+            config=self.client_config,
+            **(self.public_config if public else self.config),
+        ) as client:
             yield client
 
-    async def upload_file(self, filename: str, file_obj: BinaryIO) -> None:
-        try:
-            async with self._get_client() as client:
-                resp = await client.create_multipart_upload(
-                    Bucket=self.bucket_name, Key=filename
+    async def _retry(self, operation: Callable[[], Awaitable[T]], what: str) -> T:
+        """
+        Run one S3 call, again after a jittered backoff while it fails with a
+        retryable error and attempts are left.
+
+        Raises:
+            Exception: The last error, or the first one that is not retryable.
+        """
+        retry = 0
+        while True:
+            try:
+                return await operation()
+            except Exception as e:
+                retry += 1
+                if retry >= self.retry.attempts or not is_retryable(e):
+                    raise
+                delay = self.retry.delay(retry)
+                logging.warning(
+                    f"{what} failed ({e}), "
+                    f"retry {retry}/{self.retry.attempts - 1} in {delay:.2f}s"
                 )
-                upload_id = resp["UploadId"]
-                parts = []
-                part_number = 1
-
-                while True:
-                    chunk = file_obj.read(PART_SIZE)
-                    if not chunk:
-                        break
-                    part_resp = await client.upload_part(
+                await asyncio.sleep(delay)
+
+    async def _upload_fileobj(
+        self,
+        client: AioBaseClient,
+        filename: str,
+        file_obj: BinaryIO,
+        digest: Optional["hashlib._Hash"] = None,
+    ) -> None:
+        part_size = choose_part_size(remaining_size(file_obj), self.part_size)
+        await self._upload_chunks(
+            client, filename, read_chunks(file_obj, part_size, digest), part_size
+        )
+
+    async def _upload_chunks(
+        self,
+        client: AioBaseClient,
+        filename: str,
+        chunks: AsyncIterator[bytes],
+        part_size: int,
+    ) -> None:
+        """
+        Upload an object from a stream of equally sized chunks.
+
+        An object that fits in one chunk is sent with a single PUT. Larger
+        objects go through a multipart upload with several parts in flight,
+        holding at most ``upload_memory_budget`` bytes (never less than two
+        parts) in memory. Every part is retried on its own; a part that still
+        fails aborts the whole multipart upload.
+        """
+        content_type = guess_content_type(filename)
+        semaphore = asyncio.Semaphore(max(2, self.upload_memory_budget // part_size))
+        tasks: List[asyncio.Task] = []
+        upload_id = None
+
+        async def next_chunk() -> bytes:
+            await semaphore.acquire()
+            chunk = await anext(chunks, b"")
+            if not chunk:
+                semaphore.release()
+            return chunk
+
+        async def send_part(part_number: int, body: bytes) -> Dict[str, Any]:
+            try:
+                resp = await self._retry(
+                    lambda: client.upload_part(
                         Bucket=self.bucket_name,
                         Key=filename,
                         PartNumber=part_number,
                         UploadId=upload_id,
-                        Body=chunk,
-                    )
-                    parts.append({"ETag": part_resp["ETag"], "PartNumber": part_number})
-                    part_number += 1
+                        Body=body,
+                    ),
+                    f"Upload of part {part_number} of {filename}",
+                )
+                return {"ETag": resp["ETag"], "PartNumber": part_number}
+            finally:
+                semaphore.release()
 
-                await client.complete_multipart_upload(
+        first = await next_chunk()
+        second = await next_chunk()
+        if not second:
+            # fits in a single part: one PUT instead of three round trips
+            await self._retry(
+                lambda: client.put_object(
                     Bucket=self.bucket_name,
                     Key=filename,
+                    Body=first,
+                    ContentType=content_type,
+                ),
+                f"Upload of {filename}",
+            )
+            logging.info(f"File {filename} uploaded to {self.bucket_name}")
+            return
+
+        try:
+            resp = await self._retry(
+                lambda: client.create_multipart_upload(
+                    Bucket=self.bucket_name, Key=filename, ContentType=content_type
+                ),
+                f"Start of the upload of {filename}",
+            )
+            upload_id = resp["UploadId"]
+            tasks.append(asyncio.create_task(send_part(1, first)))
+            tasks.append(asyncio.create_task(send_part(2, second)))
+
+            while chunk := await next_chunk():
+                for task in tasks:
+                    error = task.exception() if task.done() else None
+                    if error is not None:
+                        raise error
+                tasks.append(asyncio.create_task(send_part(len(tasks) + 1, chunk)))
+
+            parts = await asyncio.gather(*tasks)
+            await self._retry(
+                lambda: client.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=filename,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": list(parts)},
+                ),
+                f"Completion of the upload of {filename}",
+            )
+            logging.info(
+                f"File {filename} uploaded to {self.bucket_name} "
+                f"in {len(parts)} parts of {part_size} bytes"
+            )
+        except Exception:
+            if upload_id is not None:
+                try:
+                    await client.abort_multipart_upload(
+                        Bucket=self.bucket_name, Key=filename, UploadId=upload_id
+                    )
+                except ClientError as e:
+                    logging.error(f"Error aborting upload of {filename}: {e}")
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def upload_file(
+        self,
+        filename: str,
+        file_obj: BinaryIO,
+        digest: Optional["hashlib._Hash"] = None,
+    ) -> None:
+        async with self._get_client() as client:
+            await self._upload_fileobj(client, filename, file_obj, digest)
+
+    async def upload_stream(
+        self,
+        filename: str,
+        stream: AsyncIterator[bytes],
+        size_hint: Optional[int] = None,
+        digest: Optional["hashlib._Hash"] = None,
+    ) -> int:
+        """
+        Upload an object from a stream of arbitrarily sized pieces, such as a
+        request body, without spooling it anywhere.
+
+        The pieces are hashed as they arrive and regrouped into parts. At most
+        the parts in flight plus the one being filled are held in memory.
+
+        Args:
+            size_hint: Expected size, grows the part size of huge objects.
+            digest: Optional hash fed with every byte.
+
+        Returns:
+            int: Bytes uploaded.
+        """
+        part_size = choose_part_size(size_hint, self.part_size)
+        received = 0
+
+        async def parts() -> AsyncIterator[bytes]:
+            nonlocal received
+            buffer = bytearray()
+            async for piece in stream:
+                received += len(piece)
+                if digest is not None:
+                    digest.update(piece)
+                buffer += piece
+                while len(buffer) >= part_size:
+                    yield bytes(buffer[:part_size])
+                    del buffer[:part_size]
+            if buffer:
+                yield bytes(buffer)
+
+        async with self._get_client() as client:
+            await self._upload_chunks(client, filename, parts(), part_size)
+        return received
+
+    async def exists(self, object_name: str) -> bool:
+        async with self._get_client() as client:
+            try:
+                await self._retry(
+                    lambda: client.head_object(
+                        Bucket=self.bucket_name, Key=object_name
+                    ),
+                    f"HEAD of {object_name}",
+                )
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                    return False
+                raise
+        return True
+
+    async def stat(self, object_name: str) -> ObjectInfo:
+        """
+        Raises:
+            FileNotFoundError: There is no such object.
+        """
+        async with self._get_client() as client:
+            try:
+                head = await self._retry(
+                    lambda: client.head_object(
+                        Bucket=self.bucket_name, Key=object_name
+                    ),
+                    f"HEAD of {object_name}",
+                )
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                    raise FileNotFoundError(object_name) from e
+                raise
+        return ObjectInfo(
+            size=head["ContentLength"],
+            etag=head.get("ETag"),
+            last_modified=head.get("LastModified"),
+            content_type=head.get("ContentType"),
+        )
+
+    async def read_object(self, object_name: str) -> bytes:
+        """
+        Raises:
+            FileNotFoundError: There is no such object.
+        """
+
+        async def read() -> bytes:
+            resp = await client.get_object(Bucket=self.bucket_name, Key=object_name)
+            async with resp["Body"] as body:
+                return await body.read()
+
+        async with self._get_client() as client:
+            try:
+                return await self._retry(read, f"Read of {object_name}")
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                    raise FileNotFoundError(object_name) from e
+                raise
+
+    async def presigned_url(self, object_name: str, expires_in: int = 3600) -> str:
+        """Presigned GET URL, lets a client fetch the object straight from S3."""
+        async with self._get_client(public=True) as client:
+            return await client.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": self.bucket_name, "Key": object_name},
+                ExpiresIn=expires_in,
+            )
+
+    # ---------- multipart uploads driven by a client ----------
+    async def create_multipart_upload(self, object_name: str) -> str:
+        async with self._get_client() as client:
+            resp = await self._retry(
+                lambda: client.create_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=object_name,
+                    ContentType=guess_content_type(object_name),
+                ),
+                f"Start of the upload of {object_name}",
+            )
+        return resp["UploadId"]
+
+    async def presigned_part_url(
+        self, object_name: str, upload_id: str, part_number: int, expires_in: int
+    ) -> str:
+        """Presigned PUT URL of one part, the client sends its bytes to S3."""
+        async with self._get_client(public=True) as client:
+            return await client.generate_presigned_url(
+                "upload_part",
+                Params={
+                    "Bucket": self.bucket_name,
+                    "Key": object_name,
+                    "UploadId": upload_id,
+                    "PartNumber": part_number,
+                },
+                ExpiresIn=expires_in,
+            )
+
+    async def upload_part(
+        self, object_name: str, upload_id: str, part_number: int, body: bytes
+    ) -> str:
+        """Upload one part of a multipart upload, returns its ETag."""
+        async with self._get_client() as client:
+            resp = await self._retry(
+                lambda: client.upload_part(
+                    Bucket=self.bucket_name,
+                    Key=object_name,
+                    PartNumber=part_number,
+                    UploadId=upload_id,
+                    Body=body,
+                ),
+                f"Upload of part {part_number} of {object_name}",
+            )
+        return resp["ETag"]
+
+    async def list_parts(
+        self, object_name: str, upload_id: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Parts S3 holds for a multipart upload, with their ETag and size.
+
+        Raises:
+            FileNotFoundError: The upload was completed or aborted.
+        """
+
+        async def list_all() -> List[Dict[str, Any]]:
+            parts: List[Dict[str, Any]] = []
+            paginator = client.get_paginator("list_parts")
+            async for page in paginator.paginate(
+                Bucket=self.bucket_name, Key=object_name, UploadId=upload_id
+            ):
+                parts.extend(page.get("Parts", []))
+            return parts
+
+        async with self._get_client() as client:
+            try:
+                return await self._retry(list_all, f"Listing of parts of {object_name}")
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchUpload"):
+                    raise FileNotFoundError(object_name) from e
+                raise
+
+    async def complete_multipart_upload(
+        self, object_name: str, upload_id: str, parts: List[Dict[str, Any]]
+    ) -> None:
+        async with self._get_client() as client:
+            await self._retry(
+                lambda: client.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=object_name,
                     UploadId=upload_id,
                     MultipartUpload={"Parts": parts},
+                ),
+                f"Completion of the upload of {object_name}",
+            )
+        logging.info(
+            f"File {object_name} uploaded to {self.bucket_name} in {len(parts)} parts"
+        )
+
+    async def abort_multipart_upload(self, object_name: str, upload_id: str) -> None:
+        async with self._get_client() as client:
+            try:
+                await self._retry(
+                    lambda: client.abort_multipart_upload(
+                        Bucket=self.bucket_name, Key=object_name, UploadId=upload_id
+                    ),
+                    f"Abort of the upload of {object_name}",
                 )
-                logging.info(f"File {filename} uploaded to {self.bucket_name}")
-        except ClientError as e:
-            await client.abort_multipart_upload(
-                Bucket=self.bucket_name, Key=filename, UploadId=upload_id
+            except ClientError as e:
+                # already completed or aborted, nothing left to free
+                if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                    raise
+
+    async def list_keys(self, prefix: str) -> List[str]:
+        async def list_all() -> List[str]:
+            keys: List[str] = []
+            paginator = client.get_paginator("list_objects_v2")
+            async for page in paginator.paginate(
+                Bucket=self.bucket_name, Prefix=prefix
+            ):
+                keys.extend(obj["Key"] for obj in page.get("Contents", []))
+            return keys
+
+        async with self._get_client() as client:
+            return await self._retry(list_all, f"Listing of {prefix}")
+
+    async def put_bytes(self, object_name: str, data: bytes) -> None:
+        async with self._get_client() as client:
+            await self._retry(
+                lambda: client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=object_name,
+                    Body=data,
+                    ContentType=guess_content_type(object_name),
+                ),
+                f"Upload of {object_name}",
+            )
+
+    async def copy_object(self, source: str, destination: str) -> None:
+        """Server-side copy within the bucket, no byte goes through the BFF."""
+        async with self._get_client() as client:
+            await self._retry(
+                lambda: client.copy_object(
+                    Bucket=self.bucket_name,
+                    Key=destination,
+                    CopySource={"Bucket": self.bucket_name, "Key": source},
+                ),
+                f"Copy of {source} to {destination}",
             )
-            logging.error(f"Error uploading file: {e}")
 
     async def delete_file(self, object_name: str) -> None:
-        try:
-            async with self._get_client() as client:
-                await client.delete_object(Bucket=self.bucket_name, Key=object_name)
-                logging.info(f"File {object_name} deleted from {self.bucket_name}")
-        except ClientError as e:
-            logging.error(f"Error deleting file: {e}")
+        async with self._get_client() as client:
+            await self._retry(
+                lambda: client.delete_object(Bucket=self.bucket_name, Key=object_name),
+                f"Deletion of {object_name}",
+            )
+            logging.info(f"File {object_name} deleted from {self.bucket_name}")
+
+    async def _get_range(
+        self, client: AioBaseClient, object_name: str, start: int, end: int
+    ) -> Dict[str, Any]:
+        return await self._retry(
+            lambda: client.get_object(
+                Bucket=self.bucket_name, Key=object_name, Range=f"bytes={start}-{end}"
+            ),
+            f"GET of {object_name} bytes={start}-{end}",
+        )
+
+    async def _stream_range(
+        self,
+        client: AioBaseClient,
+        object_name: str,
+        start: int,
+        end: int,
+        resp: Dict[str, Any],
+        stats: DownloadStats,
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Yield the body of one ranged GET. A connection lost mid-body is picked
+        up with a new GET from the first byte not received yet.
+        """
+        retry = 0
+        while True:
+            try:
+                async with resp["Body"] as body:
+                    while True:
+                        waited = time.perf_counter()
+                        piece = await body.read(READ_SIZE)
+                        stats.stall_seconds += time.perf_counter() - waited
+                        if not piece:
+                            return
+                        start += len(piece)
+                        stats.bytes += len(piece)
+                        yield piece
+            except Exception as e:
+                retry += 1
+                if retry >= self.retry.attempts or not is_retryable(e):
+                    raise
+                if start > end:
+                    return
+                logging.warning(
+                    f"Download of {object_name} broke at byte {start} ({e}), resuming"
+                )
+                await asyncio.sleep(self.retry.delay(retry))
+                waited = time.perf_counter()
+                resp = await self._get_range(client, object_name, start, end)
+                stats.stall_seconds += time.perf_counter() - waited
+                stats.requests += 1
 
     async def download_file(
-        self, object_name: str, chunk_size: int
+        self,
+        object_name: str,
+        chunk_size: int,
+        stats: Optional[DownloadStats] = None,
+        start: int = 0,
+        end: Optional[int] = None,
+        size: Optional[int] = None,
     ) -> AsyncGenerator[bytes, None]:
+        """
+        Stream an object, or the bytes start to end of it, as a sequence of
+        ranged GETs.
+
+        Up to ``download_prefetch`` ranges are requested ahead of the consumer
+        and yielded strictly in order. Each range body is streamed in
+        ``READ_SIZE`` pieces instead of being buffered whole, and failed
+        requests are retried from where they stopped.
+
+        Args:
+            object_name: Key of the object to download.
+            chunk_size: Size of every ranged GET.
+            stats: Optional DownloadStats filled in while streaming.
+            start: First byte to stream.
+            end: Last byte to stream, inclusive; the end of the object if None.
+            size: Size of the object if the caller knows it, saves a HEAD.
+
+        Raises:
+            ClientError: The object is missing, or S3 kept failing. The consumer
+                never mistakes a truncated stream for the whole object.
+        """
+        stats = stats if stats is not None else DownloadStats()
+        started = time.perf_counter()
+        pending: Deque[Tuple[int, int, asyncio.Task]] = deque()
         try:
             async with self._get_client() as client:
-                head = await client.head_object(
-                    Bucket=self.bucket_name, Key=object_name
+                if size is None:
+                    head = await self._retry(
+                        lambda: client.head_object(
+                            Bucket=self.bucket_name, Key=object_name
+                        ),
+                        f"HEAD of {object_name}",
+                    )
+                    size = head["ContentLength"]
+                stop = size if end is None else min(end + 1, size)
+                ranges = deque(
+                    (offset, min(offset + chunk_size, stop) - 1)
+                    for offset in range(start, stop, chunk_size)
                 )
-                size = head["ContentLength"]
 
-                for start in range(0, size, chunk_size):
-                    end = min(start + chunk_size - 1, size - 1)
-                    resp = await client.get_object(
-                        Bucket=self.bucket_name,
-                        Key=object_name,
-                        Range=f"bytes={start}-{end}",
-                    )
-                    yield await resp["Body"].read()
+                while ranges or pending:
+                    while ranges and len(pending) < self.download_prefetch:
+                        first, last = ranges.popleft()
+                        task = asyncio.create_task(
+                            self._get_range(client, object_name, first, last)
+                        )
+                        pending.append((first, last, task))
+                        stats.requests += 1
+
+                    first, last, task = pending.popleft()
+                    waited = time.perf_counter()
+                    resp = await task
+                    stats.stall_seconds += time.perf_counter() - waited
+                    # a consumer that stops early closes the body it was reading
+                    async with aclosing(
+                        self._stream_range(
+                            client, object_name, first, last, resp, stats
+                        )
+                    ) as body:
+                        async for piece in body:
+                            yield piece
                 logging.info(
                     f"File {object_name} downloaded with chunk size {chunk_size}"
                 )
-        except ClientError as e:
-            logging.error(f"Error downloading file: {e}")
+        finally:
+            for _, _, task in pending:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    # fetched ahead but never read, free its connection now
+                    task.result()["Body"].close()
+            stats.seconds = time.perf_counter() - started
+            S3_DOWNLOAD_STALL_HIST.observe(stats.stall_seconds)
 
 
 _s3_client_instance: Optional[S3Client] = None
@@ -138,5 +844,16 @@ def get_s3_client() -> S3Client:
             endpoint_url=settings.MINIO_ENDPOINT_URL,
             bucket_name=settings.MINIO_BUCKET_NAME,
             region_name=settings.MINIO_REGION_NAME,
+            part_size=settings.S3_PART_SIZE,
+            max_parts_in_flight=settings.S3_MAX_PARTS_IN_FLIGHT,
+            download_prefetch=settings.S3_DOWNLOAD_PREFETCH,
+            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+            keepalive_timeout=settings.S3_KEEPALIVE_TIMEOUT,
+            retry=RetryPolicy(
+                settings.S3_RETRY_ATTEMPTS,
+                settings.S3_RETRY_BASE_DELAY,
+                settings.S3_RETRY_MAX_DELAY,
+            ),
+            public_endpoint_url=settings.MINIO_PUBLIC_ENDPOINT_URL,
         )
     return _s3_client_instance
@@ -0,0 +1,183 @@
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from ..schemas.upload import (
+    PartUrl,
+    UploadedPart,
+    UploadSessionCreate,
+    UploadSessionState,
+)
+from .s3_client import S3Client, choose_part_size
+
+SESSION_PREFIX = "upload_sessions"
+
+
+class UploadSessionError(ValueError):
+    """The parts held by S3 do not make up the object the session declared."""
+
+
+def session_key(session_id: str) -> str:
+    return f"{SESSION_PREFIX}/{session_id}.json"
+
+
+def parts_count(size: int, part_size: int) -> int:
+    return -(-size // part_size)
+
+
+def part_size_of(state: UploadSessionState, part_number: int) -> int:
+    count = parts_count(state.size, state.part_size)
+    if part_number < count:
+        return state.part_size
+    return state.size - (count - 1) * state.part_size
+
+
+def is_expired(
+    state: UploadSessionState, ttl: int, now: Optional[datetime] = None
+) -> bool:
+    """A session not completed within ttl seconds of its start is abandoned."""
+    now = now or datetime.now(timezone.utc)
+    return state.created_at + timedelta(seconds=ttl) < now
+
+
+async def create_session(
+    s3: S3Client, params: UploadSessionCreate
+) -> UploadSessionState:
+    """Start a multipart upload the client fills through presigned part URLs."""
+    upload_id = await s3.create_multipart_upload(params.filename)
+    state = UploadSessionState(
+        session_id=uuid.uuid4().hex,
+        key=params.filename,
+        upload_id=upload_id,
+        size=params.size,
+        part_size=choose_part_size(params.size, s3.part_size),
+        output_format=params.output_format,
+        created_at=datetime.now(timezone.utc),
+    )
+    await s3.put_bytes(session_key(state.session_id), state.model_dump_json().encode())
+    logging.info(
+        f"Upload session {state.session_id} of {state.key} started: "
+        f"{parts_count(state.size, state.part_size)} parts of {state.part_size} bytes"
+    )
+    return state
+
+
+async def load_session(s3: S3Client, session_id: str) -> UploadSessionState:
+    """
+    Raises:
+        FileNotFoundError: There is no such session.
+    """
+    return UploadSessionState.model_validate_json(
+        await s3.read_object(session_key(session_id))
+    )
+
+
+async def part_urls(
+    s3: S3Client, state: UploadSessionState, first: int, count: int, expires_in: int
+) -> List[PartUrl]:
+    last = min(first + count, parts_count(state.size, state.part_size) + 1)
+    return [
+        PartUrl(
+            part_number=number,
+            url=await s3.presigned_part_url(
+                state.key, state.upload_id, number, expires_in
+            ),
+        )
+        for number in range(max(1, first), last)
+    ]
+
+
+async def uploaded_parts(s3: S3Client, state: UploadSessionState) -> List[UploadedPart]:
+    return [
+        UploadedPart(part_number=p["PartNumber"], etag=p["ETag"], size=p["Size"])
+        for p in await s3.list_parts(state.key, state.upload_id)
+    ]
+
+
+def check_parts(
+    state: UploadSessionState,
+    held: List[UploadedPart],
+    claimed: Optional[List[UploadedPart]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Parts to complete the upload with, once every one of them is in S3 with
+    the size the session expects.
+
+    Raises:
+        UploadSessionError: A part is missing, has the wrong size, or is not
+            the one the client uploaded.
+    """
+    by_number = {part.part_number: part for part in held}
+    count = parts_count(state.size, state.part_size)
+    missing = [n for n in range(1, count + 1) if n not in by_number]
+    if missing:
+        raise UploadSessionError(f"{len(missing)} parts missing, first {missing[0]}")
+    extra = sorted(set(by_number) - set(range(1, count + 1)))
+    if extra:
+        raise UploadSessionError(f"Unexpected part {extra[0]}, {count} declared")
+    for number, part in by_number.items():
+        if part.size is not None and part.size != part_size_of(state, number):
+            raise UploadSessionError(
+                f"Part {number} has {part.size} bytes, "
+                f"expected {part_size_of(state, number)}"
+            )
+    for part in claimed or []:
+        held_part = by_number.get(part.part_number)
+        if held_part is None or held_part.etag.strip('"') != part.etag.strip('"'):
+            raise UploadSessionError(f"Part {part.part_number} was overwritten")
+    return [{"ETag": by_number[n].etag, "PartNumber": n} for n in range(1, count + 1)]
+
+
+async def complete_session(
+    s3: S3Client,
+    state: UploadSessionState,
+    claimed: Optional[List[UploadedPart]] = None,
+) -> None:
+    """
+    Assemble the object from its parts. Completing twice is harmless: once
+    the upload is gone, an object of the declared size counts as done.
+    """
+    try:
+        held = await uploaded_parts(s3, state)
+    except FileNotFoundError:
+        info = await s3.stat(state.key)
+        if info.size != state.size:
+            raise UploadSessionError(
+                f"Upload of {state.key} is gone, the object has {info.size} bytes"
+            )
+        return
+    await s3.complete_multipart_upload(
+        state.key, state.upload_id, check_parts(state, held, claimed)
+    )
+
+
+async def close_session(s3: S3Client, state: UploadSessionState) -> None:
+    await s3.delete_file(session_key(state.session_id))
+
+
+async def abort_session(s3: S3Client, state: UploadSessionState) -> None:
+    await s3.abort_multipart_upload(state.key, state.upload_id)
+    await close_session(s3, state)
+    logging.info(f"Upload session {state.session_id} of {state.key} aborted")
+
+
+async def cleanup_expired_sessions(s3: S3Client, ttl: int) -> int:
+    """Abort sessions older than ttl seconds, returns how many."""
+    now = datetime.now(timezone.utc)
+    expired = 0
+    for key in await s3.list_keys(f"{SESSION_PREFIX}/"):
+        session_id = key[len(SESSION_PREFIX) + 1 :].removesuffix(".json")
+        try:
+            state = await load_session(s3, session_id)
+            if is_expired(state, ttl, now):
+                await abort_session(s3, state)
+                expired += 1
+        except FileNotFoundError:
+            # completed or aborted since the listing
+            continue
+        except Exception as e:
+            logging.error(f"Failed to clean up upload session {session_id}: {e}")
+    if expired:
+        logging.info(f"Cleaned up {expired} expired upload sessions")
+    return expired
@@ -1,10 +1,643 @@
+import asyncio
+import hashlib
+import io
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, Iterator, List
+
+import pytest
+from botocore.exceptions import ClientError, ResponseStreamingError
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
+from moto.server import ThreadedMotoServer
+from starlette.requests import ClientDisconnect, Request
+
+from src.api import files, videos
+from src.api.resumable import parse_metadata
+from src.api.videos import hls_key, route_aliases
+from src.config import HLSSettings
+from src.models.upload_session import UploadSession
+from src.schemas.endpoint import EncodeJob
+from src.schemas.upload import UploadedPart, UploadSessionState
+from src.services import resumable
+from src.services.dedup import (
+    digest_key,
+    find_encoded,
+    forget_source,
+    link_master_playlist,
+    link_thumbnail_index,
+    record_source,
+    register_hash,
+    relink_playlist,
+    relink_webvtt,
+)
+from src.services.ranges import RangeNotSatisfiable, parse_range
+from src.services.s3_client import (
+    DownloadStats,
+    RetryPolicy,
+    S3Client,
+    is_retryable,
+)
+from src.services.upload_sessions import UploadSessionError, check_parts, is_expired
 
 from ..main import create_app
 
+PART = 256
+
+
+@pytest.fixture(scope="module")
+def moto_endpoint() -> Iterator[str]:
+    server = ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    _, port = server.get_host_and_port()
+    yield f"http://127.0.0.1:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def s3(moto_endpoint: str, monkeypatch: pytest.MonkeyPatch) -> S3Client:
+    """A client of a fresh bucket on moto, multipart parts of PART bytes."""
+    monkeypatch.setattr("moto.s3.models.S3_UPLOAD_PART_MIN_SIZE", PART)
+    client = S3Client(
+        "key",
+        "secret",
+        moto_endpoint,
+        f"test-{uuid.uuid4().hex[:12]}",
+        "us-east-1",
+        part_size=PART,
+        max_parts_in_flight=3,
+        retry=RetryPolicy(attempts=3, base_delay=0),
+    )
+    asyncio.run(client.check_bucket_exists())
+    return client
+
+
+async def pending_uploads(s3: S3Client) -> List[Dict[str, Any]]:
+    async with s3._get_client() as client:
+        resp = await client.list_multipart_uploads(Bucket=s3.bucket_name)
+    return resp.get("Uploads", [])
+
+
+def error(code: str, status: int) -> ClientError:
+    response: Dict[str, Any] = {
+        "Error": {"Code": code},
+        "ResponseMetadata": {"HTTPStatusCode": status},
+    }
+    return ClientError(response, "S3")
+
+
+async def etag(s3: S3Client, key: str) -> str:
+    async with s3._get_client() as client:
+        resp = await client.head_object(Bucket=s3.bucket_name, Key=key)
+    return resp["ETag"].strip('"')
+
 
 def test_read_root() -> None:
     app = create_app(use_lifespan=False)
     client = TestClient(app)
     response = client.get("/api/health/live")
     assert response.status_code == 200
+
+
+def test_link_master_playlist() -> None:
+    master = (
+        "#EXTM3U\n"
+        '#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud",URI="stream_audio/playlist.m3u8"\n'
+        "#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360\n"
+        "stream_360p/playlist.m3u8\n"
+    )
+    linked = link_master_playlist(master, "my video.mp4")
+    assert "../my%20video.mp4/stream_360p/playlist.m3u8" in linked
+    assert 'URI="../my%20video.mp4/stream_audio/playlist.m3u8"' in linked
+
+    # served under /api/videos/<id>/hls/ the original is two levels up
+    routed = relink_playlist(linked, route_aliases)
+    assert "../../my%20video.mp4/hls/stream_360p/playlist.m3u8" in routed
+
+    index = link_thumbnail_index(
+        "WEBVTT\n\n00:00:00.000 --> 00:00:10.000\nsprite_001.jpg#xywh=0,0,160,90\n",
+        "my video.mp4",
+    )
+    assert "00:00:00.000 --> 00:00:10.000\n" in index
+    uri = "../../my%20video.mp4/thumbnails/sprite_001.jpg#xywh=0,0,160,90"
+    assert uri in index
+    routed = relink_webvtt(index, lambda u: route_aliases(u, 1))
+    assert "../../../my%20video.mp4/hls/thumbnails/sprite_001.jpg" in routed
+
+
+def test_unhashed_upload_voids_the_hash(s3: S3Client) -> None:
+    digest = hashlib.sha256(b"first").hexdigest()
+
+    async def reupload() -> None:
+        # v.mp4 was uploaded through the BFF and encoded
+        await record_source(s3, "v.mp4", digest)
+        await register_hash(s3, digest, "v.mp4")
+        await s3.put_bytes("v.mp4/master.m3u8", b"#EXTM3U\n")
+        assert await find_encoded(s3, digest) == "v.mp4"
+        # then replaced by a presigned or resumable upload of other bytes
+        await forget_source(s3, "v.mp4")
+        assert await find_encoded(s3, digest) is None
+
+    asyncio.run(reupload())
+
+
+def test_hls_key(s3: S3Client, monkeypatch: pytest.MonkeyPatch) -> None:
+    assert hls_key("v.mp4", "stream_360p/seg_001.ts") == "v.mp4/stream_360p/seg_001.ts"
+    for path in ("checkpoint.json", "chunks/c0000/master.m3u8", "a/../b.ts"):
+        with pytest.raises(HTTPException):
+            hls_key("v.mp4", path)
+
+    # segments are handed to S3, the redirect expires before its signature
+    settings = HLSSettings(HLS_PRESIGNED_REDIRECT=True, HLS_PRESIGN_EXPIRES=300)
+    monkeypatch.setattr(videos, "get_hls_settings", lambda: settings)
+    monkeypatch.setattr(videos, "get_s3_client", lambda: s3)
+    client = TestClient(create_app(use_lifespan=False), follow_redirects=False)
+    response = client.get("/api/videos/v.mp4/hls/stream_360p/seg_001.ts")
+    assert response.status_code == 302
+    assert response.headers["Cache-Control"] == "private, max-age=150"
+    location = response.headers["Location"]
+    assert "/v.mp4/stream_360p/seg_001.ts?" in location
+    assert "Signature=" in location
+    # private files stay 404, whatever the mode
+    response = client.get("/api/videos/v.mp4/hls/chunks/c0000/seg_001.ts")
+    assert response.status_code == 404
+
+
+def test_parse_range() -> None:
+    assert parse_range(None, 1000) is None
+    assert parse_range("bytes=100-", 1000) == [(100, 999)]
+    assert parse_range("bytes=-300", 1000) == [(700, 999)]
+    assert parse_range("bytes=900-5000", 1000) == [(900, 999)]
+    # overlapping and adjacent ranges are served as one part
+    assert parse_range("bytes=500-599, 0-9,5-20,600-610", 1000) == [
+        (0, 20),
+        (500, 610),
+    ]
+    # malformed or other units are ignored, the whole object is sent
+    assert parse_range("bytes=20-10", 1000) is None
+    assert parse_range("items=0-1", 1000) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=1000-", 1000)
+
+
+def test_check_upload_session_parts() -> None:
+    state = UploadSessionState(
+        session_id="s",
+        key="v.mp4",
+        upload_id="u",
+        size=25,
+        part_size=10,
+        created_at=datetime.now(timezone.utc),
+    )
+    held = [
+        UploadedPart(part_number=2, etag='"b"', size=10),
+        UploadedPart(part_number=1, etag='"a"', size=10),
+    ]
+    with pytest.raises(UploadSessionError, match="first 3"):
+        check_parts(state, held)
+    held.append(UploadedPart(part_number=3, etag='"c"', size=5))
+    assert [p["PartNumber"] for p in check_parts(state, held)] == [1, 2, 3]
+    # a stray retry replaced the part the client uploaded
+    with pytest.raises(UploadSessionError, match="overwritten"):
+        check_parts(state, held, [UploadedPart(part_number=2, etag="old")])
+
+    assert not is_expired(state, 3600)
+    assert is_expired(state, 3600, state.created_at + timedelta(hours=2))
+
+
+def test_resumable_upload_headers() -> None:
+    assert parse_metadata("filename di5tcDQ=,output_format Zm1wNA==") == {
+        "filename": "v.mp4",
+        "output_format": "fmp4",
+    }
+    assert parse_metadata(None) == {}
+    with pytest.raises(ValueError):
+        parse_metadata("filename not-base64!")
+
+    client = TestClient(create_app(use_lifespan=False))
+    response = client.head("/api/resumable/00000000-0000-0000-0000-000000000000")
+    assert response.status_code == 412
+    assert response.headers["Tus-Version"] == "1.0.0"
+    # an empty upload is refused up front, like a 0-byte raw-body upload
+    response = client.post(
+        "/api/resumable",
+        headers={
+            "Tus-Resumable": "1.0.0",
+            "Upload-Length": "0",
+            "Upload-Metadata": "filename di5tcDQ=",
+        },
+    )
+    assert response.status_code == 400
+    response = client.options("/api/resumable")
+    assert response.status_code == 204
+    assert "creation" in response.headers["Tus-Extension"]
+
+
+def test_download_resumes_a_broken_range() -> None:
+    assert is_retryable(error("SlowDown", 503))
+    assert not is_retryable(error("NoSuchKey", 404))
+
+    data = bytes(range(256)) * 4
+    calls = []
+
+    class Body:
+        def __init__(self, piece: bytes, broken: bool) -> None:
+            self.pieces = [piece[:100], piece[100:]]
+            self.broken = broken
+
+        async def __aenter__(self) -> "Body":
+            return self
+
+        async def __aexit__(self, *_: Any) -> None:
+            pass
+
+        async def read(self, _: int) -> bytes:
+            if self.broken and len(self.pieces) == 1:
+                raise ResponseStreamingError(error="connection reset")
+            return self.pieces.pop(0) if self.pieces else b""
+
+    class Client:
+        async def head_object(self, **_: Any) -> Dict[str, Any]:
+            return {"ContentLength": len(data)}
+
+        async def get_object(self, Range: str, **_: Any) -> Dict[str, Any]:
+            calls.append(Range)
+            if len(calls) == 1:
+                raise error("ServiceUnavailable", 503)
+            start, end = map(int, Range[len("bytes=") :].split("-"))
+            # the body of the first range breaks after its first piece
+            return {"Body": Body(data[start : end + 1], broken=len(calls) == 2)}
+
+    async def download() -> bytes:
+        s3 = S3Client("key", "secret", "http://s3", "bucket", "us-east-1")
+        s3.retry = RetryPolicy(attempts=3, base_delay=0)
+        s3.download_prefetch = 1
+        s3._client = Client()
+        return b"".join([piece async for piece in s3.download_file("video", 512)])
+
+    assert asyncio.run(download()) == data
+    assert calls == ["bytes=0-511", "bytes=0-511", "bytes=100-511", "bytes=512-1023"]
+
+
+def test_upload_stream_regroups_the_body(
+    s3: S3Client, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    data = bytes(range(251)) * 4
+    pieces = [data[i : i + 37] for i in range(0, len(data), 37)]
+
+    async def stream() -> Any:
+        for piece in pieces:
+            yield piece
+
+    async def upload() -> int:
+        digest = hashlib.sha256()
+        size = await s3.upload_stream("a.mp4", stream(), digest=digest)
+        assert digest.hexdigest() == hashlib.sha256(data).hexdigest()
+        return size
+
+    assert asyncio.run(upload()) == len(data)
+    assert asyncio.run(s3.read_object("a.mp4")) == data
+    # 37 byte pieces went out as three full parts and the rest
+    assert asyncio.run(etag(s3, "a.mp4")).endswith("-4")
+
+    linked: List[Any] = []
+
+    async def encode_or_link(_: S3Client, meta: Any, digest: str, __: Any) -> None:
+        linked.append((meta.filename, meta.size, digest))
+
+    monkeypatch.setattr(files, "get_s3_client", lambda: s3)
+    monkeypatch.setattr(files, "encode_or_link", encode_or_link)
+    client = TestClient(create_app(use_lifespan=False))
+    response = client.put("/api/files/upload/b.mp4", content=iter(pieces))
+    assert response.status_code == 200
+    assert linked == [("b.mp4", len(data), hashlib.sha256(data).hexdigest())]
+    assert asyncio.run(s3.read_object("b.mp4")) == data
+
+    # refused by Content-Length, or once the body turns out empty
+    assert client.put("/api/files/upload/c.mp4", content=b"").status_code == 400
+    response = client.put("/api/files/upload/c.mp4", content=iter([b""]))
+    assert response.status_code == 400
+    assert not asyncio.run(s3.exists("c.mp4"))
+
+    async def disconnect() -> None:
+        messages: List[Dict[str, Any]] = [
+            {"type": "http.request", "body": data[:600], "more_body": True},
+            {"type": "http.disconnect"},
+        ]
+
+        async def receive() -> Dict[str, Any]:
+            return messages.pop(0)
+
+        scope = {"type": "http", "method": "PUT", "headers": []}
+        with pytest.raises(HTTPException) as e:
+            await files.upload_stream("d.mp4", Request(scope, receive))
+        assert e.value.status_code == 400
+        # two parts were in flight, the multipart upload is aborted
+        assert await pending_uploads(s3) == []
+        assert not await s3.exists("d.mp4")
+
+    asyncio.run(disconnect())
+    assert len(linked) == 1
+
+
+def test_upload_file_in_parallel_parts(
+    s3: S3Client, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    data = bytes(range(256)) * 5 + b"tail"
+    calls: List[int] = []
+
+    async def upload() -> None:
+        await s3.start()
+        try:
+            client = s3._client
+            assert client is not None
+            upload_part = client.upload_part
+
+            async def flaky(**kwargs: Any) -> Dict[str, Any]:
+                calls.append(kwargs["PartNumber"])
+                if kwargs["PartNumber"] == 2 and calls.count(2) == 1:
+                    raise error("SlowDown", 503)
+                if kwargs["Key"] == "broken.mp4" and kwargs["PartNumber"] == 4:
+                    raise error("AccessDenied", 403)
+                return await upload_part(**kwargs)
+
+            monkeypatch.setattr(client, "upload_part", flaky)
+            digest = hashlib.sha256()
+            await s3.upload_file("a.mp4", io.BytesIO(data), digest)
+            assert digest.hexdigest() == hashlib.sha256(data).hexdigest()
+            # parts finish in any order, they are stitched by number
+            assert await s3.read_object("a.mp4") == data
+            assert (await etag(s3, "a.mp4")).endswith("-6")
+            # the throttled part alone was sent again
+            assert sorted(calls) == [1, 2, 2, 3, 4, 5, 6]
+
+            calls.clear()
+            await s3.upload_file("small.mp4", io.BytesIO(data[:PART]))
+            assert calls == []
+            assert "-" not in await etag(s3, "small.mp4")
+            assert (await s3.stat("small.mp4")).content_type == "video/mp4"
+
+            with pytest.raises(ClientError):
+                await s3.upload_file("broken.mp4", io.BytesIO(data))
+            assert await pending_uploads(s3) == []
+            assert not await s3.exists("broken.mp4")
+        finally:
+            await s3.close()
+
+    asyncio.run(upload())
+
+
+def test_download_file_from_prefetched_ranges(
+    s3: S3Client, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    data = bytes(range(256)) * 40
+    ranges: List[str] = []
+
+    bodies: List["Tracked"] = []
+
+    class Tracked:
+        """The body of a GET, remembering whether it was closed."""
+
+        def __init__(self, body: Any) -> None:
+            self.body = body
+            self.closed = False
+
+        async def __aenter__(self) -> "Tracked":
+            return self
+
+        async def __aexit__(self, *_: Any) -> None:
+            self.close()
+
+        async def read(self, size: int) -> bytes:
+            return await self.body.read(size)
+
+        def close(self) -> None:
+            self.closed = True
+            self.body.close()
+
+    class Breaking(Tracked):
+        """A body whose connection drops after 100 bytes."""
+
+        sent = False
+
+        async def read(self, _: int) -> bytes:
+            if self.sent:
+                raise ResponseStreamingError(error="connection reset")
+            self.sent = True
+            return await self.body.read(100)
+
+    async def download() -> None:
+        await s3.put_bytes("v.mp4", data)
+        await s3.start()
+        try:
+            client = s3._client
+            assert client is not None
+            get_object = client.get_object
+
+            async def flaky(**kwargs: Any) -> Dict[str, Any]:
+                ranges.append(kwargs["Range"])
+                second = kwargs["Range"] == "bytes=1000-1999"
+                resp = await get_object(**kwargs)
+                resp["Body"] = (Breaking if second else Tracked)(resp["Body"])
+                bodies.append(resp["Body"])
+                return resp
+
+            monkeypatch.setattr(client, "get_object", flaky)
+            s3.download_prefetch = 3
+            stats = DownloadStats()
+            pieces = [p async for p in s3.download_file("v.mp4", 1000, stats)]
+            assert b"".join(pieces) == data
+            # eleven ranges and one GET resuming the broken one
+            assert stats.requests == 12
+            assert "bytes=1100-1999" in ranges
+
+            ranges.clear()
+            pieces = [
+                p
+                async for p in s3.download_file(
+                    "v.mp4", 1000, start=1500, end=4499, size=len(data)
+                )
+            ]
+            assert b"".join(pieces) == data[1500:4500]
+            assert ranges == ["bytes=1500-2499", "bytes=2500-3499", "bytes=3500-4499"]
+
+            # a browser seeking away drops the stream after its first piece
+            bodies.clear()
+            stream = s3.download_file("v.mp4", 1000, size=len(data))
+            assert await anext(stream) == data[:1000]
+            await asyncio.sleep(0.2)
+            await stream.aclose()
+            # the range being read and those fetched ahead are all closed
+            assert len(bodies) == 3
+            assert all(body.closed for body in bodies)
+        finally:
+            await s3.close()
+
+    asyncio.run(download())
+
+
+def test_pooled_client_lifecycle(s3: S3Client, monkeypatch: pytest.MonkeyPatch) -> None:
+    opened: List[str] = []
+    create_client = s3.session.create_client
+
+    def counting(*args: Any, **kwargs: Any) -> Any:
+        opened.append(kwargs["endpoint_url"])
+        return create_client(*args, **kwargs)
+
+    monkeypatch.setattr(s3.session, "create_client", counting)
+    keys = [f"k/{i:02d}" for i in range(20)]
+
+    async def lifecycle() -> None:
+        await s3.start()
+        await s3.start()
+        assert len(opened) == 1
+        try:
+            # more calls than pooled connections, all on the one client
+            await asyncio.gather(*(s3.put_bytes(key, key.encode()) for key in keys))
+            read = await asyncio.gather(*(s3.read_object(key) for key in keys))
+            assert read == [key.encode() for key in keys]
+            assert sorted(await s3.list_keys("k/")) == keys
+            assert len(opened) == 1
+        finally:
+            await s3.close()
+        assert s3._client is None
+        # closed, every call opens a client of its own again
+        assert await s3.exists(keys[0])
+        assert len(opened) == 2
+
+        public = S3Client(
+            "key",
+            "secret",
+            s3.config["endpoint_url"],
+            s3.bucket_name,
+            "us-east-1",
+            public_endpoint_url="http://cdn.example",
+        )
+        await public.start()
+        try:
+            # signed for browsers, while the calls stay on the private endpoint
+            assert "cdn.example" in await public.presigned_url(keys[0])
+            assert await public.read_object(keys[0]) == keys[0].encode()
+        finally:
+            await public.close()
+
+    asyncio.run(lifecycle())
+
+
+def test_resumable_append(s3: S3Client, monkeypatch: pytest.MonkeyPatch) -> None:
+    data = bytes(range(251)) * 2 + bytes(110)
+    rows: Dict[uuid.UUID, Dict[str, Any]] = {}
+    columns = [column.key for column in UploadSession.__table__.columns]
+    published: List[EncodeJob] = []
+    broker_down = [True]
+
+    # the upload_sessions table, rows updated under the WHERE of the real ones
+    class Session:
+        async def __aenter__(self) -> "Session":
+            return self
+
+        async def __aexit__(self, *_: Any) -> None:
+            pass
+
+        def add(self, upload: UploadSession) -> None:
+            rows[upload.id] = {name: getattr(upload, name) for name in columns}
+
+        async def commit(self) -> None:
+            pass
+
+    async def get_upload(upload_id: uuid.UUID) -> UploadSession:
+        if upload_id not in rows:
+            raise resumable.UploadNotFound(str(upload_id))
+        upload = UploadSession(**rows[upload_id])
+        if not upload.completed and upload.expires_at < resumable._now():
+            raise resumable.UploadExpired(str(upload_id))
+        return upload
+
+    async def acquire(upload: UploadSession, token: uuid.UUID, lease: int) -> None:
+        row = rows[upload.id]
+        held = row["lease_until"] and row["lease_until"] > resumable._now()
+        if row["offset"] != upload.offset or row["completed"] or held:
+            raise resumable.UploadConflict(str(upload.id))
+        row["lease_token"] = token
+        row["lease_until"] = resumable._now() + timedelta(seconds=lease)
+
+    async def store(upload_id: uuid.UUID, token: uuid.UUID, values: Any) -> None:
+        if rows[upload_id]["lease_token"] != token:
+            raise resumable.UploadConflict(str(upload_id))
+        rows[upload_id].update(values)
+
+    async def publish_encode(job: EncodeJob) -> None:
+        if broker_down[0]:
+            broker_down[0] = False
+            raise ConnectionError("broker unreachable")
+        published.append(job)
+
+    monkeypatch.setattr(resumable, "get_async_session", Session)
+    monkeypatch.setattr(resumable, "get_upload", get_upload)
+    monkeypatch.setattr(resumable, "_acquire", acquire)
+    monkeypatch.setattr(resumable, "_store", store)
+    monkeypatch.setattr(resumable, "publish_encode", publish_encode)
+
+    async def body(*pieces: bytes, disconnect: bool = False) -> AsyncIterator[bytes]:
+        for piece in pieces:
+            yield piece
+        if disconnect:
+            raise ClientDisconnect()
+
+    async def upload_in_chunks() -> None:
+        upload = await resumable.create_upload(s3, "v.mp4", len(data), None, 3600)
+        assert upload.part_size == PART
+
+        async def patch(offset: int, stream: AsyncIterator[bytes]) -> UploadSession:
+            return await resumable.append(s3, upload.id, offset, stream, 60, 3600)
+
+        await record_source(s3, "v.mp4", hashlib.sha256(b"old").hexdigest())
+
+        # less than a part is kept in the tail object
+        done = await patch(0, body(data[:60], data[60:100]))
+        assert (done.offset, done.tail_size, done.parts) == (100, 100, [])
+        assert await s3.read_object(resumable.tail_key(upload.id)) == data[:100]
+        # a PATCH not where the upload stands is refused
+        with pytest.raises(resumable.UploadConflict):
+            await patch(0, body(data[:100]))
+
+        # the tail is carried into the first part, the rest is the new tail
+        done = await patch(100, body(data[100:400]))
+        assert (done.offset, done.tail_size, len(done.parts)) == (400, 144, 1)
+        assert done.lease_token is None
+
+        # a PATCH whose lease ran out stops at its next record
+        async def overtaken() -> AsyncIterator[bytes]:
+            rows[upload.id]["lease_token"] = uuid.uuid4()
+            yield data[400:600]
+
+        with pytest.raises(resumable.UploadConflict):
+            await patch(400, overtaken())
+        assert rows[upload.id]["offset"] == 400
+        rows[upload.id]["lease_until"] = resumable._now() - timedelta(seconds=1)
+
+        # what reached the BFF before the client went away is kept
+        done = await patch(400, body(data[400:450], disconnect=True))
+        assert (done.offset, done.tail_size, len(done.parts)) == (450, 194, 1)
+        assert done.lease_token is None
+
+        # the last byte assembles the object, the failed enqueue leaves it so
+        with pytest.raises(ConnectionError):
+            await patch(450, body(data[450:]))
+        assert rows[upload.id]["offset"] == len(data)
+        assert not rows[upload.id]["completed"]
+        assert rows[upload.id]["lease_token"] is None
+        assert await s3.read_object("v.mp4") == data
+        assert await pending_uploads(s3) == []
+        assert not await s3.exists(resumable.tail_key(upload.id))
+
+        # a PATCH at the end retries the enqueue alone
+        done = await patch(len(data), body())
+        assert done.completed
+        assert published == [EncodeJob(video_id="v.mp4", size=len(data))]
+        assert not await s3.exists(digest_key("v.mp4"))
+        with pytest.raises(resumable.UploadConflict):
+            await patch(len(data), body())
+        assert len(published) == 1
+
+    asyncio.run(upload_in_chunks())
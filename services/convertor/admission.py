@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import shutil
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+MEMINFO = Path("/proc/meminfo")
+POLL_INTERVAL = 5.0
+
+
+class AdmissionTimeout(Exception):
+    pass
+
+
+def parse_meminfo(text: str) -> Optional[int]:
+    """MemAvailable of a /proc/meminfo dump in bytes."""
+    for line in text.splitlines():
+        if line.startswith("MemAvailable:"):
+            return int(line.split()[1]) * 1024
+    return None
+
+
+def available_memory() -> Optional[int]:
+    try:
+        return parse_meminfo(MEMINFO.read_text())
+    except OSError:
+        return None
+
+
+def free_disk(path: Path) -> int:
+    path.mkdir(parents=True, exist_ok=True)
+    return shutil.disk_usage(path).free
+
+
+class Admission:
+    """
+    Decide when this node may start another encode.
+
+    At most max_jobs encodes run at once, and a new one only starts while
+    the disk under work_dir and the RAM of the node have room for it. A job
+    that cannot get a slot and the resources within timeout is handed back
+    to the caller.
+
+    Long jobs hold at most long_jobs of the slots, so with max_jobs above
+    long_jobs a short video always finds one. A long job that got past that
+    cap waits for a slot in arrival order like any other, so it is never
+    overtaken for good.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int,
+        work_dir: Path,
+        min_free_disk: int,
+        min_free_memory: int,
+        timeout: float,
+        poll_interval: float = POLL_INTERVAL,
+        long_jobs: Optional[int] = None,
+    ) -> None:
+        self.work_dir = work_dir
+        self.min_free_disk = min_free_disk
+        self.min_free_memory = min_free_memory
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._slots = asyncio.Semaphore(max(1, max_jobs))
+        self._long_slots = asyncio.Semaphore(max(1, long_jobs or max_jobs))
+
+    def shortage(self) -> Optional[str]:
+        disk = free_disk(self.work_dir)
+        if disk < self.min_free_disk:
+            return f"{disk // (1024 * 1024)} MiB disk free"
+        memory = available_memory()
+        if memory is not None and memory < self.min_free_memory:
+            return f"{memory // (1024 * 1024)} MiB memory available"
+        return None
+
+    async def _acquire(
+        self, slots: asyncio.Semaphore, deadline: float, what: str
+    ) -> None:
+        if not slots.locked():
+            await slots.acquire()
+            return
+        try:
+            await asyncio.wait_for(
+                slots.acquire(), max(0.0, deadline - time.monotonic())
+            )
+        except asyncio.TimeoutError:
+            raise AdmissionTimeout(f"No free {what} on this node") from None
+
+    @asynccontextmanager
+    async def slot(self, job: str, long: bool = False) -> AsyncIterator[None]:
+        # one deadline for the slots and the resources: a job prefetched onto
+        # a busy node goes back to the queue instead of waiting here for good
+        deadline = time.monotonic() + self.timeout
+        async with AsyncExitStack() as held:
+            if long:
+                # long jobs first wait for one of the slots they may hold
+                await self._acquire(self._long_slots, deadline, "long-job slot")
+                held.callback(self._long_slots.release)
+            await self._acquire(self._slots, deadline, "encode slot")
+            held.callback(self._slots.release)
+            while (reason := self.shortage()) is not None:
+                if time.monotonic() >= deadline:
+                    raise AdmissionTimeout(f"Node is short on resources: {reason}")
+                logging.info("[admission] Job %s waits, %s", job, reason)
+                await asyncio.sleep(self.poll_interval)
+            yield
@@ -0,0 +1,363 @@
+"""
+End to end benchmark of the encode pipeline on synthetic sources.
+
+Every case renders a testsrc2 + sine source with ffmpeg, uploads it to a local
+S3 stand-in and pushes an EncodeJob through the worker handlers on an
+in-memory broker, exactly like an upload from the BFF. The report is JSON so
+two releases can be diffed.
+
+Run from services/convertor, on any box with ffmpeg (no GPU needed):
+
+    pip install "moto[server]"
+    python -m benchmarks.bench_encode --cases 640x360:30,1280x720:60 -o bench.json
+
+Pass --endpoint to benchmark against a running MinIO instead of moto. Worker
+settings come from the environment as usual, CHUNKED_ENCODING_MIN_DURATION=0
+for instance benchmarks the chunked path on short sources.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+BUCKET = "bench"
+SAMPLE_INTERVAL = 0.2
+# last status the worker published per video, other than progress
+STATUSES: Dict[str, str] = {}
+
+
+@dataclass(frozen=True)
+class Case:
+    width: int
+    height: int
+    duration: float
+    fps: int = 30
+
+    @property
+    def name(self) -> str:
+        return f"{self.width}x{self.height}_{self.duration:g}s"
+
+
+@dataclass
+class CaseResult:
+    case: str
+    source_bytes: int
+    wall_seconds: float
+    # seconds of source encoded per wall clock second, whole job
+    realtime_factor: float
+    result: str
+    # summed wall time per stage of the worker, from its own histograms
+    stages: Dict[str, float] = field(default_factory=dict)
+    bytes: Dict[str, float] = field(default_factory=dict)
+    s3_requests: Dict[str, float] = field(default_factory=dict)
+    # ffmpeg speed= as the worker saw it, one value per encode
+    encode_speed: Optional[float] = None
+    peak_rss_bytes: int = 0
+    peak_disk_bytes: int = 0
+
+
+def parse_cases(spec: str) -> List[Case]:
+    """WIDTHxHEIGHT:SECONDS[,...]"""
+    cases = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        size, _, seconds = item.partition(":")
+        width, _, height = size.partition("x")
+        cases.append(Case(int(width), int(height), float(seconds or 30)))
+    return cases
+
+
+def render_source(ffmpeg: str, case: Case, path: Path) -> None:
+    subprocess.run(
+        [
+            ffmpeg,
+            "-y",
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc2=size={case.width}x{case.height}:rate={case.fps}"
+            f":duration={case.duration:g}",
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency=440:sample_rate=48000:duration={case.duration:g}",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-pix_fmt",
+            "yuv420p",
+            "-c:a",
+            "aac",
+            "-shortest",
+            "-movflags",
+            "+faststart",
+            str(path),
+        ],
+        check=True,
+    )
+
+
+# ---------- resource sampling ----------
+def _rss(pid: int) -> int:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def _descendants(pid: int) -> Iterator[int]:
+    try:
+        children = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+    except OSError:
+        return
+    for child in map(int, children):
+        yield child
+        yield from _descendants(child)
+
+
+def _disk_usage(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+class PeakSampler:
+    """Peak RSS of the worker plus its ffmpeg children, and of its work dir."""
+
+    def __init__(self, work_dir: Path, interval: float = SAMPLE_INTERVAL) -> None:
+        self.work_dir = work_dir
+        self.interval = interval
+        self.rss = 0
+        self.disk = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def sample(self) -> None:
+        pid = os.getpid()
+        rss = _rss(pid) + sum(_rss(child) for child in _descendants(pid))
+        self.rss = max(self.rss, rss)
+        self.disk = max(self.disk, _disk_usage(self.work_dir))
+
+    async def _run(self) -> None:
+        while True:
+            # the walk blocks, keep it off the loop that feeds ffmpeg
+            await asyncio.to_thread(self.sample)
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self) -> "PeakSampler":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        self.sample()
+
+
+# ---------- worker metrics ----------
+def metric_samples() -> Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]:
+    from metrics import registry
+
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for metric in registry.collect()
+        for sample in metric.samples
+        if not sample.name.endswith(("_bucket", "_created"))
+    }
+
+
+def metric_delta(
+    before: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float],
+    after: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float],
+    name: str,
+    label: str,
+) -> Dict[str, float]:
+    delta: Dict[str, float] = {}
+    for (sample, labels), value in after.items():
+        if sample != name:
+            continue
+        key = dict(labels).get(label, "")
+        diff = value - before.get((sample, labels), 0.0)
+        if diff:
+            delta[key] = round(delta.get(key, 0.0) + diff, 3)
+    return delta
+
+
+# ---------- running a case ----------
+async def run_case(ffmpeg: str, case: Case, source_dir: Path) -> CaseResult:
+    from faststream.rabbit import TestRabbitBroker
+
+    import rabbit_client
+    from main import LOCAL_BASE
+    from s3_client import s3_client
+
+    source = source_dir / f"{case.name}.mp4"
+    if not source.exists():
+        render_source(ffmpeg, case, source)
+    video_id = f"{case.name}.mp4"
+    await s3_client.upload_paths([(video_id, source)])
+
+    STATUSES.clear()
+    before = metric_samples()
+    started = time.perf_counter()
+    with PeakSampler(LOCAL_BASE) as sampler:
+        async with TestRabbitBroker(rabbit_client.broker) as broker:
+            # handlers run inline, chunk and stitch jobs included
+            await broker.publish(
+                {"video_id": video_id, "size": source.stat().st_size},
+                queue=rabbit_client.ENCODE_QUEUE,
+            )
+    wall = time.perf_counter() - started
+    after = metric_samples()
+
+    speed = metric_delta(before, after, "convertor_encode_realtime_factor_sum", "")
+    speed_count = metric_delta(
+        before, after, "convertor_encode_realtime_factor_count", ""
+    )
+    result = STATUSES.get(video_id, "unknown")
+    await s3_client.delete_prefix(f"{video_id}/")
+    return CaseResult(
+        case=case.name,
+        source_bytes=source.stat().st_size,
+        wall_seconds=round(wall, 3),
+        realtime_factor=round(case.duration / wall, 3),
+        result=result,
+        stages=metric_delta(
+            before, after, "convertor_job_stage_duration_seconds_sum", "stage"
+        ),
+        bytes=metric_delta(before, after, "convertor_bytes_total", "direction"),
+        s3_requests=metric_delta(
+            before, after, "convertor_s3_request_duration_seconds_count", "operation"
+        ),
+        encode_speed=(
+            round(speed[""] / speed_count[""], 3)
+            if speed.get("") and speed_count.get("")
+            else None
+        ),
+        peak_rss_bytes=sampler.rss,
+        peak_disk_bytes=sampler.disk,
+    )
+
+
+def ffmpeg_version(ffmpeg: str) -> str:
+    output = subprocess.run(
+        [ffmpeg, "-version"], capture_output=True, text=True, check=True
+    ).stdout
+    return output.splitlines()[0] if output else ""
+
+
+def configure_env(endpoint: str) -> None:
+    """Settings of the worker modules, read once when they are imported."""
+    defaults = {
+        "MINIO_ROOT_USER": "bench",
+        "MINIO_ROOT_PASSWORD": "bench-secret",
+        "MINIO_ENDPOINT_URL": endpoint,
+        "MINIO_BUCKET_NAME": BUCKET,
+        "MINIO_REGION_NAME": "us-east-1",
+        # CPU-only and repeatable, whatever the box has
+        "ENCODER_BACKEND": "x264",
+        "ENCODER_MIN_FREE_DISK": "0",
+        "ENCODER_MIN_FREE_MEMORY": "0",
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+    os.environ["MINIO_ENDPOINT_URL"] = endpoint
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    import rabbit_client
+    from encoders import init_encoder_backend
+    from s3_client import s3_client
+
+    @rabbit_client.broker.subscriber(rabbit_client.STATUS_QUEUE)
+    async def collect_status(message: Dict[str, Any]) -> None:
+        if message.get("status") != "encoding":
+            STATUSES[message["video_id"]] = message["status"]
+
+    backend = await init_encoder_backend()
+    await s3_client.start()
+    try:
+        async with s3_client._get_client() as client:
+            try:
+                await client.create_bucket(Bucket=s3_client.bucket_name)
+            except client.exceptions.BucketAlreadyOwnedByYou:
+                pass
+        results = []
+        with tempfile.TemporaryDirectory(prefix="bench-sources-") as tmp:
+            for case in parse_cases(args.cases):
+                for _ in range(args.repeat):
+                    result = await run_case(args.ffmpeg, case, Path(tmp))
+                    print(
+                        f"{result.case}: {result.wall_seconds}s, "
+                        f"{result.realtime_factor}x realtime, {result.result}",
+                        file=sys.stderr,
+                    )
+                    results.append(asdict(result))
+    finally:
+        await s3_client.close()
+    return {
+        "ffmpeg": ffmpeg_version(args.ffmpeg),
+        "backend": backend.name,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "cases": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--cases",
+        default="640x360:30,1280x720:60,1920x1080:120",
+        help="WIDTHxHEIGHT:SECONDS, comma separated",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--ffmpeg", default=os.environ.get("FFMPEG_BIN", "ffmpeg"))
+    parser.add_argument("--endpoint", help="S3 endpoint, a moto server by default")
+    parser.add_argument("--port", type=int, default=5055, help="port of moto")
+    parser.add_argument("-o", "--output", help="JSON report, stdout by default")
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        from moto.server import ThreadedMotoServer
+
+        server = ThreadedMotoServer(port=args.port, verbose=False)
+        server.start()
+        endpoint = f"http://127.0.0.1:{args.port}"
+    configure_env(endpoint)
+    try:
+        report = asyncio.run(benchmark(args))
+    finally:
+        if server is not None:
+            server.stop()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import logging
+import re
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Set
+
+from botocore.exceptions import ClientError
+
+from playlist import MediaPlaylist, parse_media_playlist, stitch_media_playlists
+from progress import Throttle
+from s3_client import S3Client
+from schemas import JobCheckpoint
+
+URI_ATTR_RE = re.compile(r'URI="([^"]+)"')
+
+
+def checkpoint_key(video_id: str) -> str:
+    return f"{video_id}/checkpoint.json"
+
+
+async def load_checkpoint(s3: S3Client, video_id: str) -> Optional[JobCheckpoint]:
+    key = checkpoint_key(video_id)
+    if not await s3.exists(key):
+        return None
+    return JobCheckpoint.model_validate_json(await s3.read_object(key))
+
+
+async def save_checkpoint(s3: S3Client, state: JobCheckpoint) -> None:
+    await s3.put_bytes(checkpoint_key(state.video_id), state.model_dump_json().encode())
+
+
+def resume_position(state: JobCheckpoint) -> float:
+    """
+    Seconds of the source the recorded segments cover, where a resumed
+    encode starts. Summed from their EXTINF: segments are cut at key frames,
+    so the last one before a seam, or any of a VFR source, is not HLS_TIME.
+    """
+    # video renditions are all cut at the same forced key frames
+    names = [r.name for r in state.ladder if r.name in state.playlists]
+    if not names:
+        return 0.0
+    return parse_media_playlist(state.playlists[names[0]]).duration
+
+
+async def verify_published(
+    s3: S3Client, video_id: str, renditions: Optional[int] = None
+) -> None:
+    """
+    Make sure the master, every media playlist and every segment they list
+    are in S3 before the source of a job is removed.
+
+    Raises:
+        RuntimeError: Something a player would ask for is missing.
+    """
+    keys = set(await s3.list_keys(f"{video_id}/"))
+    if f"{video_id}/master.m3u8" not in keys:
+        raise RuntimeError(f"Master playlist of {video_id} is missing")
+    playlists = sorted(
+        key
+        for key in keys
+        if key.endswith("/playlist.m3u8")
+        and key.count("/") == 2
+        and key.split("/")[1].startswith("stream_")
+    )
+    if not playlists or (renditions is not None and len(playlists) != renditions):
+        raise RuntimeError(
+            f"Expected {renditions} media playlists for {video_id}, "
+            f"found {len(playlists)}"
+        )
+    for key in playlists:
+        base = key.rsplit("/", 1)[0]
+        playlist = parse_media_playlist((await s3.read_object(key)).decode())
+        uris = {s.uri for s in playlist.segments}
+        # init sections of fMP4 renditions
+        uris.update(
+            match.group(1)
+            for s in playlist.segments
+            for tag in s.tags
+            if tag.startswith("#EXT-X-MAP:")
+            for match in URI_ATTR_RE.finditer(tag)
+        )
+        missing = [uri for uri in uris if f"{base}/{uri}" not in keys]
+        if missing:
+            raise RuntimeError(f"{len(missing)} segments of {key} are missing")
+
+
+class Checkpointer:
+    """
+    Record in S3 how far an encode got, so a redelivered job resumes there.
+
+    A segment counts as done once it is uploaded and listed in the playlist
+    ffmpeg keeps on disk. Only the segments done in every rendition are
+    recorded, so a resumed encode restarts all renditions at the same cut.
+    """
+
+    def __init__(
+        self,
+        s3: S3Client,
+        state: JobCheckpoint,
+        output_dir: Path,
+        streams: Sequence[str],
+        interval: float,
+    ) -> None:
+        self.s3 = s3
+        self.state = state
+        # every variant stream of the encode, video renditions and audio
+        self.streams = list(streams)
+        self.output_dir = output_dir
+        self.throttle = Throttle(interval)
+        # what earlier attempts left, this attempt appends to it
+        self._previous = dict(state.playlists)
+        self._previous_segments = state.segments
+        self._recorded = 0
+
+    def _local_segments(self, name: str, uploaded: Set[str]) -> MediaPlaylist:
+        rendition_dir = self.output_dir / f"stream_{name}"
+        path = rendition_dir / "playlist.m3u8"
+        playlist = MediaPlaylist()
+        if not path.exists():
+            return playlist
+        local = parse_media_playlist(path.read_text())
+        playlist.header = local.header
+        for segment in local.segments:
+            if f"{rendition_dir.name}/{segment.uri}" not in uploaded:
+                break
+            playlist.segments.append(segment)
+        return playlist
+
+    def _merge(self, name: str, local: MediaPlaylist) -> MediaPlaylist:
+        previous = self._previous.get(name)
+        if not previous:
+            return local
+        return stitch_media_playlists([parse_media_playlist(previous), local])
+
+    async def update(self, uploaded: Set[str]) -> None:
+        local = {name: self._local_segments(name, uploaded) for name in self.streams}
+        done = min(len(p.segments) for p in local.values())
+        if done <= self._recorded or not self.throttle.ready():
+            return
+
+        playlists: Dict[str, str] = {}
+        for name, playlist in local.items():
+            playlist.segments = playlist.segments[:done]
+            playlists[name] = self._merge(name, playlist).render()
+        state = self.state.model_copy(
+            update={
+                "segments": self._previous_segments + done,
+                "playlists": playlists,
+            }
+        )
+        try:
+            await save_checkpoint(self.s3, state)
+        except ClientError as e:
+            # the next flush tries again, the encode itself goes on
+            logging.warning(f"Failed to save checkpoint of {state.video_id}: {e}")
+            return
+        self.state = state
+        self._recorded = done
+
+    def merge_playlists(self) -> None:
+        """Prepend the segments of earlier attempts to the local playlists."""
+        if not self._previous:
+            return
+        for path in sorted(self.output_dir.glob("stream_*/playlist.m3u8")):
+            name = path.parent.name[len("stream_") :]
+            local = parse_media_playlist(path.read_text())
+            path.write_text(self._merge(name, local).render())
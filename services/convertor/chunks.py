@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import subprocess
+from typing import List, Sequence, Tuple
+
+# how far past a target boundary to look for the next source keyframe
+KEYFRAME_WINDOW = 10.0
+
+
+def chunk_targets(duration: float, chunk_seconds: float) -> List[float]:
+    """Evenly spaced cut points; a short tail is merged into the last chunk."""
+    targets = []
+    t = chunk_seconds
+    while duration - t > chunk_seconds / 2:
+        targets.append(t)
+        t += chunk_seconds
+    return targets
+
+
+def parse_keyframes(output: str) -> List[float]:
+    keyframes = []
+    for line in output.splitlines():
+        pts, _, flags = line.strip().partition(",")
+        if "K" in flags:
+            try:
+                keyframes.append(float(pts))
+            except ValueError:
+                continue
+    return sorted(keyframes)
+
+
+def snap_to_keyframes(
+    targets: Sequence[float], keyframes: Sequence[float], window: float
+) -> List[float]:
+    """Move every target to the first keyframe at or after it, if one is close."""
+    snapped: List[float] = []
+    for target in targets:
+        nearest = next((k for k in keyframes if target <= k <= target + window), target)
+        if not snapped or nearest > snapped[-1]:
+            snapped.append(nearest)
+    return snapped
+
+
+async def find_keyframes(
+    ffprobe_bin: str, url: str, targets: Sequence[float]
+) -> List[float]:
+    """
+    List video keyframes shortly after each target.
+
+    Only packet headers inside small read intervals are probed, so this costs
+    a few ranged reads instead of a pass over the whole source.
+    """
+    if not targets:
+        return []
+    intervals = ",".join(f"{t:.3f}%+{KEYFRAME_WINDOW:.0f}" for t in targets)
+    process = await asyncio.create_subprocess_exec(
+        ffprobe_bin,
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-read_intervals",
+        intervals,
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=p=0",
+        url,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    out, err = await process.communicate()
+    if process.returncode != 0:
+        logging.warning(
+            "[ffprobe] Keyframe probe failed, cutting at fixed times: %s",
+            err.decode(errors="ignore").strip(),
+        )
+        return []
+    return parse_keyframes(out.decode(errors="ignore"))
+
+
+async def plan_chunks(
+    ffprobe_bin: str, url: str, duration: float, chunk_seconds: float
+) -> List[Tuple[float, float]]:
+    """
+    Split the source timeline into (start, duration) ranges cut at keyframes.
+    """
+    targets = chunk_targets(duration, chunk_seconds)
+    keyframes = await find_keyframes(ffprobe_bin, url, targets)
+    cuts = [0.0] + snap_to_keyframes(targets, keyframes, KEYFRAME_WINDOW)
+    edges = cuts + [duration]
+    return [(edges[i], edges[i + 1] - edges[i]) for i in range(len(cuts))]
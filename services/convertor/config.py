@@ -1,8 +1,11 @@
 from functools import lru_cache
 from pathlib import Path
+from typing import List
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from ladder import DEFAULT_LADDER, Rendition
+
 BASE_DIR = Path(__file__).resolve().parent
 
 
@@ -17,10 +20,81 @@ class S3Settings(BaseAppSettings):
     MINIO_ENDPOINT_URL: str
     MINIO_BUCKET_NAME: str
     MINIO_REGION_NAME: str
+    S3_UPLOAD_CONCURRENCY: int = 8
+    S3_PART_SIZE: int = 1024 * 1024 * 10
+    # parts in flight x part size bounds the memory of one upload
+    S3_MAX_PARTS_IN_FLIGHT: int = 4
+    # ranged GETs requested ahead of the consumer
+    S3_DOWNLOAD_PREFETCH: int = 4
+    S3_MAX_POOL_CONNECTIONS: int = 50
+    # seconds an idle pooled connection is kept open
+    S3_KEEPALIVE_TIMEOUT: float = 60
+    # attempts per S3 call, with full-jitter exponential backoff in between
+    S3_RETRY_ATTEMPTS: int = 5
+    S3_RETRY_BASE_DELAY: float = 0.2
+    S3_RETRY_MAX_DELAY: float = 10
 
     model_config = SettingsConfigDict(env_file=str(BASE_DIR / "s3.env"))
 
 
+class EncoderSettings(BaseAppSettings):
+    FFMPEG_BIN: str = "ffmpeg"
+    FFPROBE_BIN: str = "ffprobe"
+    # auto | nvenc | qsv | vaapi | x264 | x265
+    ENCODER_BACKEND: str = "auto"
+    ENCODER_VAAPI_DEVICE: str = "/dev/dri/renderD128"
+    ENCODER_SOFTWARE_PRESET: str = "veryfast"
+    # rung table as JSON, the ladder of a job is picked from it per source
+    ENCODER_LADDER: List[Rendition] = DEFAULT_LADDER
+    # sources at least this long are split into chunks encoded by any worker
+    CHUNKED_ENCODING: bool = True
+    CHUNKED_ENCODING_MIN_DURATION: float = 600
+    CHUNK_DURATION: float = 120
+    # deliveries of a failing chunk or stitch before the video is failed
+    CHUNK_JOB_ATTEMPTS: int = 3
+    # encodes run at once on this node and messages RabbitMQ may push ahead
+    ENCODER_MAX_JOBS: int = 2
+    ENCODER_PREFETCH: int = 2
+    ENCODER_THREADS: int = 0
+    # sources this long, or uploads this large while the duration is unknown,
+    # are encoded from the long lane
+    ENCODER_LONG_JOB_DURATION: float = 600
+    ENCODER_LONG_JOB_SIZE: int = 1024 * 1024 * 1024 * 2
+    # long-lane and chunk encodes at once, below ENCODER_MAX_JOBS a short
+    # video always finds a free slot
+    ENCODER_LONG_JOBS: int = 1
+    # no new job is started while free space under LOCAL_BASE or RAM is lower
+    ENCODER_MIN_FREE_DISK: int = 1024 * 1024 * 1024 * 5
+    ENCODER_MIN_FREE_MEMORY: int = 1024 * 1024 * 1024
+    # seconds a job waits for resources before it is requeued
+    ENCODER_ADMISSION_TIMEOUT: float = 120
+    # seconds between progress events of one encode on the status queue
+    ENCODER_PROGRESS_INTERVAL: float = 5
+    # muxed | shared, see EncodeOptions.audio_mode
+    ENCODER_AUDIO_MODE: str = "shared"
+    # ts | fmp4 | fmp4_single, jobs may ask for another one
+    ENCODER_OUTPUT_FORMAT: str = "ts"
+    # seconds between checkpoints of a running encode in S3
+    ENCODER_CHECKPOINT_INTERVAL: float = 30
+    # seek preview sprites, WebVTT index and poster out of the encode decode
+    ENCODER_THUMBNAILS: bool = True
+    ENCODER_THUMBNAIL_INTERVAL: float = 10
+    ENCODER_THUMBNAIL_WIDTH: int = 160
+    ENCODER_SPRITE_COLUMNS: int = 10
+    ENCODER_SPRITE_ROWS: int = 10
+    # jpg | webp
+    ENCODER_THUMBNAIL_FORMAT: str = "jpg"
+    # seconds into the source, at most half of a shorter source
+    ENCODER_POSTER_TIME: float = 5
+
+    model_config = SettingsConfigDict(env_file=str(BASE_DIR / "convertor.env"))
+
+
 @lru_cache()
 def get_s3_settings() -> S3Settings:
     return S3Settings()
+
+
+@lru_cache()
+def get_encoder_settings() -> EncoderSettings:
+    return EncoderSettings()
@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import subprocess
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple, Type
+
+from config import EncoderSettings, get_encoder_settings
+from ladder import Rendition
+
+
+@dataclass(frozen=True)
+class Capabilities:
+    encoders: FrozenSet[str]
+    filters: FrozenSet[str]
+    hwaccels: FrozenSet[str]
+
+
+class EncoderBackend:
+    """
+    Base class for an ffmpeg encoder backend.
+
+    A backend knows which encoders, filters and hwaccel it needs and how to
+    build the decode, scale and rate-control parts of the ffmpeg command line.
+    """
+
+    name: str = ""
+    encoder: str = ""
+    scale_filter: str = ""
+    hwaccel: Optional[str] = None
+    hardware: bool = False
+
+    def __init__(self, settings: EncoderSettings) -> None:
+        self.settings = settings
+
+    def is_supported(self, caps: Capabilities) -> bool:
+        if self.encoder not in caps.encoders:
+            return False
+        if self.scale_filter not in caps.filters:
+            return False
+        return self.hwaccel is None or self.hwaccel in caps.hwaccels
+
+    def input_args(self) -> List[str]:
+        return []
+
+    def scale(self, width: int, height: int) -> str:
+        return (
+            f"{self.scale_filter}=w={width}:h={height}"
+            ":force_original_aspect_ratio=decrease"
+        )
+
+    def download(self) -> str:
+        """Filters bringing a decoded frame to system memory, with a trailing comma."""
+        # hwdownload keeps the software format of the hardware frames
+        return "hwdownload,format=nv12|p010le," if self.hardware else ""
+
+    def video_args(self, index: int, rendition: Rendition) -> List[str]:
+        return [
+            f"-c:v:{index}",
+            self.encoder,
+            f"-b:v:{index}",
+            rendition.video_bitrate,
+            f"-maxrate:v:{index}",
+            rendition.maxrate,
+            f"-bufsize:v:{index}",
+            rendition.bufsize,
+        ]
+
+    def global_args(self) -> List[str]:
+        return []
+
+    def smoke_args(self) -> Tuple[List[str], List[str]]:
+        """Extra (input, output) args to feed a software test frame to the encoder."""
+        return [], []
+
+
+class NvencBackend(EncoderBackend):
+    name = "nvenc"
+    encoder = "h264_nvenc"
+    scale_filter = "scale_npp"
+    hwaccel = "cuda"
+    hardware = True
+
+    def input_args(self) -> List[str]:
+        return ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"]
+
+    def global_args(self) -> List[str]:
+        return ["-rc", "vbr", "-preset", "p1", "-tune:v", "ull", "-forced-idr", "1"]
+
+
+class QsvBackend(EncoderBackend):
+    name = "qsv"
+    encoder = "h264_qsv"
+    scale_filter = "scale_qsv"
+    hwaccel = "qsv"
+    hardware = True
+
+    def input_args(self) -> List[str]:
+        return ["-hwaccel", "qsv", "-hwaccel_output_format", "qsv"]
+
+    def global_args(self) -> List[str]:
+        return ["-preset", "veryfast"]
+
+
+class VaapiBackend(EncoderBackend):
+    name = "vaapi"
+    encoder = "h264_vaapi"
+    scale_filter = "scale_vaapi"
+    hwaccel = "vaapi"
+    hardware = True
+
+    def input_args(self) -> List[str]:
+        return [
+            "-hwaccel",
+            "vaapi",
+            "-hwaccel_device",
+            self.settings.ENCODER_VAAPI_DEVICE,
+            "-hwaccel_output_format",
+            "vaapi",
+        ]
+
+    def global_args(self) -> List[str]:
+        return ["-rc_mode", "VBR"]
+
+    def smoke_args(self) -> Tuple[List[str], List[str]]:
+        return (
+            ["-vaapi_device", self.settings.ENCODER_VAAPI_DEVICE],
+            ["-vf", "format=nv12,hwupload"],
+        )
+
+
+class X264Backend(EncoderBackend):
+    name = "x264"
+    encoder = "libx264"
+    scale_filter = "scale"
+
+    def scale(self, width: int, height: int) -> str:
+        return super().scale(width, height) + ":force_divisible_by=2"
+
+    def global_args(self) -> List[str]:
+        return [
+            "-preset",
+            self.settings.ENCODER_SOFTWARE_PRESET,
+            "-pix_fmt",
+            "yuv420p",
+        ]
+
+
+class X265Backend(X264Backend):
+    name = "x265"
+    encoder = "libx265"
+
+
+BACKENDS: Dict[str, Type[EncoderBackend]] = {
+    backend.name: backend
+    for backend in (NvencBackend, QsvBackend, VaapiBackend, X264Backend, X265Backend)
+}
+AUTO_ORDER: Tuple[str, ...] = ("nvenc", "qsv", "vaapi", "x264")
+
+
+async def _run(cmd: List[str]) -> Tuple[int, str]:
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    out, _ = await process.communicate()
+    return await process.wait(), out.decode(errors="ignore")
+
+
+def parse_encoders(output: str) -> FrozenSet[str]:
+    names = set()
+    listing = False
+    for line in output.splitlines():
+        parts = line.split()
+        if not listing:
+            listing = line.strip().startswith("---")
+            continue
+        if len(parts) >= 2:
+            names.add(parts[1])
+    return frozenset(names)
+
+
+def parse_filters(output: str) -> FrozenSet[str]:
+    names = set()
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) >= 3 and "->" in parts[2]:
+            names.add(parts[1])
+    return frozenset(names)
+
+
+def parse_hwaccels(output: str) -> FrozenSet[str]:
+    lines = [line.strip() for line in output.splitlines()]
+    return frozenset(line for line in lines if line and not line.endswith(":"))
+
+
+async def probe_capabilities(ffmpeg_bin: str) -> Capabilities:
+    base = [ffmpeg_bin, "-hide_banner"]
+    _, encoders = await _run(base + ["-encoders"])
+    _, filters = await _run(base + ["-filters"])
+    _, hwaccels = await _run(base + ["-hwaccels"])
+    return Capabilities(
+        encoders=parse_encoders(encoders),
+        filters=parse_filters(filters),
+        hwaccels=parse_hwaccels(hwaccels),
+    )
+
+
+async def smoke_test(backend: EncoderBackend) -> bool:
+    """
+    Encode a single synthetic frame to make sure the device behind a hardware
+    backend is actually usable, not just compiled into ffmpeg.
+    """
+    input_args, output_args = backend.smoke_args()
+    cmd = [
+        backend.settings.FFMPEG_BIN,
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        *input_args,
+        "-f",
+        "lavfi",
+        "-i",
+        "testsrc=size=320x240:rate=1",
+        *output_args,
+        "-frames:v",
+        "1",
+        "-c:v",
+        backend.encoder,
+        "-f",
+        "null",
+        "-",
+    ]
+    rc, out = await _run(cmd)
+    if rc != 0:
+        logging.info("[encoder] %s smoke test failed: %s", backend.name, out.strip())
+    return rc == 0
+
+
+async def select_backend(
+    settings: EncoderSettings, caps: Capabilities
+) -> EncoderBackend:
+    requested = settings.ENCODER_BACKEND
+    if requested != "auto":
+        if requested not in BACKENDS:
+            raise ValueError(f"Unknown encoder backend: {requested}")
+        backend = BACKENDS[requested](settings)
+        if not backend.is_supported(caps):
+            raise RuntimeError(f"ffmpeg does not support encoder backend {requested}")
+        return backend
+
+    for name in AUTO_ORDER:
+        backend = BACKENDS[name](settings)
+        if not backend.is_supported(caps):
+            continue
+        if backend.hardware and not await smoke_test(backend):
+            continue
+        return backend
+    raise RuntimeError("No usable encoder backend found in ffmpeg build")
+
+
+_backend_instance: Optional[EncoderBackend] = None
+
+
+async def init_encoder_backend() -> EncoderBackend:
+    """
+    Probe the local ffmpeg build and pick the encoder backend once,
+    at worker startup.
+    """
+    global _backend_instance
+    settings = get_encoder_settings()
+    caps = await probe_capabilities(settings.FFMPEG_BIN)
+    _backend_instance = await select_backend(settings, caps)
+    logging.info("[encoder] Using %s backend", _backend_instance.name)
+    return _backend_instance
+
+
+def get_encoder_backend() -> EncoderBackend:
+    if _backend_instance is None:
+        raise RuntimeError("Encoder backend is not initialized")
+    return _backend_instance
@@ -0,0 +1,90 @@
+from dataclasses import dataclass, replace
+from typing import List, Sequence
+
+from probe import SourceInfo
+
+# frame rates above this get more bits per rung
+HIGH_FPS = 30.5
+HIGH_FPS_BITRATE_FACTOR = 1.5
+# floor of a rung capped at the source bitrate, ffmpeg rejects "0k"
+MIN_VIDEO_KBPS = 64
+
+
+@dataclass(frozen=True)
+class Rendition:
+    name: str
+    width: int
+    height: int
+    video_bitrate: str
+    maxrate: str
+    bufsize: str
+    audio_bitrate: str
+
+
+# more rungs, a 480p one for instance, are configured with ENCODER_LADDER
+DEFAULT_LADDER: List[Rendition] = [
+    Rendition("360p", 640, 360, "800k", "800k", "1200k", "96k"),
+    Rendition("720p", 1280, 720, "2000k", "2000k", "3000k", "128k"),
+    Rendition("1080p", 1920, 1080, "5000k", "5000k", "7500k", "192k"),
+]
+
+
+def _kbps(value: str) -> int:
+    value = value.strip().lower()
+    if value.endswith("m"):
+        return int(float(value[:-1]) * 1000)
+    if value.endswith("k"):
+        return int(float(value[:-1]))
+    return int(value) // 1000
+
+
+def _fit(rung: Rendition, info: SourceInfo) -> Rendition:
+    """Orient the rung box like the source and adjust its bitrates."""
+    width, height = rung.width, rung.height
+    if info.height > info.width:
+        width, height = height, width
+
+    base = _kbps(rung.video_bitrate)
+    bitrate = base
+    if info.fps > HIGH_FPS:
+        bitrate = int(bitrate * HIGH_FPS_BITRATE_FACTOR)
+    if info.bitrate:
+        # spending more bits than the source has buys nothing
+        bitrate = max(MIN_VIDEO_KBPS, min(bitrate, info.bitrate // 1000))
+    factor = bitrate / base
+    return replace(
+        rung,
+        width=width,
+        height=height,
+        video_bitrate=f"{bitrate}k",
+        maxrate=f"{int(_kbps(rung.maxrate) * factor)}k",
+        bufsize=f"{int(_kbps(rung.bufsize) * factor)}k",
+    )
+
+
+def select_ladder(info: SourceInfo, rungs: Sequence[Rendition]) -> List[Rendition]:
+    """
+    Pick the rungs that can be produced from the source without upscaling.
+
+    A rung box is kept when fitting the source into it does not enlarge the
+    picture. If the source is smaller than every rung, a single rendition at
+    the source size is produced with the lowest rung's rate control.
+    """
+    ladder = []
+    for rung in sorted(rungs, key=lambda r: r.width * r.height):
+        fitted = _fit(rung, info)
+        if fitted.width <= info.width or fitted.height <= info.height:
+            ladder.append(fitted)
+    if ladder:
+        return ladder
+
+    lowest = min(rungs, key=lambda r: r.width * r.height)
+    short_side = min(info.width, info.height)
+    return [
+        replace(
+            _fit(lowest, info),
+            name=f"{short_side}p",
+            width=info.width,
+            height=info.height,
+        )
+    ]
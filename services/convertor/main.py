@@ -2,10 +2,34 @@ import asyncio
 import logging
 import shutil
 import subprocess
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import AsyncIterable
+from typing import (
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+)
+
+from encoders import EncoderBackend
+from ladder import DEFAULT_LADDER, Rendition
+from playlist import parse_media_playlist
+from thumbnails import (
+    THUMBNAILS_DIR,
+    ThumbnailOptions,
+    thumbnail_filters,
+    thumbnail_outputs,
+    wants_poster,
+)
 
 LOCAL_BASE = Path("/tmp/processing")
+HLS_TIME = 6
+# ts: MPEG-TS segments; fmp4: CMAF segments with an init section;
+# fmp4_single: one CMAF file per rendition addressed with EXT-X-BYTERANGE
+OUTPUT_FORMATS = ("ts", "fmp4", "fmp4_single")
 
 
 # ---------- Utility: safe mkdir / cleanup ----------
@@ -25,112 +49,290 @@ def cleanup_dirs(video_id: str) -> None:
         logging.error(f"Failed to cleanup local dirs for {video_id}, Error: {e}")
 
 
-async def stream_ffmpeg(
-    input_async_iter: AsyncIterable[bytes], output_dir: Path
-) -> int:
-    out_template = str(output_dir / "stream_%v" / "seg_%03d.ts")
+@dataclass
+class EncodeOptions:
+    renditions: Sequence[Rendition] = field(default_factory=lambda: DEFAULT_LADDER)
+    has_audio: bool = True
+    # "pipe:0" reads the bytes fed to stdin, anything else is opened by ffmpeg
+    source: str = "pipe:0"
+    # encode only [start, start + duration) of the source
+    start: Optional[float] = None
+    duration: Optional[float] = None
+    # prefix of segment file names, keeps names of different chunks apart
+    segment_prefix: str = ""
+    # number of the first segment, a resumed encode continues the numbering
+    start_number: int = 0
+    # muxed: AAC in every video variant; shared: AAC encoded once as the
+    # EXT-X-MEDIA group every video variant refers to
+    audio_mode: str = "muxed"
+    output_format: str = "ts"
+    # sprite sheets and poster cut from the same decoded frames
+    thumbnails: Optional[ThumbnailOptions] = None
+
+
+AUDIO_GROUP = "aud"
+
+
+def shared_audio_bitrate(renditions: Sequence[Rendition]) -> str:
+    # ladders go up, the top rung's audio serves every variant
+    return renditions[-1].audio_bitrate
+
+
+def shared_audio(options: EncodeOptions) -> bool:
+    return options.has_audio and options.audio_mode == "shared"
+
+
+def stream_names(options: EncodeOptions) -> List[str]:
+    """Names of the HLS variant streams, each is written to stream_<name>/."""
+    names = [r.name for r in options.renditions]
+    if shared_audio(options):
+        names.append("audio")
+    return names
+
+
+def rendition_speeds(
+    output_dir: Path, options: EncodeOptions, started: float
+) -> Dict[str, float]:
+    """
+    Realtime factor of every video rendition of a finished encode: the media
+    in its playlist over the wall time until ffmpeg last wrote that playlist.
+
+    Args:
+        started: Wall clock time, time.time(), the encode was started at.
+    """
+    speeds: Dict[str, float] = {}
+    for rendition in options.renditions:
+        playlist = output_dir / f"stream_{rendition.name}" / "playlist.m3u8"
+        try:
+            media = parse_media_playlist(playlist.read_text()).duration
+            wall = playlist.stat().st_mtime - started
+        except OSError:
+            continue
+        if media and wall > 0:
+            speeds[rendition.name] = round(media / wall, 3)
+    return speeds
+
+
+def segment_args(output_dir: Path, options: EncodeOptions) -> List[str]:
+    """HLS muxer options for the segment container of the output format."""
+    prefix = options.segment_prefix
+    if options.output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {options.output_format}")
+    if options.output_format == "ts":
+        template = output_dir / "stream_%v" / f"{prefix}seg_%03d.ts"
+        return ["-hls_segment_filename", str(template)]
+    single = options.output_format == "fmp4_single"
+    name = f"{prefix}data.m4s" if single else f"{prefix}seg_%03d.m4s"
+    return [
+        "-hls_segment_type",
+        "fmp4",
+        # written next to the media playlist of every variant
+        "-hls_fmp4_init_filename",
+        f"{prefix}init_%v.mp4",
+        "-hls_segment_filename",
+        str(output_dir / "stream_%v" / name),
+    ]
+
+
+def hls_flags(options: EncodeOptions) -> str:
+    # temp_file: playlists and segments appear under their name when complete
+    flags = ["independent_segments", "split_by_time", "temp_file"]
+    if options.output_format == "fmp4_single":
+        flags.append("single_file")
+    return "+".join(flags)
+
+
+def var_stream_map(options: EncodeOptions) -> str:
+    renditions = options.renditions
+    if not options.has_audio:
+        return " ".join(f"v:{i},name:{r.name}" for i, r in enumerate(renditions))
+    if not shared_audio(options):
+        return " ".join(f"v:{i},a:{i},name:{r.name}" for i, r in enumerate(renditions))
+    # one group for all variants, a quality switch keeps the audio playlist
+    audio = f"a:0,agroup:{AUDIO_GROUP},default:yes,name:audio"
+    video = [
+        f"v:{i},agroup:{AUDIO_GROUP},name:{r.name}" for i, r in enumerate(renditions)
+    ]
+    return " ".join([audio, *video])
+
+
+def build_ffmpeg_cmd(
+    output_dir: Path,
+    backend: EncoderBackend,
+    options: Optional[EncodeOptions] = None,
+    progress: bool = False,
+) -> List[str]:
+    options = options or EncodeOptions()
+    renditions = options.renditions
+    has_audio = options.has_audio
+    threads = backend.settings.ENCODER_THREADS
     out_playlist = str(output_dir / "stream_%v" / "playlist.m3u8")
+
+    labels = [f"v{r.name}" for r in renditions]
+    branches = [f"s{i}" for i in range(len(renditions))]
+    thumbnails = options.thumbnails
+    poster = thumbnails is not None and wants_poster(
+        thumbnails, options.start, options.duration
+    )
+    if thumbnails is not None:
+        # extra outputs of the one decode, no second pass over the source
+        branches.append("thumbs")
+        if poster:
+            branches.append("poster")
+    filter_graph = f"[0:v]split={len(branches)}" + "".join(f"[{b}]" for b in branches)
+    for i, (r, label) in enumerate(zip(renditions, labels)):
+        filter_graph += f";[s{i}]{backend.scale(r.width, r.height)}[{label}]"
+    if thumbnails is not None:
+        filter_graph += ";" + thumbnail_filters(
+            "thumbs",
+            "poster" if poster else None,
+            thumbnails,
+            backend.download(),
+            options.start or 0.0,
+        )
+
     cmd = [
         # input
-        "ffmpeg",
+        backend.settings.FFMPEG_BIN,
         "-y",
+        # machine readable key=value progress blocks on stdout
+        *(["-progress", "pipe:1", "-nostats"] if progress else []),
         "-fflags",
         "+genpts",
-        "-hwaccel",
-        "cuda",
-        "-hwaccel_output_format",
-        "cuda",
+        *backend.input_args(),
+        *(["-ss", f"{options.start:.3f}"] if options.start else []),
+        *(["-t", f"{options.duration:.3f}"] if options.duration else []),
         "-i",
-        "pipe:0",
+        options.source,
         # filter and scaling
         "-filter_complex",
-        "[0:v]split=3[v1][v2][v3];"
-        "[v1]scale_npp=w=640:h=360:force_original_aspect_ratio=decrease[v360];"
-        "[v2]scale_npp=w=1280:h=720:force_original_aspect_ratio=decrease[v720];"
-        "[v3]scale_npp=w=1920:h=1080:force_original_aspect_ratio=decrease[v1080]",
-        # 360p
-        "-map",
-        "[v360]",
-        "-map",
-        "a:0",
-        "-c:v:0",
-        "h264_nvenc",
-        "-b:v:0",
-        "800k",
-        "-maxrate:v:0",
-        "800k",
-        "-bufsize:v:0",
-        "1200k",
-        "-c:a:0",
-        "aac",
-        "-b:a:0",
-        "96k",
-        # 720p
-        "-map",
-        "[v720]",
-        "-map",
-        "a:0",
-        "-c:v:1",
-        "h264_nvenc",
-        "-b:v:1",
-        "2000k",
-        "-maxrate:v:1",
-        "2000k",
-        "-bufsize:v:1",
-        "3000k",
-        "-c:a:1",
-        "aac",
-        "-b:a:1",
-        "128k",
-        # 1080p
-        "-map",
-        "[v1080]",
-        "-map",
-        "a:0",
-        "-c:v:2",
-        "h264_nvenc",
-        "-b:v:2",
-        "5000k",
-        "-maxrate:v:2",
-        "5000k",
-        "-bufsize:v:2",
-        "7500k",
-        "-c:a:2",
-        "aac",
-        "-b:a:2",
-        "192k",
-        # subtitles
-        # "-map", "0:s:0?",
-        # "-c:s", "webvtt",
+        filter_graph,
+    ]
+    for i, (r, label) in enumerate(zip(renditions, labels)):
+        cmd += ["-map", f"[{label}]"]
+        cmd += backend.video_args(i, r)
+        if has_audio and not shared_audio(options):
+            cmd += ["-map", "a:0", f"-c:a:{i}", "aac", f"-b:a:{i}", r.audio_bitrate]
+    if shared_audio(options):
+        bitrate = shared_audio_bitrate(renditions)
+        cmd += ["-map", "a:0", "-c:a:0", "aac", "-b:a:0", bitrate]
+    # subtitles
+    # "-map", "0:s:0?",
+    # "-c:s", "webvtt",
+    cmd += [
         # preset
-        "-rc",
-        "vbr",
-        "-preset",
-        "p1",
-        "-tune:v",
-        "ull",
+        *backend.global_args(),
+        # 0 leaves the thread count of the encoders to ffmpeg
+        *(["-threads", str(threads)] if threads else []),
+        # keep every rendition cut at the same points
+        "-force_key_frames",
+        f"expr:gte(t,n_forced*{HLS_TIME})",
         # output
         "-f",
         "hls",
+        # chunks keep their position on the timeline of the whole video
+        *(["-output_ts_offset", f"{options.start:.3f}"] if options.start else []),
         "-hls_time",
-        "6",
+        str(HLS_TIME),
+        *(["-start_number", str(options.start_number)] if options.start_number else []),
         "-hls_playlist_type",
         "vod",
-        "-hls_segment_filename",
-        out_template,
+        *segment_args(output_dir, options),
         "-hls_flags",
-        "independent_segments+split_by_time",
+        hls_flags(options),
         "-master_pl_name",
         "master.m3u8",
         "-var_stream_map",
-        "v:0,a:0,name:360p v:1,a:1,name:720p v:2,a:2,name:1080p",
+        var_stream_map(options),
         out_playlist,
     ]
+    if thumbnails is not None:
+        cmd += thumbnail_outputs(output_dir, thumbnails, options.segment_prefix, poster)
+    return cmd
+
+
+def build_thumbnails_cmd(
+    output_dir: Path,
+    backend: EncoderBackend,
+    options: ThumbnailOptions,
+    source: str,
+    duration: float,
+    prefix: str,
+) -> List[str]:
+    """ffmpeg rendering only the sprite sheets and poster of [0, duration)."""
+    poster = wants_poster(options, 0.0, duration)
+    branches = ["thumbs", *(["poster"] if poster else [])]
+    filter_graph = (
+        f"[0:v]split={len(branches)}"
+        + "".join(f"[{b}]" for b in branches)
+        + ";"
+        + thumbnail_filters(
+            "thumbs", "poster" if poster else None, options, backend.download()
+        )
+    )
+    threads = backend.settings.ENCODER_THREADS
+    return [
+        backend.settings.FFMPEG_BIN,
+        "-y",
+        "-nostats",
+        *backend.input_args(),
+        "-t",
+        f"{duration:.3f}",
+        "-i",
+        source,
+        "-filter_complex",
+        filter_graph,
+        *(["-threads", str(threads)] if threads else []),
+        *thumbnail_outputs(output_dir, options, prefix, poster),
+    ]
+
+
+async def render_thumbnails(
+    output_dir: Path,
+    backend: EncoderBackend,
+    options: ThumbnailOptions,
+    source: str,
+    duration: float,
+    prefix: str,
+) -> int:
+    cmd = build_thumbnails_cmd(output_dir, backend, options, source, duration, prefix)
+    (output_dir / THUMBNAILS_DIR).mkdir(exist_ok=True)
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode:
+        logging.error(
+            "[ffmpeg] Thumbnails failed: %s", stderr.decode(errors="ignore")[-2000:]
+        )
+    return process.returncode or 0
+
+
+async def stream_ffmpeg(
+    input_async_iter: Optional[AsyncIterable[bytes]],
+    output_dir: Path,
+    backend: EncoderBackend,
+    options: Optional[EncodeOptions] = None,
+    on_progress: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> int:
+    cmd = build_ffmpeg_cmd(output_dir, backend, options, on_progress is not None)
+    if options is not None and options.thumbnails is not None:
+        # the image2 muxer does not create directories
+        (output_dir / THUMBNAILS_DIR).mkdir(exist_ok=True)
     process = await asyncio.create_subprocess_exec(
-        *cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0
+        *cmd,
+        stdin=subprocess.DEVNULL if input_async_iter is None else subprocess.PIPE,
+        stdout=None if on_progress is None else subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=0,
     )
 
     async def feed_stdin() -> None:
+        if input_async_iter is None:
+            return
         if process.stdin is None:
             logging.error("ffmpeg stdin is None")
             return
@@ -138,8 +340,13 @@ async def stream_ffmpeg(
             async for chunk in input_async_iter:
                 process.stdin.write(chunk)
                 await process.stdin.drain()
-        except Exception as e:
+        except (BrokenPipeError, ConnectionResetError) as e:
+            # ffmpeg stopped reading, its exit code tells why
             logging.error(f"Error feeding ffmpeg stdin: {e}")
+        except Exception:
+            # the source broke off: ffmpeg must not finish a truncated encode
+            process.kill()
+            raise
         finally:
             if not process.stdin.is_closing():
                 process.stdin.close()
@@ -155,7 +362,16 @@ async def stream_ffmpeg(
                 break
             logging.debug("[ffmpeg stderr] %s", chunk.decode(errors="ignore").strip())
 
-    await asyncio.gather(feed_stdin(), log_stderr())
+    async def read_progress() -> None:
+        if on_progress is None or process.stdout is None:
+            return
+        async for line in process.stdout:
+            try:
+                await on_progress(line.decode(errors="ignore"))
+            except Exception as e:
+                logging.warning(f"Failed to report ffmpeg progress: {e}")
+
+    await asyncio.gather(feed_stdin(), log_stderr(), read_progress())
 
     rc = await process.wait()
     return rc
@@ -0,0 +1,145 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+registry = CollectorRegistry()
+
+JOB_DURATION_HIST = Histogram(
+    "convertor_job_duration_seconds",
+    "Wall time of a convertor job",
+    ["kind", "result"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200),
+    registry=registry,
+)
+
+JOB_STAGE_DURATION_HIST = Histogram(
+    "convertor_job_stage_duration_seconds",
+    "Wall time of one stage of a convertor job",
+    ["stage"],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1200, 3600),
+    registry=registry,
+)
+
+JOBS_IN_PROGRESS = Gauge(
+    "convertor_jobs_in_progress",
+    "Number of jobs this worker is running",
+    ["kind"],
+    registry=registry,
+)
+
+QUEUE_WAIT_HIST = Histogram(
+    "convertor_queue_wait_seconds",
+    "Time a message spent in RabbitMQ before a worker picked it up",
+    ["queue"],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 1800, 3600),
+    registry=registry,
+)
+
+BYTES_TOTAL = Counter(
+    "convertor_bytes",
+    "Bytes moved between the worker and S3",
+    ["direction"],
+    registry=registry,
+)
+
+ENCODE_SPEED_HIST = Histogram(
+    "convertor_encode_realtime_factor",
+    "Seconds of media of one rendition per wall clock second until it was done",
+    ["backend", "rendition"],
+    buckets=(0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 20),
+    registry=registry,
+)
+
+FFMPEG_EXIT_TOTAL = Counter(
+    "convertor_ffmpeg_exit",
+    "ffmpeg runs by exit code",
+    ["code"],
+    registry=registry,
+)
+
+S3_REQUEST_DURATION_HIST = Histogram(
+    "convertor_s3_request_duration_seconds",
+    "Latency of S3 requests up to the response headers",
+    ["operation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    registry=registry,
+)
+
+S3_ERRORS_TOTAL = Counter(
+    "convertor_s3_errors",
+    "Failed S3 requests",
+    ["operation", "code"],
+    registry=registry,
+)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    JOB_STAGE_DURATION_HIST.labels(stage=stage).observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+class JobTracker:
+    """
+    Count a job as in progress from creation until ``finish``, then record its
+    duration under ``result``.
+    """
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self.result = "ok"
+        self._start = time.perf_counter()
+        JOBS_IN_PROGRESS.labels(kind=kind).inc()
+
+    def finish(self) -> None:
+        JOBS_IN_PROGRESS.labels(kind=self.kind).dec()
+        JOB_DURATION_HIST.labels(kind=self.kind, result=self.result).observe(
+            time.perf_counter() - self._start
+        )
+
+
+# ---------- botocore event hooks timing every S3 request ----------
+def _before_s3_call(model: Any, context: Dict[str, Any], **_: Any) -> None:
+    context["metrics_operation"] = model.name
+    context["metrics_start"] = time.perf_counter()
+
+
+def _observe(context: Dict[str, Any], code: Optional[str]) -> None:
+    operation = context.get("metrics_operation", "unknown")
+    start = context.get("metrics_start")
+    if start is not None:
+        S3_REQUEST_DURATION_HIST.labels(operation=operation).observe(
+            time.perf_counter() - start
+        )
+    if code is not None:
+        S3_ERRORS_TOTAL.labels(operation=operation, code=code).inc()
+
+
+def _after_s3_call(
+    http_response: Any, parsed: Dict[str, Any], context: Dict[str, Any], **_: Any
+) -> None:
+    code = None
+    if http_response.status_code >= 300:
+        code = parsed.get("Error", {}).get("Code") or str(http_response.status_code)
+    _observe(context, code)
+
+
+def _after_s3_call_error(
+    exception: Exception, context: Dict[str, Any], **_: Any
+) -> None:
+    _observe(context, type(exception).__name__)
+
+
+def instrument_s3_client(client: Any) -> None:
+    client.meta.events.register("before-call.s3", _before_s3_call)
+    client.meta.events.register("after-call.s3", _after_s3_call)
+    client.meta.events.register("after-call-error.s3", _after_s3_call_error)
@@ -0,0 +1,99 @@
+from dataclasses import dataclass, field
+from typing import List, Sequence
+
+HEADER_TAGS = (
+    "#EXTM3U",
+    "#EXT-X-VERSION",
+    "#EXT-X-TARGETDURATION",
+    "#EXT-X-MEDIA-SEQUENCE",
+    "#EXT-X-PLAYLIST-TYPE",
+    "#EXT-X-INDEPENDENT-SEGMENTS",
+)
+
+
+@dataclass
+class Segment:
+    uri: str
+    # per-segment tags in order: EXTINF, EXT-X-BYTERANGE, EXT-X-MAP, ...
+    tags: List[str] = field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        for tag in self.tags:
+            if tag.startswith("#EXTINF:"):
+                return float(tag[len("#EXTINF:") :].split(",")[0])
+        return 0.0
+
+
+@dataclass
+class MediaPlaylist:
+    header: List[str] = field(default_factory=list)
+    segments: List[Segment] = field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return sum(segment.duration for segment in self.segments)
+
+    @property
+    def target_duration(self) -> int:
+        for tag in self.header:
+            if tag.startswith("#EXT-X-TARGETDURATION:"):
+                return int(tag.split(":", 1)[1])
+        return 0
+
+    def render(self) -> str:
+        lines = list(self.header)
+        current_map = None
+        for segment in self.segments:
+            for tag in segment.tags:
+                if tag.startswith("#EXT-X-MAP:"):
+                    # a map applies until the next one, repeat it only on change
+                    if tag == current_map:
+                        continue
+                    current_map = tag
+                lines.append(tag)
+            lines.append(segment.uri)
+        lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+
+def parse_media_playlist(text: str) -> MediaPlaylist:
+    playlist = MediaPlaylist()
+    pending: List[str] = []
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line or line == "#EXT-X-ENDLIST":
+            continue
+        if not line.startswith("#"):
+            playlist.segments.append(Segment(uri=line, tags=pending))
+            pending = []
+        elif line.startswith(HEADER_TAGS) and not playlist.segments and not pending:
+            playlist.header.append(line)
+        else:
+            pending.append(line)
+    return playlist
+
+
+def stitch_media_playlists(playlists: Sequence[MediaPlaylist]) -> MediaPlaylist:
+    """
+    Concatenate the media playlists of consecutive chunks into one VOD playlist.
+
+    The header comes from the first chunk with the target duration raised to
+    the longest segment of all chunks.
+    """
+    if not playlists:
+        raise ValueError("Nothing to stitch")
+    segments = [segment for playlist in playlists for segment in playlist.segments]
+    target = max(
+        [p.target_duration for p in playlists]
+        + [int(s.duration + 0.5) for s in segments]
+    )
+    header = [
+        (
+            f"#EXT-X-TARGETDURATION:{target}"
+            if tag.startswith("#EXT-X-TARGETDURATION:")
+            else tag
+        )
+        for tag in playlists[0].header
+    ]
+    return MediaPlaylist(header=header, segments=segments)
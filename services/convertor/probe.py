@@ -0,0 +1,94 @@
+import asyncio
+import json
+import logging
+import subprocess
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+@dataclass(frozen=True)
+class SourceInfo:
+    width: int
+    height: int
+    fps: float
+    # bits per second, when the container or stream reports it
+    bitrate: Optional[int]
+    duration: Optional[float]
+    has_audio: bool
+
+
+def _parse_rate(rate: Optional[str]) -> float:
+    if not rate or rate == "0/0":
+        return 0.0
+    num, _, den = rate.partition("/")
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _rotation(stream: Dict[str, Any]) -> int:
+    for side_data in stream.get("side_data_list", []):
+        if "rotation" in side_data:
+            return int(side_data["rotation"])
+    return int(stream.get("tags", {}).get("rotate", 0))
+
+
+def _int_or_none(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_probe(data: Dict[str, Any]) -> SourceInfo:
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if video is None:
+        raise ValueError("Source has no video stream")
+    fmt = data.get("format", {})
+
+    width, height = int(video["width"]), int(video["height"])
+    # ffmpeg autorotates, so a rotated phone clip is encoded as portrait
+    if abs(_rotation(video)) % 180 == 90:
+        width, height = height, width
+
+    duration = fmt.get("duration") or video.get("duration")
+    return SourceInfo(
+        width=width,
+        height=height,
+        fps=_parse_rate(video.get("avg_frame_rate"))
+        or _parse_rate(video.get("r_frame_rate")),
+        bitrate=_int_or_none(video.get("bit_rate"))
+        or _int_or_none(fmt.get("bit_rate")),
+        duration=float(duration) if duration else None,
+        has_audio=any(s.get("codec_type") == "audio" for s in streams),
+    )
+
+
+async def probe_source(ffprobe_bin: str, url: str) -> SourceInfo:
+    """
+    Read resolution, frame rate, bitrate, duration and audio presence.
+
+    ``url`` is usually a presigned S3 URL, so ffprobe only fetches the byte
+    ranges it needs to read the container headers.
+    """
+    process = await asyncio.create_subprocess_exec(
+        ffprobe_bin,
+        "-v",
+        "error",
+        "-print_format",
+        "json",
+        "-show_format",
+        "-show_streams",
+        url,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    out, err = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffprobe failed: {err.decode(errors='ignore').strip()}")
+    info = parse_probe(json.loads(out))
+    logging.debug("[ffprobe] %s", info)
+    return info
@@ -0,0 +1,136 @@
+import time
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, Optional
+
+
+@dataclass(frozen=True)
+class EncodeProgress:
+    frame: int
+    fps: float
+    # encoded seconds per wall clock second
+    speed: float
+    out_time: float
+    percent: Optional[float] = None
+    done: bool = False
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _number(value: Optional[str]) -> float:
+    try:
+        return float((value or "").rstrip("x"))
+    except ValueError:
+        return 0.0
+
+
+class ProgressParser:
+    """
+    Turn the key=value lines ffmpeg writes with -progress into snapshots.
+
+    ffmpeg ends every block with a progress=continue or progress=end line,
+    that line completes a snapshot.
+
+    Args:
+        duration: Seconds of source being encoded, for the percent done.
+        start: Position of the encoded range in the source.
+        shifted: ffmpeg was run with -output_ts_offset start, its output
+            times count from start instead of 0.
+        fps: Frame rate of the source. ffmpeg reports the time of its most
+            lagging output, sparse ones like sprite sheets or a poster hold
+            it back, so the frame count of the renditions is used instead
+            when it is ahead.
+    """
+
+    def __init__(
+        self,
+        duration: Optional[float] = None,
+        start: float = 0.0,
+        fps: Optional[float] = None,
+        shifted: bool = False,
+    ) -> None:
+        self.duration = duration
+        self.start = start
+        self.fps = fps
+        self.shifted = shifted
+        self._fields: Dict[str, str] = {}
+        self._started = time.monotonic()
+
+    def _percent(self, encoded: float) -> Optional[float]:
+        if not self.duration:
+            return None
+        return round(min(100.0, max(0.0, encoded * 100 / self.duration)), 1)
+
+    def feed(self, line: str) -> Optional[EncodeProgress]:
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return None
+        if key != "progress":
+            self._fields[key] = value.strip()
+            return None
+
+        fields, self._fields = self._fields, {}
+        # out_time_ms is in microseconds as well, kept for older builds
+        out_us = fields.get("out_time_us") or fields.get("out_time_ms")
+        out_time = _number(out_us) / 1_000_000
+        # seconds of the range encoded so far
+        encoded = max(0.0, out_time - self.start if self.shifted else out_time)
+        frame = int(_number(fields.get("frame")))
+        speed = _number(fields.get("speed"))
+        if self.fps and frame / self.fps > encoded:
+            encoded = frame / self.fps
+            elapsed = time.monotonic() - self._started
+            speed = round(encoded / elapsed, 3) if elapsed > 0 else 0.0
+        return EncodeProgress(
+            frame=frame,
+            fps=_number(fields.get("fps")),
+            speed=speed,
+            out_time=round(self.start + encoded, 3),
+            percent=self._percent(encoded),
+            done=value.strip() == "end",
+        )
+
+
+class Throttle:
+    """Let an event through at most once per interval seconds."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._last: Optional[float] = None
+
+    def ready(self) -> bool:
+        now = time.monotonic()
+        if self._last is not None and now - self._last < self.interval:
+            return False
+        self._last = now
+        return True
+
+
+class ProgressReporter:
+    """
+    Line sink for stream_ffmpeg that publishes throttled progress snapshots.
+
+    The final snapshot of an encode is always published.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[EncodeProgress], Awaitable[None]],
+        interval: float,
+        duration: Optional[float] = None,
+        start: float = 0.0,
+        fps: Optional[float] = None,
+        shifted: bool = False,
+    ) -> None:
+        self.publish = publish
+        self.parser = ProgressParser(duration, start, fps, shifted)
+        self.throttle = Throttle(interval)
+        self.last: Optional[EncodeProgress] = None
+
+    async def __call__(self, line: str) -> None:
+        snapshot = self.parser.feed(line)
+        if snapshot is None:
+            return
+        self.last = snapshot
+        if snapshot.done or self.throttle.ready():
+            await self.publish(snapshot)
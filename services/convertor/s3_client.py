@@ -1,15 +1,170 @@
+import asyncio
 import logging
-from contextlib import asynccontextmanager
-from pathlib import Path
-from typing import AsyncGenerator, BinaryIO, Dict
+import mimetypes
+import random
+import time
+from collections import deque
+from contextlib import AsyncExitStack, aclosing, asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 
+from aiobotocore.config import AioConfig
 from aiobotocore.session import AioBaseClient, get_session
-from botocore.exceptions import ClientError
+from botocore.exceptions import ClientError, HTTPClientError
+from botocore.exceptions import ConnectionError as BotoConnectionError
 
 from config import get_s3_settings
+from metrics import instrument_s3_client
 
 settings = get_s3_settings()
 PART_SIZE = 1024 * 1024 * 10
+MAX_PARTS = 10000
+MIB = 1024 * 1024
+READ_SIZE = 256 * 1024
+# S3 and MinIO error codes worth another attempt, any other error is final
+RETRYABLE_CODES = frozenset(
+    {
+        "InternalError",
+        "ServiceUnavailable",
+        "SlowDown",
+        "RequestTimeout",
+        "RequestTimeTooSkewed",
+        "Throttling",
+        "ThrottlingException",
+        "RequestLimitExceeded",
+        "XMinioServerNotInitialized",
+    }
+)
+
+T = TypeVar("T")
+
+
+CONTENT_TYPES: Dict[str, str] = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+    ".vtt": "text/vtt",
+}
+
+
+def guess_content_type(filename: str) -> str:
+    suffix = PurePosixPath(filename).suffix.lower()
+    if suffix in CONTENT_TYPES:
+        return CONTENT_TYPES[suffix]
+    content_type, _ = mimetypes.guess_type(filename)
+    return content_type or "application/octet-stream"
+
+
+def choose_part_size(size: Optional[int], part_size: int = PART_SIZE) -> int:
+    """
+    Grow the part size for very large objects so they still fit in the
+    10000 parts S3 allows for a multipart upload.
+    """
+    if size is None or size <= part_size * MAX_PARTS:
+        return part_size
+    needed = -(-size // MAX_PARTS)
+    return -(-needed // MIB) * MIB
+
+
+def remaining_size(file_obj: BinaryIO) -> Optional[int]:
+    try:
+        if not file_obj.seekable():
+            return None
+        position = file_obj.tell()
+        size = file_obj.seek(0, 2)
+        file_obj.seek(position)
+        return size - position
+    except (AttributeError, OSError):
+        return None
+
+
+async def read_chunks(file_obj: BinaryIO, chunk_size: int) -> AsyncIterator[bytes]:
+    """Read a blocking file object in a worker thread, one chunk at a time."""
+    while True:
+        chunk = await asyncio.to_thread(file_obj.read, chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Throttling, 5xx answers and broken connections, not missing keys or auth."""
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code", "")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return code in RETRYABLE_CODES or status == 429 or status >= 500
+    return isinstance(
+        error, (BotoConnectionError, HTTPClientError, asyncio.TimeoutError)
+    )
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    # attempts of one operation, the first one included
+    attempts: int = 5
+    base_delay: float = 0.2
+    max_delay: float = 10.0
+
+    def delay(self, retry: int) -> float:
+        # full jitter, workers hit by the same outage do not retry in step
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+
+@dataclass
+class DownloadStats:
+    bytes: int = 0
+    requests: int = 0
+    seconds: float = 0.0
+    # time the consumer spent waiting on S3 instead of receiving data
+    stall_seconds: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.bytes / 1024 / 1024:.1f} MiB in {self.requests} requests, "
+            f"{self.seconds:.2f}s total, {self.stall_seconds:.2f}s stalled"
+        )
+
+
+@dataclass
+class UploadReport:
+    files: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    failed: List[str] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        """Uploaded bytes per second of wall time."""
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def merge(self, other: "UploadReport") -> None:
+        self.files += other.files
+        self.bytes += other.bytes
+        self.seconds += other.seconds
+        self.failed.extend(other.failed)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.files} files, {self.bytes / 1024 / 1024:.1f} MiB "
+            f"in {self.seconds:.2f}s ({self.throughput / 1024 / 1024:.1f} MiB/s), "
+            f"{len(self.failed)} failed"
+        )
 
 
 class S3Client:
@@ -20,6 +175,13 @@ class S3Client:
         endpoint_url: str,
         bucket_name: str,
         region_name: str,
+        upload_concurrency: int = 8,
+        part_size: int = PART_SIZE,
+        max_parts_in_flight: int = 4,
+        download_prefetch: int = 4,
+        max_pool_connections: int = 10,
+        keepalive_timeout: float = 60,
+        retry: Optional[RetryPolicy] = None,
     ):
         self.config: Dict[str, str] = {
             "aws_access_key_id": access_key,
@@ -28,100 +190,501 @@ class S3Client:
             "region_name": region_name,
         }
         self.bucket_name = bucket_name
+        self.upload_concurrency = upload_concurrency
+        self.part_size = part_size
+        self.upload_memory_budget = part_size * max_parts_in_flight
+        self.download_prefetch = download_prefetch
+        self.retry = retry or RetryPolicy()
         self.session = get_session()
+        self.client_config = AioConfig(
+            max_pool_connections=max_pool_connections,
+            tcp_keepalive=True,
+            connector_args={"keepalive_timeout": keepalive_timeout},
+            # retries are ours, botocore's own would multiply them
+            retries={"total_max_attempts": 1},
+        )
+        self._client: Optional[AioBaseClient] = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+
+    async def start(self) -> None:
+        """
+        Open the long-lived client and its connection pool.
+
+        Until it is called (and after close) every operation falls back to a
+        short-lived client of its own.
+        """
+        if self._client is not None:
+            return
+        self._exit_stack = AsyncExitStack()
+        self._client = await self._exit_stack.enter_async_context(
+            self.session.create_client("s3", config=self.client_config, **self.config)
+        )
+        instrument_s3_client(self._client)
+        logging.info(f"S3 client for {self.bucket_name} started")
+
+    async def close(self) -> None:
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+        self._client = None
+        self._exit_stack = None
+        logging.info(f"S3 client for {self.bucket_name} closed")
 
     @asynccontextmanager
     async def _get_client(self) -> AsyncGenerator[AioBaseClient, None]:
         """
-        Async context manager to create and yield an S3 client.
+        Async context manager to yield an S3 client.
 
-        This method initializes an S3 client using the session and configuration
-        provided in the class instance and ensures proper cleanup after usage.
+        Yields the shared pooled client opened by ``start``; if it has not been
+        started, a client is created for this call only and closed afterwards.
 
         Yields:
             aiobotocore.client.AioBaseClient: An asynchronous S3 client instance.
         """
-        async with self.session.create_client("s3", **self.config) as client:
+        if self._client is not None:
+            yield self._client
+            return
+        async with self.session.create_client(
+            "s3", config=self.client_config, **self.config
+        ) as client:
+            instrument_s3_client(client)
             yield client
 
-    async def upload_file(self, filename: str, file_obj: BinaryIO) -> None:
-        try:
-            async with self._get_client() as client:
-                resp = await client.create_multipart_upload(
-                    Bucket=self.bucket_name, Key=filename
+    async def _retry(self, operation: Callable[[], Awaitable[T]], what: str) -> T:
+        """
+        Run one S3 call, again after a jittered backoff while it fails with a
+        retryable error and attempts are left.
+
+        Raises:
+            Exception: The last error, or the first one that is not retryable.
+        """
+        retry = 0
+        while True:
+            try:
+                return await operation()
+            except Exception as e:
+                retry += 1
+                if retry >= self.retry.attempts or not is_retryable(e):
+                    raise
+                delay = self.retry.delay(retry)
+                logging.warning(
+                    f"{what} failed ({e}), "
+                    f"retry {retry}/{self.retry.attempts - 1} in {delay:.2f}s"
                 )
-                upload_id = resp["UploadId"]
-                parts = []
-                part_number = 1
-
-                while True:
-                    chunk = file_obj.read(PART_SIZE)
-                    if not chunk:
-                        break
-                    part_resp = await client.upload_part(
+                await asyncio.sleep(delay)
+
+    async def _upload_fileobj(
+        self, client: AioBaseClient, filename: str, file_obj: BinaryIO
+    ) -> None:
+        part_size = choose_part_size(remaining_size(file_obj), self.part_size)
+        await self._upload_chunks(
+            client, filename, read_chunks(file_obj, part_size), part_size
+        )
+
+    async def _upload_chunks(
+        self,
+        client: AioBaseClient,
+        filename: str,
+        chunks: AsyncIterator[bytes],
+        part_size: int,
+    ) -> None:
+        """
+        Upload an object from a stream of equally sized chunks.
+
+        An object that fits in one chunk is sent with a single PUT. Larger
+        objects go through a multipart upload with several parts in flight,
+        holding at most ``upload_memory_budget`` bytes (never less than two
+        parts) in memory. Every part is retried on its own; a part that still
+        fails aborts the whole multipart upload.
+        """
+        content_type = guess_content_type(filename)
+        semaphore = asyncio.Semaphore(max(2, self.upload_memory_budget // part_size))
+        tasks: List[asyncio.Task] = []
+        upload_id = None
+
+        async def next_chunk() -> bytes:
+            await semaphore.acquire()
+            chunk = await anext(chunks, b"")
+            if not chunk:
+                semaphore.release()
+            return chunk
+
+        async def send_part(part_number: int, body: bytes) -> Dict[str, Any]:
+            try:
+                resp = await self._retry(
+                    lambda: client.upload_part(
                         Bucket=self.bucket_name,
                         Key=filename,
                         PartNumber=part_number,
                         UploadId=upload_id,
-                        Body=chunk,
-                    )
-                    parts.append({"ETag": part_resp["ETag"], "PartNumber": part_number})
-                    part_number += 1
+                        Body=body,
+                    ),
+                    f"Upload of part {part_number} of {filename}",
+                )
+                return {"ETag": resp["ETag"], "PartNumber": part_number}
+            finally:
+                semaphore.release()
+
+        first = await next_chunk()
+        second = await next_chunk()
+        if not second:
+            # fits in a single part: one PUT instead of three round trips
+            await self._retry(
+                lambda: client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=filename,
+                    Body=first,
+                    ContentType=content_type,
+                ),
+                f"Upload of {filename}",
+            )
+            logging.info(f"File {filename} uploaded to {self.bucket_name}")
+            return
 
-                await client.complete_multipart_upload(
+        try:
+            resp = await self._retry(
+                lambda: client.create_multipart_upload(
+                    Bucket=self.bucket_name, Key=filename, ContentType=content_type
+                ),
+                f"Start of the upload of {filename}",
+            )
+            upload_id = resp["UploadId"]
+            tasks.append(asyncio.create_task(send_part(1, first)))
+            tasks.append(asyncio.create_task(send_part(2, second)))
+
+            while chunk := await next_chunk():
+                for task in tasks:
+                    error = task.exception() if task.done() else None
+                    if error is not None:
+                        raise error
+                tasks.append(asyncio.create_task(send_part(len(tasks) + 1, chunk)))
+
+            parts = await asyncio.gather(*tasks)
+            await self._retry(
+                lambda: client.complete_multipart_upload(
                     Bucket=self.bucket_name,
                     Key=filename,
                     UploadId=upload_id,
-                    MultipartUpload={"Parts": parts},
+                    MultipartUpload={"Parts": list(parts)},
+                ),
+                f"Completion of the upload of {filename}",
+            )
+            logging.info(
+                f"File {filename} uploaded to {self.bucket_name} "
+                f"in {len(parts)} parts of {part_size} bytes"
+            )
+        except Exception:
+            if upload_id is not None:
+                try:
+                    await client.abort_multipart_upload(
+                        Bucket=self.bucket_name, Key=filename, UploadId=upload_id
+                    )
+                except ClientError as e:
+                    logging.error(f"Error aborting upload of {filename}: {e}")
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def upload_file(self, filename: str, file_obj: BinaryIO) -> None:
+        async with self._get_client() as client:
+            await self._upload_fileobj(client, filename, file_obj)
+
+    async def upload_paths(self, items: Sequence[Tuple[str, Path]]) -> UploadReport:
+        """
+        Upload many local files over a single client with bounded concurrency.
+
+        Args:
+            items: Pairs of (object key, local path).
+
+        Returns:
+            UploadReport: Files and bytes uploaded, wall time and failed keys.
+        """
+        report = UploadReport()
+        if not items:
+            return report
+        semaphore = asyncio.Semaphore(self.upload_concurrency)
+        start = time.perf_counter()
+
+        async def upload_one(client: AioBaseClient, key: str, path: Path) -> None:
+            async with semaphore:
+                try:
+                    with path.open("rb") as file_obj:
+                        await self._upload_fileobj(client, key, file_obj)
+                except (ClientError, OSError) as e:
+                    logging.error(f"Error uploading file {key}: {e}")
+                    report.failed.append(key)
+                    return
+                report.files += 1
+                report.bytes += path.stat().st_size
+
+        async with self._get_client() as client:
+            await asyncio.gather(*(upload_one(client, k, p) for k, p in items))
+        report.seconds = time.perf_counter() - start
+        return report
+
+    async def upload_dir(self, dirname: str, directory: Path) -> UploadReport:
+        """
+        Raises:
+            RuntimeError: Some files could not be uploaded, even after retries.
+        """
+        items = [
+            (f"{dirname}/{p.relative_to(directory).as_posix()}", p)
+            for p in sorted(Path(directory).rglob("*"))
+            if p.is_file()
+        ]
+        report = await self.upload_paths(items)
+        if report.failed:
+            raise RuntimeError(f"Dir {dirname} partly uploaded: {report}")
+        logging.info(f"Dir {dirname} uploaded: {report}")
+        return report
+
+    async def put_bytes(self, object_name: str, data: bytes) -> None:
+        async with self._get_client() as client:
+            await self._retry(
+                lambda: client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=object_name,
+                    Body=data,
+                    ContentType=guess_content_type(object_name),
+                ),
+                f"Upload of {object_name}",
+            )
+
+    async def put_if_absent(self, object_name: str, data: bytes) -> bool:
+        """
+        Create an object only if the key is free; False if it already exists.
+
+        A retried PUT may find the object an earlier attempt created before its
+        response was lost. The object is then ours if it holds ``data``, so
+        callers racing for a key should each put distinct bytes.
+        """
+        attempts = 0
+
+        async def put() -> None:
+            nonlocal attempts
+            attempts += 1
+            await client.put_object(
+                Bucket=self.bucket_name, Key=object_name, Body=data, IfNoneMatch="*"
+            )
+
+        async with self._get_client() as client:
+            try:
+                await self._retry(put, f"Conditional upload of {object_name}")
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "PreconditionFailed":
+                    raise
+                if attempts == 1:
+                    return False
+                return await self.read_object(object_name) == data
+        return True
+
+    async def exists(self, object_name: str) -> bool:
+        async with self._get_client() as client:
+            try:
+                await self._retry(
+                    lambda: client.head_object(
+                        Bucket=self.bucket_name, Key=object_name
+                    ),
+                    f"HEAD of {object_name}",
                 )
-                logging.info(f"File {filename} uploaded to {self.bucket_name}")
-        except ClientError as e:
-            await client.abort_multipart_upload(
-                Bucket=self.bucket_name, Key=filename, UploadId=upload_id
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                    return False
+                raise
+        return True
+
+    async def read_object(self, object_name: str) -> bytes:
+        async def read() -> bytes:
+            resp = await client.get_object(Bucket=self.bucket_name, Key=object_name)
+            async with resp["Body"] as body:
+                return await body.read()
+
+        async with self._get_client() as client:
+            return await self._retry(read, f"Read of {object_name}")
+
+    async def copy_object(self, source_name: str, object_name: str) -> None:
+        async with self._get_client() as client:
+            await self._retry(
+                lambda: client.copy_object(
+                    Bucket=self.bucket_name,
+                    Key=object_name,
+                    CopySource={"Bucket": self.bucket_name, "Key": source_name},
+                ),
+                f"Copy of {source_name} to {object_name}",
             )
-            logging.error(f"Error uploading file: {e}")
 
-    async def upload_dir(self, dirname: str, directory: Path) -> None:
-        try:
-            for p in Path(directory).rglob("*"):
-                if p.is_file():
-                    await self.upload_file(
-                        str(dirname / p.relative_to(directory)), p.open("rb")
+    async def list_keys(self, prefix: str) -> List[str]:
+        async def list_all() -> List[str]:
+            keys: List[str] = []
+            paginator = client.get_paginator("list_objects_v2")
+            async for page in paginator.paginate(
+                Bucket=self.bucket_name, Prefix=prefix
+            ):
+                keys.extend(obj["Key"] for obj in page.get("Contents", []))
+            return keys
+
+        async with self._get_client() as client:
+            return await self._retry(list_all, f"Listing of {prefix}")
+
+    async def delete_prefix(self, prefix: str) -> None:
+        keys = await self.list_keys(prefix)
+        async with self._get_client() as client:
+            # DeleteObjects accepts at most 1000 keys per call
+            for i in range(0, len(keys), 1000):
+                batch = keys[i : i + 1000]
+                resp = await self._retry(
+                    lambda: client.delete_objects(
+                        Bucket=self.bucket_name,
+                        Delete={"Objects": [{"Key": k} for k in batch]},
+                    ),
+                    f"Deletion of {len(batch)} objects under {prefix}",
+                )
+                # a 200 can still carry per-key failures
+                if resp.get("Errors"):
+                    raise RuntimeError(
+                        f"Failed to delete {len(resp['Errors'])} objects under "
+                        f"{prefix}: {resp['Errors'][0]}"
                     )
-        except ClientError as e:
-            logging.error(f"Error uploading dir: {e}")
+        logging.info(f"Deleted {len(keys)} objects under {prefix}")
+
+    async def presigned_url(self, object_name: str, expires_in: int = 3600) -> str:
+        """Presigned GET URL, used to let ffmpeg/ffprobe read the source directly."""
+        async with self._get_client() as client:
+            return await client.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": self.bucket_name, "Key": object_name},
+                ExpiresIn=expires_in,
+            )
 
     async def delete_file(self, object_name: str) -> None:
-        try:
-            async with self._get_client() as client:
-                await client.delete_object(Bucket=self.bucket_name, Key=object_name)
-                logging.info(f"File {object_name} deleted from {self.bucket_name}")
-        except ClientError as e:
-            logging.error(f"Error deleting file: {e}")
+        async with self._get_client() as client:
+            await self._retry(
+                lambda: client.delete_object(Bucket=self.bucket_name, Key=object_name),
+                f"Deletion of {object_name}",
+            )
+            logging.info(f"File {object_name} deleted from {self.bucket_name}")
+
+    async def _get_range(
+        self, client: AioBaseClient, object_name: str, start: int, end: int
+    ) -> Dict[str, Any]:
+        return await self._retry(
+            lambda: client.get_object(
+                Bucket=self.bucket_name, Key=object_name, Range=f"bytes={start}-{end}"
+            ),
+            f"GET of {object_name} bytes={start}-{end}",
+        )
+
+    async def _stream_range(
+        self,
+        client: AioBaseClient,
+        object_name: str,
+        start: int,
+        end: int,
+        resp: Dict[str, Any],
+        stats: DownloadStats,
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Yield the body of one ranged GET. A connection lost mid-body is picked
+        up with a new GET from the first byte not received yet.
+        """
+        retry = 0
+        while True:
+            try:
+                async with resp["Body"] as body:
+                    while True:
+                        waited = time.perf_counter()
+                        piece = await body.read(READ_SIZE)
+                        stats.stall_seconds += time.perf_counter() - waited
+                        if not piece:
+                            return
+                        start += len(piece)
+                        stats.bytes += len(piece)
+                        yield piece
+            except Exception as e:
+                retry += 1
+                if retry >= self.retry.attempts or not is_retryable(e):
+                    raise
+                if start > end:
+                    return
+                logging.warning(
+                    f"Download of {object_name} broke at byte {start} ({e}), resuming"
+                )
+                await asyncio.sleep(self.retry.delay(retry))
+                waited = time.perf_counter()
+                resp = await self._get_range(client, object_name, start, end)
+                stats.stall_seconds += time.perf_counter() - waited
+                stats.requests += 1
 
     async def download_file(
-        self, object_name: str, chunk_size: int
+        self,
+        object_name: str,
+        chunk_size: int,
+        stats: Optional[DownloadStats] = None,
     ) -> AsyncGenerator[bytes, None]:
+        """
+        Stream an object as a sequence of ranged GETs.
+
+        Up to ``download_prefetch`` ranges are requested ahead of the consumer
+        and yielded strictly in order. Each range body is streamed in
+        ``READ_SIZE`` pieces instead of being buffered whole, and failed
+        requests are retried from where they stopped.
+
+        Args:
+            object_name: Key of the object to download.
+            chunk_size: Size of every ranged GET.
+            stats: Optional DownloadStats filled in while streaming.
+
+        Raises:
+            ClientError: The object is missing, or S3 kept failing. The consumer
+                never mistakes a truncated stream for the whole object.
+        """
+        stats = stats if stats is not None else DownloadStats()
+        started = time.perf_counter()
+        pending: Deque[Tuple[int, int, asyncio.Task]] = deque()
         try:
             async with self._get_client() as client:
-                head = await client.head_object(
-                    Bucket=self.bucket_name, Key=object_name
+                head = await self._retry(
+                    lambda: client.head_object(
+                        Bucket=self.bucket_name, Key=object_name
+                    ),
+                    f"HEAD of {object_name}",
                 )
                 size = head["ContentLength"]
+                ranges = deque(
+                    (start, min(start + chunk_size, size) - 1)
+                    for start in range(0, size, chunk_size)
+                )
 
-                for start in range(0, size, chunk_size):
-                    end = min(start + chunk_size - 1, size - 1)
-                    resp = await client.get_object(
-                        Bucket=self.bucket_name,
-                        Key=object_name,
-                        Range=f"bytes={start}-{end}",
-                    )
-                    yield await resp["Body"].read()
+                while ranges or pending:
+                    while ranges and len(pending) < self.download_prefetch:
+                        start, end = ranges.popleft()
+                        task = asyncio.create_task(
+                            self._get_range(client, object_name, start, end)
+                        )
+                        pending.append((start, end, task))
+                        stats.requests += 1
+
+                    start, end, task = pending.popleft()
+                    waited = time.perf_counter()
+                    resp = await task
+                    stats.stall_seconds += time.perf_counter() - waited
+                    # a consumer that stops early closes the body it was reading
+                    async with aclosing(
+                        self._stream_range(client, object_name, start, end, resp, stats)
+                    ) as body:
+                        async for piece in body:
+                            yield piece
                 logging.info(
                     f"File {object_name} downloaded with chunk size {chunk_size}"
                 )
-        except ClientError as e:
-            logging.error(f"Error downloading file: {e}")
+        finally:
+            for _, _, task in pending:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    # fetched ahead but never read, free its connection now
+                    task.result()["Body"].close()
+            stats.seconds = time.perf_counter() - started
 
 
 s3_client = S3Client(
@@ -130,4 +693,15 @@ s3_client = S3Client(
     settings.MINIO_ENDPOINT_URL,
     settings.MINIO_BUCKET_NAME,
     settings.MINIO_REGION_NAME,
+    settings.S3_UPLOAD_CONCURRENCY,
+    settings.S3_PART_SIZE,
+    settings.S3_MAX_PARTS_IN_FLIGHT,
+    settings.S3_DOWNLOAD_PREFETCH,
+    settings.S3_MAX_POOL_CONNECTIONS,
+    settings.S3_KEEPALIVE_TIMEOUT,
+    RetryPolicy(
+        settings.S3_RETRY_ATTEMPTS,
+        settings.S3_RETRY_BASE_DELAY,
+        settings.S3_RETRY_MAX_DELAY,
+    ),
 )
@@ -0,0 +1,27 @@
+from typing import Optional
+
+# RabbitMQ x-max-priority of the lanes, tiers map into [0, MAX_PRIORITY]
+MAX_PRIORITY = 2
+TIER_PRIORITY = {"free": 0, "standard": 1, "premium": 2}
+
+
+def is_long_job(
+    size: Optional[int],
+    duration: Optional[float],
+    max_duration: float,
+    max_size: int,
+) -> bool:
+    """
+    Whether an encode belongs in the long lane.
+
+    The duration decides when it is known, the size of the upload is the
+    fallback estimate.
+    """
+    if duration is not None:
+        return duration >= max_duration
+    return size is not None and size >= max_size
+
+
+def tier_priority(tier: str) -> int:
+    # unknown tiers are served like the default one
+    return TIER_PRIORITY.get(tier, TIER_PRIORITY["standard"])
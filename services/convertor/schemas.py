@@ -0,0 +1,60 @@
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from ladder import Rendition
+from thumbnails import ThumbnailOptions
+
+
+class EncodeJob(BaseModel):
+    video_id: str
+    # one of main.OUTPUT_FORMATS, the worker default when not set
+    output_format: Optional[str] = None
+    # bytes of the upload and estimated seconds, they pick the lane
+    size: Optional[int] = None
+    duration: Optional[float] = None
+    # owner tier, orders jobs within a lane
+    tier: str = "standard"
+
+
+class ChunkJob(BaseModel):
+    video_id: str
+    index: int
+    count: int
+    start: float
+    duration: float
+    ladder: List[Rendition]
+    has_audio: bool
+    audio_mode: str = "muxed"
+    output_format: str = "ts"
+    thumbnails: Optional[ThumbnailOptions] = None
+    # frame rate of the source, for progress reports
+    fps: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        return f"c{self.index:04d}"
+
+
+class StitchJob(BaseModel):
+    video_id: str
+    count: int
+
+
+class JobCheckpoint(BaseModel):
+    """Durable state of an encode job, kept in S3 until the job is published."""
+
+    video_id: str
+    ladder: List[Rendition]
+    has_audio: bool
+    audio_mode: str = "muxed"
+    output_format: str = "ts"
+    thumbnails: Optional[ThumbnailOptions] = None
+    duration: Optional[float] = None
+    fps: Optional[float] = None
+    # segments every rendition has in S3, all renditions are cut at the same times
+    segments: int = 0
+    # media playlist of those segments per rendition name
+    playlists: Dict[str, str] = {}
+    # (start, duration) of every chunk once the job was split
+    chunk_ranges: List[Tuple[float, float]] = []
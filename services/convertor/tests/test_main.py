@@ -1,6 +1,42 @@
+import asyncio
+import importlib
+import os
+import shutil
+import subprocess
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from pathlib import Path
+from types import SimpleNamespace
+from typing import AsyncIterator, Dict, List
+
 import pytest
+from faststream.exceptions import NackMessage
 
-from ..main import cleanup_dirs, prepare_dirs
+from ..admission import Admission, AdmissionTimeout, parse_meminfo
+from ..config import EncoderSettings
+from ..encoders import QsvBackend, X264Backend, parse_encoders
+from ..ladder import DEFAULT_LADDER, Rendition, select_ladder
+from ..main import (
+    EncodeOptions,
+    build_ffmpeg_cmd,
+    build_thumbnails_cmd,
+    cleanup_dirs,
+    prepare_dirs,
+    rendition_speeds,
+    stream_names,
+)
+from ..playlist import parse_media_playlist, stitch_media_playlists
+from ..probe import SourceInfo
+from ..progress import ProgressParser
+from ..scheduling import is_long_job
+from ..thumbnails import (
+    HEAD_PREFIX,
+    range_cues,
+    sprite_cues,
+    stitch_webvtt,
+    thumbnail_options,
+    write_index,
+)
 
 
 @pytest.mark.asyncio
@@ -10,3 +46,344 @@ async def test_prepare_and_cleanup_dirs() -> None:
     assert path.exists()
     cleanup_dirs(vid)
     assert not path.exists()
+
+
+def test_build_ffmpeg_cmd_software_backend() -> None:
+    backend = X264Backend(EncoderSettings())
+    cmd = build_ffmpeg_cmd(Path("/tmp/out"), backend)
+    assert "-hwaccel" not in cmd
+    assert cmd.count("libx264") == len(DEFAULT_LADDER)
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph.startswith("[0:v]split=3[s0][s1][s2];")
+    assert "scale_npp" not in graph
+    # every backend fits the rung box, portrait sources are not upscaled
+    qsv = QsvBackend(EncoderSettings()).scale(1920, 1080)
+    assert qsv == "scale_qsv=w=1920:h=1080:force_original_aspect_ratio=decrease"
+
+
+def test_parse_encoders() -> None:
+    output = (
+        "Encoders:\n"
+        " V..... = Video\n"
+        " ------\n"
+        " V....D libx264              libx264 H.264 (codec h264)\n"
+        " V....D h264_nvenc           NVIDIA NVENC H.264 encoder (codec h264)\n"
+    )
+    assert parse_encoders(output) == {"libx264", "h264_nvenc"}
+
+
+def test_select_ladder_never_upscales() -> None:
+    info = SourceInfo(
+        width=854, height=480, fps=30, bitrate=1_000_000, duration=12, has_audio=False
+    )
+    rungs = [
+        *DEFAULT_LADDER,
+        Rendition("480p", 854, 480, "1200k", "1200k", "1800k", "128k"),
+    ]
+    ladder = select_ladder(info, rungs)
+    assert [r.name for r in ladder] == ["360p", "480p"]
+    assert ladder[1].video_bitrate == "1000k"
+    # a starved source still gets a bitrate ffmpeg accepts
+    starved = select_ladder(replace(info, bitrate=500), rungs)
+    assert starved[0].video_bitrate == "64k"
+
+    options = EncodeOptions(renditions=ladder, has_audio=False)
+    cmd = build_ffmpeg_cmd(Path("/tmp/out"), X264Backend(EncoderSettings()), options)
+    assert "a:0" not in cmd
+    assert cmd[cmd.index("-var_stream_map") + 1] == "v:0,name:360p v:1,name:480p"
+
+
+def test_select_ladder_tiny_portrait_source() -> None:
+    info = SourceInfo(
+        width=240, height=320, fps=60, bitrate=None, duration=None, has_audio=True
+    )
+    (rendition,) = select_ladder(info, DEFAULT_LADDER)
+    assert (rendition.name, rendition.width, rendition.height) == ("240p", 240, 320)
+    assert rendition.video_bitrate == "1200k"
+
+
+def test_stitch_chunk_playlists() -> None:
+    def chunk(name: str, durations: list) -> str:
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:6"]
+        for i, d in enumerate(durations):
+            lines += [f"#EXTINF:{d:.6f},", f"{name}_seg_{i:03d}.ts"]
+        return "\n".join(lines + ["#EXT-X-ENDLIST"])
+
+    stitched = stitch_media_playlists(
+        [
+            parse_media_playlist(chunk("c0000", [6.0, 6.0, 3.2])),
+            parse_media_playlist(chunk("c0001", [6.0, 7.4])),
+        ]
+    )
+    text = stitched.render()
+    assert "#EXT-X-TARGETDURATION:7" in text
+    assert text.count("#EXT-X-ENDLIST") == 1
+    assert [s.uri for s in stitched.segments][2:4] == [
+        "c0000_seg_002.ts",
+        "c0001_seg_000.ts",
+    ]
+
+
+def test_parse_meminfo_and_threads() -> None:
+    meminfo = "MemTotal:       16318408 kB\nMemAvailable:    2048000 kB\n"
+    assert parse_meminfo(meminfo) == 2048000 * 1024
+    assert parse_meminfo("MemTotal: 1 kB\n") is None
+
+    backend = X264Backend(EncoderSettings(ENCODER_THREADS=3))
+    cmd = build_ffmpeg_cmd(Path("/tmp/out"), backend)
+    assert cmd[cmd.index("-threads") + 1] == "3"
+
+
+def test_progress_parser() -> None:
+    parser = ProgressParser(duration=120.0, start=240.0, shifted=True)
+    block = "frame=1500\nfps=75.20\nout_time_us=300000000\nspeed=2.51x\n"
+    for line in block.splitlines():
+        assert parser.feed(line) is None
+    progress = parser.feed("progress=continue")
+    assert progress is not None
+    assert (progress.frame, progress.speed, progress.percent) == (1500, 2.51, 50.0)
+    assert not progress.done
+    assert parser.feed("progress=end").done
+
+    # a chunk as long as its start: 90 seconds in is 75% either way
+    for shifted, out_us in ((True, 210_000_000), (False, 90_000_000)):
+        parser = ProgressParser(duration=120.0, start=120.0, shifted=shifted)
+        parser.feed(f"out_time_us={out_us}")
+        progress = parser.feed("progress=continue")
+        assert (progress.out_time, progress.percent) == (210.0, 75.0)
+
+    # a finished poster output holds ffmpeg's out_time at its frame
+    parser = ProgressParser(duration=60.0, fps=25.0)
+    for line in "frame=750\nout_time_us=40000\nspeed=0.01x\n".splitlines():
+        parser.feed(line)
+    progress = parser.feed("progress=continue")
+    assert (progress.out_time, progress.percent) == (30.0, 50.0)
+    assert progress.speed > 1
+
+
+def test_build_ffmpeg_cmd_shared_audio() -> None:
+    backend = X264Backend(EncoderSettings())
+    options = EncodeOptions(audio_mode="shared")
+    cmd = build_ffmpeg_cmd(Path("/tmp/out"), backend, options)
+    # one AAC encode at the top rung's bitrate serves the whole ladder
+    assert cmd.count("aac") == 1
+    assert cmd[cmd.index("-b:a:0") + 1] == "192k"
+    stream_map = cmd[cmd.index("-var_stream_map") + 1].split()
+    assert stream_map[0] == "a:0,agroup:aud,default:yes,name:audio"
+    assert stream_map[1:] == [
+        f"v:{i},agroup:aud,name:{r.name}" for i, r in enumerate(DEFAULT_LADDER)
+    ]
+    assert stream_names(options)[-1] == "audio"
+
+
+def test_shared_audio_master_playlist(tmp_path: Path) -> None:
+    settings = EncoderSettings()
+    if shutil.which(settings.FFMPEG_BIN) is None:
+        pytest.skip("ffmpeg is not installed")
+    source = tmp_path / "source.mp4"
+    subprocess.run(
+        [
+            settings.FFMPEG_BIN,
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc=size=1920x1080:rate=25:duration=2",
+            "-f",
+            "lavfi",
+            "-i",
+            "sine=duration=2",
+            "-shortest",
+            str(source),
+        ],
+        check=True,
+    )
+    out = tmp_path / "out"
+    out.mkdir()
+    options = EncodeOptions(audio_mode="shared", source=str(source))
+    cmd = build_ffmpeg_cmd(out, X264Backend(settings), options)
+    subprocess.run(cmd, check=True, capture_output=True)
+    master = (out / "master.m3u8").read_text().splitlines()
+    variants = [line for line in master if line.startswith("#EXT-X-STREAM-INF")]
+    assert len(variants) == len(DEFAULT_LADDER)
+    groups = {line.split('AUDIO="')[1].split('"')[0] for line in variants}
+    assert len(groups) == 1
+    assert sum(line.startswith("#EXT-X-MEDIA:TYPE=AUDIO") for line in master) == 1
+
+
+def test_build_ffmpeg_cmd_single_file_fmp4() -> None:
+    backend = X264Backend(EncoderSettings())
+    options = EncodeOptions(output_format="fmp4_single", segment_prefix="c0001_")
+    cmd = build_ffmpeg_cmd(Path("/tmp/out"), backend, options)
+    assert cmd[cmd.index("-hls_segment_type") + 1] == "fmp4"
+    assert cmd[cmd.index("-hls_fmp4_init_filename") + 1] == "c0001_init_%v.mp4"
+    assert cmd[cmd.index("-hls_segment_filename") + 1].endswith(
+        "stream_%v/c0001_data.m4s"
+    )
+    assert "single_file" in cmd[cmd.index("-hls_flags") + 1]
+
+
+def test_thumbnails_share_the_decode() -> None:
+    info = SourceInfo(1920, 800, 25.0, None, 25.0, True)
+    thumbnails = thumbnail_options(info, 10, 160, 2, 1, poster_time=60)
+    assert (thumbnails.height, thumbnails.poster_time) == (66, 12.5)
+
+    backend = X264Backend(EncoderSettings())
+    cmd = build_ffmpeg_cmd(
+        Path("/tmp/out"), backend, EncodeOptions(thumbnails=thumbnails)
+    )
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph.startswith("[0:v]split=5[s0][s1][s2][thumbs][poster];")
+    assert "tile=2x1[sprites]" in graph
+    assert cmd[-1] == "/tmp/out/thumbnails/poster.jpg"
+
+    first = sprite_cues(thumbnails, ["sprite_001.jpg", "sprite_002.jpg"], 0, 25)
+    assert len(first) == 3
+    assert first[2] == "00:00:20.000 --> 00:00:25.000\nsprite_002.jpg#xywh=0,0,160,66"
+    second = sprite_cues(thumbnails, ["c0001_sprite_001.jpg"], 25, 5)
+    stitched = stitch_webvtt(
+        ["WEBVTT\n\n" + "\n\n".join(first), "WEBVTT\n\n" + second[0]]
+    )
+    assert stitched.count("-->") == 4
+    assert stitched.startswith("WEBVTT\n\n00:00:00.000")
+
+
+def test_resume_after_uneven_segments(tmp_path: Path) -> None:
+    # forced key frames and VFR sources cut segments off HLS_TIME
+    recorded = parse_media_playlist(
+        "#EXTM3U\n#EXT-X-TARGETDURATION:7\n"
+        "#EXTINF:6.006000,\nseg_0.ts\n#EXTINF:5.500000,\nseg_1.ts\n"
+    )
+    assert recorded.duration == pytest.approx(11.506)
+
+    info = SourceInfo(1920, 800, 25.0, None, 25.0, True)
+    thumbnails = thumbnail_options(info, 5, 160, 2, 1, poster_time=8)
+    backend = X264Backend(EncoderSettings())
+    cmd = build_thumbnails_cmd(
+        tmp_path, backend, thumbnails, "http://s3/v.mp4", 11.506, HEAD_PREFIX
+    )
+    assert cmd[cmd.index("-t") + 1] == "11.506"
+    assert cmd[cmd.index("-filter_complex") + 1].startswith(
+        "[0:v]split=2[thumbs][poster];"
+    )
+    assert cmd[-1] == str(tmp_path / "thumbnails" / "poster.jpg")
+
+    # the resumed index covers the skipped head, then the encoded tail
+    out = tmp_path / "thumbnails"
+    out.mkdir()
+    for name in ("head_sprite_001.jpg", "head_sprite_002.jpg", "sprite_001.jpg"):
+        (out / name).touch()
+    earlier = range_cues(tmp_path, thumbnails, HEAD_PREFIX, 0.0, 11.506)
+    assert len(earlier) == 3
+    index = write_index(tmp_path, thumbnails, "", 11.506, 5.0, earlier)
+    assert index is not None
+    text = index.read_text()
+    assert text.count("-->") == 4
+    assert "00:00:10.000 --> 00:00:11.506\nhead_sprite_002.jpg" in text
+    assert "00:00:11.506 --> 00:00:16.506\nsprite_001.jpg" in text
+
+
+@pytest.mark.asyncio
+async def test_long_jobs_leave_a_slot_to_short_ones(tmp_path: Path) -> None:
+    assert is_long_job(10, 3600.0, 600, 1000)
+    assert not is_long_job(10**9, 30.0, 600, 1000)
+    assert is_long_job(10**9, None, 600, 1000)
+
+    admission = Admission(2, tmp_path, 0, 0, timeout=1, long_jobs=1)
+    async with admission.slot("long-1", long=True):
+        second = asyncio.create_task(admission.slot("long-2", long=True).__aenter__())
+        await asyncio.sleep(0.05)
+        assert not second.done()
+        async with asyncio.timeout(1):
+            async with admission.slot("short", long=False):
+                pass
+    await asyncio.wait_for(second, 1)
+
+    # a prefetched job does not wait on a busy node past the deadline
+    busy = Admission(1, tmp_path, 0, 0, timeout=0.05)
+    async with busy.slot("running"):
+        with pytest.raises(AdmissionTimeout, match="encode slot"):
+            async with busy.slot("prefetched"):
+                pass
+    async with busy.slot("next"):
+        pass
+
+
+def test_rendition_speeds(tmp_path: Path) -> None:
+    started = 1_000_000.0
+    # 720p finished its 24 seconds after 8, 1080p after 12, 360p has none
+    for name, finished in (("720p", 8), ("1080p", 12)):
+        playlist = tmp_path / f"stream_{name}" / "playlist.m3u8"
+        playlist.parent.mkdir()
+        playlist.write_text(
+            "#EXTM3U\n#EXT-X-TARGETDURATION:6\n"
+            + "#EXTINF:6.000000,\nseg.ts\n" * 4
+            + "#EXT-X-ENDLIST\n"
+        )
+        os.utime(playlist, (started + finished, started + finished))
+    speeds = rendition_speeds(tmp_path, EncodeOptions(), started)
+    assert speeds == {"720p": 3.0, "1080p": 2.0}
+
+
+@pytest.mark.asyncio
+async def test_failing_chunk_is_requeued(monkeypatch: pytest.MonkeyPatch) -> None:
+    # the worker module builds its S3 client at import
+    for name in ("ROOT_USER", "ROOT_PASSWORD", "ENDPOINT_URL", "BUCKET_NAME"):
+        monkeypatch.setenv(f"MINIO_{name}", "test")
+    monkeypatch.setenv("MINIO_REGION_NAME", "us-east-1")
+    rabbit_client = importlib.import_module("rabbit_client")
+    store: Dict[str, bytes] = {}
+    statuses: List[str] = []
+
+    async def exists(key: str) -> bool:
+        return key in store
+
+    async def read_object(key: str) -> bytes:
+        return store[key]
+
+    async def put_bytes(key: str, data: bytes) -> None:
+        store[key] = data
+
+    async def presigned_url(key: str) -> str:
+        return f"http://s3/{key}"
+
+    async def crash(*_: object) -> None:
+        raise RuntimeError("ffmpeg exited with code 1")
+
+    async def publish_status(_: str, status: str) -> None:
+        statuses.append(status)
+
+    @asynccontextmanager
+    async def admitted(*_: object, **__: object) -> AsyncIterator[None]:
+        yield
+
+    for name, fake in [
+        ("exists", exists),
+        ("read_object", read_object),
+        ("put_bytes", put_bytes),
+        ("presigned_url", presigned_url),
+    ]:
+        monkeypatch.setattr(rabbit_client.s3_client, name, fake)
+    monkeypatch.setattr(rabbit_client, "encode_and_upload", crash)
+    monkeypatch.setattr(rabbit_client, "publish_status", publish_status)
+    monkeypatch.setattr(rabbit_client, "admitted", admitted)
+
+    job = rabbit_client.ChunkJob(
+        video_id="v.mp4",
+        index=1,
+        count=3,
+        start=120,
+        duration=120,
+        ladder=rabbit_client.worker_settings.ENCODER_LADDER,
+        has_audio=True,
+    )
+    message = SimpleNamespace(raw_message=SimpleNamespace(timestamp=None))
+    # nacked back to the queue while attempts are left, not acked and lost
+    for _ in range(rabbit_client.worker_settings.CHUNK_JOB_ATTEMPTS - 1):
+        with pytest.raises(NackMessage):
+            await rabbit_client.encode_chunk(job, message)
+        assert statuses == []
+    await rabbit_client.encode_chunk(job, message)
+    assert statuses == ["error: ffmpeg exited with code 1"]
+    assert store["v.mp4/chunks/c0001/failures"] == b"3"
@@ -0,0 +1,246 @@
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+from probe import SourceInfo
+
+THUMBNAILS_DIR = "thumbnails"
+INDEX_NAME = "thumbnails.vtt"
+# sheets a resumed encode renders for the part of the source it skips
+HEAD_PREFIX = "head_"
+IMAGE_FORMATS = ("jpg", "webp")
+
+
+@dataclass(frozen=True)
+class ThumbnailOptions:
+    # seconds between two preview frames
+    interval: float
+    # size of one tile of a sprite sheet
+    width: int
+    height: int
+    columns: int
+    rows: int
+    # jpg | webp, for the sprites and the poster
+    image_format: str = "jpg"
+    # position of the poster frame in the source, no poster when None
+    poster_time: Optional[float] = None
+    # box the poster is fitted into
+    poster_width: int = 1920
+    poster_height: int = 1080
+
+    @property
+    def per_sprite(self) -> int:
+        return self.columns * self.rows
+
+
+def _even(value: float) -> int:
+    return max(2, int(round(value / 2)) * 2)
+
+
+def thumbnail_options(
+    info: SourceInfo,
+    interval: float,
+    width: int,
+    columns: int,
+    rows: int,
+    image_format: str = "jpg",
+    poster_time: Optional[float] = None,
+    poster_box: Tuple[int, int] = (1920, 1080),
+) -> ThumbnailOptions:
+    """Preview settings of a job, tiles keep the aspect ratio of the source."""
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown thumbnail format: {image_format}")
+    width = min(width, info.width)
+    if poster_time is not None and info.duration:
+        # a short clip still gets a poster
+        poster_time = min(poster_time, info.duration / 2)
+    return ThumbnailOptions(
+        interval=interval,
+        width=_even(width),
+        height=_even(width * info.height / info.width),
+        columns=columns,
+        rows=rows,
+        image_format=image_format,
+        poster_time=poster_time,
+        poster_width=poster_box[0],
+        poster_height=poster_box[1],
+    )
+
+
+# ---------- ffmpeg filter branches and outputs ----------
+def thumbnail_filters(
+    thumbs: str,
+    poster: Optional[str],
+    options: ThumbnailOptions,
+    download: str = "",
+    start: float = 0.0,
+) -> str:
+    """
+    Filter chains turning decoded frames into sprite sheets and a poster.
+
+    Frames are dropped before they are downloaded from a hardware decoder,
+    so only the picked frames leave the GPU.
+
+    Args:
+        thumbs: Label of the split output feeding the sprites.
+        poster: Label of the split output feeding the poster, if any.
+        download: Filters moving a hardware frame to system memory.
+        start: Position of the encoded range in the source.
+    """
+    chains = [
+        f"[{thumbs}]fps=fps=1/{options.interval:g},{download}"
+        f"scale=w={options.width}:h={options.height},"
+        f"tile={options.columns}x{options.rows}[sprites]"
+    ]
+    if poster is not None and options.poster_time is not None:
+        at = max(0.0, options.poster_time - start)
+        chains.append(
+            f"[{poster}]select='isnan(prev_selected_t)*gte(t,{at:.3f})',"
+            f"{download}scale=w={options.poster_width}:h={options.poster_height}"
+            ":force_original_aspect_ratio=decrease:force_divisible_by=2[poster]"
+        )
+    return ";".join(chains)
+
+
+def wants_poster(
+    options: ThumbnailOptions, start: Optional[float], duration: Optional[float]
+) -> bool:
+    """Whether the poster frame lies in the encoded range."""
+    if options.poster_time is None:
+        return False
+    start = start or 0.0
+    return start <= options.poster_time and (
+        duration is None or options.poster_time < start + duration
+    )
+
+
+def _image_codec(options: ThumbnailOptions, high: bool) -> List[str]:
+    if options.image_format == "webp":
+        return ["-c:v", "libwebp", "-quality", "90" if high else "75"]
+    # mjpeg quality scale: 2 is best, 31 worst
+    return ["-c:v", "mjpeg", "-q:v", "3" if high else "5"]
+
+
+def thumbnail_outputs(
+    output_dir: Path, options: ThumbnailOptions, prefix: str, poster: bool
+) -> List[str]:
+    """ffmpeg outputs writing the sprite sheets and the poster."""
+    out = output_dir / THUMBNAILS_DIR
+    ext = options.image_format
+    cmd = [
+        "-map",
+        "[sprites]",
+        *_image_codec(options, high=False),
+        "-f",
+        "image2",
+        str(out / f"{prefix}sprite_%03d.{ext}"),
+    ]
+    if poster:
+        cmd += [
+            "-map",
+            "[poster]",
+            "-frames:v",
+            "1",
+            *_image_codec(options, high=True),
+            "-f",
+            "image2",
+            "-update",
+            "1",
+            str(out / f"poster.{ext}"),
+        ]
+    return cmd
+
+
+# ---------- WebVTT index of the sprites ----------
+def _timestamp(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    hours, ms = divmod(ms, 3_600_000)
+    minutes, ms = divmod(ms, 60_000)
+    return f"{hours:02d}:{minutes:02d}:{ms / 1000:06.3f}"
+
+
+def sprite_cues(
+    options: ThumbnailOptions,
+    sprites: Sequence[str],
+    start: float,
+    duration: Optional[float],
+) -> List[str]:
+    """
+    WebVTT cues pointing every interval of [start, start + duration) at its
+    tile in the sprite sheets.
+
+    Args:
+        sprites: File names of the sheets ffmpeg wrote, in order.
+        duration: Seconds encoded. When unknown every tile of the sheets is
+            assumed to be filled.
+    """
+    if not sprites:
+        return []
+    capacity = len(sprites) * options.per_sprite
+    count = capacity
+    if duration is not None:
+        # the last sheet is only partly filled, never index its blank tiles
+        count = min(capacity, max(1, math.ceil(round(duration / options.interval, 6))))
+    end = start + (duration if duration is not None else count * options.interval)
+    cues = []
+    for i in range(count):
+        sheet, tile = divmod(i, options.per_sprite)
+        row, column = divmod(tile, options.columns)
+        cue_start = start + i * options.interval
+        cue_end = min(cue_start + options.interval, end)
+        x, y = column * options.width, row * options.height
+        cues.append(
+            f"{_timestamp(cue_start)} --> {_timestamp(cue_end)}\n"
+            f"{sprites[sheet]}#xywh={x},{y},{options.width},{options.height}"
+        )
+    return cues
+
+
+def render_webvtt(cues: Sequence[str]) -> str:
+    return "\n\n".join(["WEBVTT", *cues]) + "\n"
+
+
+def parse_webvtt_cues(text: str) -> List[str]:
+    blocks = [block.strip() for block in text.strip().split("\n\n")]
+    return [block for block in blocks if block and not block.startswith("WEBVTT")]
+
+
+def stitch_webvtt(texts: Sequence[str]) -> str:
+    """Concatenate the indexes of consecutive chunks, their cues are absolute."""
+    return render_webvtt([cue for text in texts for cue in parse_webvtt_cues(text)])
+
+
+def range_cues(
+    output_dir: Path,
+    options: ThumbnailOptions,
+    prefix: str,
+    start: float,
+    duration: Optional[float],
+) -> List[str]:
+    """Cues of the sprite sheets ffmpeg left in output_dir under prefix."""
+    out = output_dir / THUMBNAILS_DIR
+    sprites = sorted(
+        p.name for p in out.glob(f"{prefix}sprite_*.{options.image_format}")
+    )
+    return sprite_cues(options, sprites, start, duration)
+
+
+def write_index(
+    output_dir: Path,
+    options: ThumbnailOptions,
+    prefix: str,
+    start: float,
+    duration: Optional[float],
+    earlier: Sequence[str] = (),
+) -> Optional[Path]:
+    """
+    Index the sprite sheets ffmpeg left in output_dir, if it wrote any,
+    after the cues of the range before start.
+    """
+    cues = [*earlier, *range_cues(output_dir, options, prefix, start, duration)]
+    if not cues:
+        return None
+    path = output_dir / THUMBNAILS_DIR / INDEX_NAME
+    path.write_text(render_webvtt(cues))
+    return path
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import re
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Sequence, Set
+
+from s3_client import S3Client, UploadReport
+from thumbnails import THUMBNAILS_DIR
+
+SEGMENT_RE = re.compile(r"^(?:c\d+_)?seg_(\d+)\.(?:ts|m4s)$")
+# files listing others, they go up after what they list
+INDEX_SUFFIXES = (".m3u8", ".vtt")
+
+
+def _segment_index(path: Path) -> int:
+    match = SEGMENT_RE.match(path.name)
+    return int(match.group(1)) if match else -1
+
+
+class SegmentUploader:
+    """
+    Upload HLS segments while ffmpeg is still encoding.
+
+    ffmpeg writes the segments of one rendition strictly one after another,
+    so every segment except the newest one in a rendition directory is closed
+    and can be uploaded and removed from local disk. Once encoding is over the
+    remaining segments are flushed and the playlists go up last, so a player
+    never sees a playlist pointing at a segment that is not in S3 yet.
+    Sprite sheets and the poster go up with the final flush, their WebVTT
+    index with the playlists.
+    """
+
+    def __init__(
+        self,
+        s3: S3Client,
+        prefix: str,
+        output_dir: Path,
+        poll_interval: float = 0.5,
+        playlist_prefix: Optional[str] = None,
+        on_flush: Optional[Callable[[Set[str]], Awaitable[None]]] = None,
+    ) -> None:
+        self.s3 = s3
+        self.prefix = prefix
+        # chunk encodes park their playlists apart until they are stitched
+        self.playlist_prefix = playlist_prefix or prefix
+        self.output_dir = output_dir
+        self.poll_interval = poll_interval
+        self.report = UploadReport()
+        # paths relative to output_dir of every segment already in S3
+        self.uploaded: Set[str] = set()
+        self.on_flush = on_flush
+        self._stopped = asyncio.Event()
+
+    def _ready_segments(self, final: bool) -> List[Path]:
+        ready: List[Path] = []
+        for rendition_dir in sorted(self.output_dir.glob("stream_*")):
+            if final:
+                # init sections and single-file renditions are only complete
+                # once ffmpeg is done
+                ready.extend(
+                    p
+                    for p in sorted(rendition_dir.iterdir())
+                    if p.suffix not in (*INDEX_SUFFIXES, ".tmp")
+                )
+                continue
+            segments = sorted(
+                (p for p in rendition_dir.iterdir() if SEGMENT_RE.match(p.name)),
+                key=_segment_index,
+            )
+            # the newest segment may still be open in ffmpeg
+            ready.extend(segments[:-1])
+        thumbnails_dir = self.output_dir / THUMBNAILS_DIR
+        if final and thumbnails_dir.is_dir():
+            ready.extend(
+                p
+                for p in sorted(thumbnails_dir.iterdir())
+                if p.suffix not in INDEX_SUFFIXES
+            )
+        return ready
+
+    def _key(self, path: Path) -> str:
+        prefix = self.playlist_prefix if path.suffix in INDEX_SUFFIXES else self.prefix
+        return f"{prefix}/{path.relative_to(self.output_dir).as_posix()}"
+
+    async def _upload(self, paths: Sequence[Path], strict: bool) -> List[Path]:
+        report = await self.s3.upload_paths([(self._key(p), p) for p in paths])
+        failed = set(report.failed)
+        if failed and strict:
+            raise RuntimeError(f"Failed to upload {len(failed)} files to S3")
+        # failed segments stay on disk and are retried on the next poll
+        report.failed.clear()
+        self.report.merge(report)
+        return [p for p in paths if self._key(p) not in failed]
+
+    async def _flush(self, final: bool) -> None:
+        done = await self._upload(self._ready_segments(final), final)
+        for segment in done:
+            self.uploaded.add(segment.relative_to(self.output_dir).as_posix())
+            segment.unlink(missing_ok=True)
+        if done and self.on_flush is not None:
+            await self.on_flush(self.uploaded)
+
+    async def run(self) -> None:
+        while not self._stopped.is_set():
+            await self._flush(final=False)
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        await self._flush(final=True)
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    async def upload_playlists(self) -> None:
+        await self._upload(sorted(self.output_dir.glob("stream_*/*.m3u8")), True)
+        await self._upload(
+            sorted(self.output_dir.glob(f"{THUMBNAILS_DIR}/*.vtt")), True
+        )
+        master = self.output_dir / "master.m3u8"
+        if master.exists():
+            await self._upload([master], True)
+        logging.info("[S3] Uploaded %s: %s", self.prefix, self.report)